@@ -1,17 +1,26 @@
 import os
-import logging
 from dotenv import load_dotenv
 
+# Load environment variables from .env file, first: SOCKETIO_ASYNC_MODE may be set there
+load_dotenv()
+
+# gevent must patch the standard library before anything else is imported
+if os.environ.get('SOCKETIO_ASYNC_MODE') == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+import time
+import logging
+
+startup_start = time.perf_counter()
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Load environment variables from .env file
-load_dotenv()
-
 from app import create_app, socketio
-from app.database.db import db
+from app.database.db import db, prewarm_connections
 
 # Create the application instance with environment variables
 app = create_app({
@@ -20,15 +29,31 @@ app = create_app({
     'SECRET_KEY': os.environ.get('SECRET_KEY', 'dev-key-change-in-production')
 })
 
-# Initialize database tables automatically
-with app.app_context():
-    try:
-        # Import models to ensure they're registered with SQLAlchemy
-        from app.models import User, Sequence, SequenceStep, ChatMessage
-        db.create_all()
-        logger.info('Database tables initialized successfully.')
-    except Exception as e:
-        logger.error(f"Error initializing database: {str(e)}")
+# Initialize database tables automatically (development only, set DB_CREATE_ALL=false
+# to skip the schema round-trips and rely on run_migrations.py instead)
+if app.config['DB_CREATE_ALL']:
+    with app.app_context():
+        try:
+            # Import models to ensure they're registered with SQLAlchemy
+            from app.models import User, Sequence, SequenceStep, ChatMessage
+            db.create_all()
+            logger.info('Database tables initialized successfully.')
+            # The search index is not a model; create it and fill it from existing sequences
+            from app.services.search_service import SearchService
+            SearchService.get_instance().ensure_index(populate=True)
+        except Exception as e:
+            logger.error(f"Error initializing database: {str(e)}")
+else:
+    logger.info('Skipping create_all (DB_CREATE_ALL=false); schema is managed by run_migrations.py')
+
+try:
+    warmed = prewarm_connections(app)
+    if warmed:
+        logger.info(f"Pre-warmed {warmed} database connections")
+except Exception as e:
+    logger.error(f"Error pre-warming database connections: {str(e)}")
+
+logger.info(f"Application startup took {(time.perf_counter() - startup_start) * 1000:.1f} ms")
 
 if __name__ == '__main__':
     # Run the application with Socket.IO support
@@ -38,9 +63,10 @@ if __name__ == '__main__':
     logger.info(f"Socket.IO async mode: {socketio.async_mode}")
     
     # Run with debug=False for production-like environment
-    # With Python 3.12, use threading mode instead of eventlet
+    # With Python 3.12, use threading or gevent mode instead of eventlet
     try:
-        socketio.run(app, host='0.0.0.0', port=port, debug=False, allow_unsafe_werkzeug=True)
+        run_kwargs = {'allow_unsafe_werkzeug': True} if socketio.async_mode == 'threading' else {}
+        socketio.run(app, host='0.0.0.0', port=port, debug=False, **run_kwargs)
     except Exception as e:
         logger.error(f"Error starting server: {str(e)}")
         raise 
\ No newline at end of file
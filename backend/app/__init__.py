@@ -1,4 +1,4 @@
-from flask import Flask
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO
 import os
@@ -7,9 +7,18 @@ from dotenv import load_dotenv
 # Load environment variables directly in the module
 load_dotenv()
 
-# Initialize Socket.IO with threading mode for Python 3.12 compatibility
-# Note: eventlet has compatibility issues with Python 3.12
-socketio = SocketIO(cors_allowed_origins="*", async_mode='threading', logger=True, engineio_logger=True)
+# Socket.IO server options are applied in create_app from config.
+# Note: eventlet has compatibility issues with Python 3.12; use 'gevent' (with
+# gevent-websocket) for high-concurrency deployments, 'threading' for development.
+socketio = SocketIO()
+
+def _env_flag(name, default='false'):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes')
+
+def _env_map(name):
+    # "key=value,key2=value2" -> {'key': 'value', 'key2': 'value2'}
+    pairs = (item.split('=', 1) for item in os.environ.get(name, '').split(',') if '=' in item)
+    return {key.strip(): value.strip() for key, value in pairs}
 
 def create_app(config=None):
     app = Flask(__name__)
@@ -19,6 +28,107 @@ def create_app(config=None):
         SECRET_KEY='dev',
         SQLALCHEMY_DATABASE_URI=os.environ.get('SQLALCHEMY_DATABASE_URI'),
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        SOCKETIO_ASYNC_MODE=os.environ.get('SOCKETIO_ASYNC_MODE', 'threading'),
+        # Per-packet Socket.IO / Engine.IO logging is very noisy; keep it off unless debugging
+        SOCKETIO_LOGGER=_env_flag('SOCKETIO_LOGGER'),
+        ENGINEIO_LOGGER=_env_flag('ENGINEIO_LOGGER'),
+        # A user's in-flight requests are cancelled when they stay disconnected this long
+        SOCKETIO_DISCONNECT_GRACE_SECONDS=float(os.environ.get('SOCKETIO_DISCONNECT_GRACE_SECONDS', 5)),
+        # Startup: create_all is for development; production uses run_migrations.py
+        DB_CREATE_ALL=_env_flag('DB_CREATE_ALL', 'true'),
+        DB_POOL_PREWARM=int(os.environ.get('DB_POOL_PREWARM', 0)),
+        # Chat history retention: older rows move to chat_messages_archive (see run_retention.py)
+        CHAT_RETENTION_DAYS=int(os.environ.get('CHAT_RETENTION_DAYS', 90)),
+        CHAT_ARCHIVE_PURGE_DAYS=int(os.environ.get('CHAT_ARCHIVE_PURGE_DAYS', 0)),
+        CHAT_RETENTION_BATCH_SIZE=int(os.environ.get('CHAT_RETENTION_BATCH_SIZE', 1000)),
+        # Near-duplicate generation requests are offered an existing sequence to reuse instead of calling the LLM
+        SEQUENCE_REUSE_ENABLED=_env_flag('SEQUENCE_REUSE_ENABLED'),
+        SEQUENCE_REUSE_THRESHOLD=float(os.environ.get('SEQUENCE_REUSE_THRESHOLD', 0.9)),
+        # Sequence generation: 'stream' (one call), 'outline' (plan, then steps in parallel) or 'auto'
+        SEQUENCE_STEP_COUNT=int(os.environ.get('SEQUENCE_STEP_COUNT', 3)),
+        SEQUENCE_GENERATION_MODE=os.environ.get('SEQUENCE_GENERATION_MODE', 'auto'),
+        SEQUENCE_OUTLINE_MIN_STEPS=int(os.environ.get('SEQUENCE_OUTLINE_MIN_STEPS', 5)),
+        SEQUENCE_STEP_CONCURRENCY=int(os.environ.get('SEQUENCE_STEP_CONCURRENCY', 8)),
+        # Model routing: tiers (model and USD per million tokens) and each route's state
+        # (off, shadow or live), e.g. MODEL_ROUTES="chat_short=live,refine_small=shadow"
+        MODEL_TIERS={
+            'small': {'model': os.environ.get('ANTHROPIC_MODEL_SMALL', 'claude-3-5-haiku-20241022'),
+                      'input_cost': 0.8, 'output_cost': 4.0},
+            'large': {'model': os.environ.get('ANTHROPIC_MODEL', 'claude-3-5-sonnet-20241022'),
+                      'input_cost': 3.0, 'output_cost': 15.0},
+        },
+        MODEL_ROUTES=_env_map('MODEL_ROUTES'),
+        MODEL_SHADOW_SAMPLE_RATE=float(os.environ.get('MODEL_SHADOW_SAMPLE_RATE', 0.1)),
+        # Shadow replays queued or running at once; further samples are dropped
+        MODEL_SHADOW_MAX_PENDING=int(os.environ.get('MODEL_SHADOW_MAX_PENDING', 8)),
+        MODEL_ROUTE_SHORT_MESSAGE_CHARS=int(os.environ.get('MODEL_ROUTE_SHORT_MESSAGE_CHARS', 40)),
+        MODEL_ROUTE_SMALL_STEP_CHARS=int(os.environ.get('MODEL_ROUTE_SMALL_STEP_CHARS', 1500)),
+        # Chat turns like "hi" / "thanks" are answered locally, without an LLM call
+        INTENT_FAST_PATH_ENABLED=_env_flag('INTENT_FAST_PATH_ENABLED', 'true'),
+        INTENT_FAST_PATH_INTENTS=os.environ.get('INTENT_FAST_PATH_INTENTS',
+                                                'greeting,thanks,farewell,help,acknowledgement').split(','),
+        INTENT_FAST_PATH_MAX_CHARS=int(os.environ.get('INTENT_FAST_PATH_MAX_CHARS', 60)),
+        # LLM call scheduler: concurrent calls, slots bulk generation can't use, per-class queue
+        # deadlines (seconds) and fair-share weights, e.g. LLM_COMPANY_WEIGHTS="Acme=2,Initech=0.5"
+        LLM_SCHEDULER_ENABLED=_env_flag('LLM_SCHEDULER_ENABLED', 'true'),
+        LLM_MAX_CONCURRENCY=int(os.environ.get('LLM_MAX_CONCURRENCY', 8)),
+        LLM_RESERVED_SLOTS=int(os.environ.get('LLM_RESERVED_SLOTS', 2)),
+        LLM_QUEUE_DEADLINES={'interactive': 20.0, 'refine': 30.0, 'bulk': 120.0,
+                             **{k: float(v) for k, v in _env_map('LLM_QUEUE_DEADLINES').items()}},
+        LLM_QUEUE_URGENT_SECONDS=float(os.environ.get('LLM_QUEUE_URGENT_SECONDS', 2)),
+        LLM_USER_WEIGHTS={k: float(v) for k, v in _env_map('LLM_USER_WEIGHTS').items()},
+        LLM_COMPANY_WEIGHTS={k: float(v) for k, v in _env_map('LLM_COMPANY_WEIGHTS').items()},
+        # Prompt anatomy: per-section token estimates for a sample of LLM calls (admin report)
+        PROMPT_PROFILING_ENABLED=_env_flag('PROMPT_PROFILING_ENABLED'),
+        PROMPT_PROFILING_SAMPLE_RATE=float(os.environ.get('PROMPT_PROFILING_SAMPLE_RATE', 1.0)),
+        # Clustered LLM personalization jobs: where uploads and output live (default: instance
+        # folder), parallel variant calls, clusters per checkpoint, cluster cap and similarity
+        PERSONALIZATION_JOB_DIR=os.environ.get('PERSONALIZATION_JOB_DIR'),
+        PERSONALIZATION_CONCURRENCY=int(os.environ.get('PERSONALIZATION_CONCURRENCY', 4)),
+        PERSONALIZATION_BATCH_SIZE=int(os.environ.get('PERSONALIZATION_BATCH_SIZE', 8)),
+        PERSONALIZATION_MAX_CLUSTERS=int(os.environ.get('PERSONALIZATION_MAX_CLUSTERS', 200)),
+        PERSONALIZATION_CLUSTER_THRESHOLD=float(os.environ.get('PERSONALIZATION_CLUSTER_THRESHOLD', 0.5)),
+        # Scheduled sending (run_send_worker.py): transport ('file', 'smtp' or 'module:Class'), hours
+        # between steps unless an enrollment sets its own, and the workers' claim batch, look-ahead
+        # window, poll interval and lease (seconds), plus retries with exponential backoff
+        SEND_TRANSPORT=os.environ.get('SEND_TRANSPORT', 'file'),
+        SEND_FILE_DIR=os.environ.get('SEND_FILE_DIR'),
+        SEND_FROM_ADDRESS=os.environ.get('SEND_FROM_ADDRESS', 'outreach@helix.local'),
+        SMTP_HOST=os.environ.get('SMTP_HOST'),
+        SMTP_PORT=int(os.environ.get('SMTP_PORT', 587)),
+        SMTP_USERNAME=os.environ.get('SMTP_USERNAME'),
+        SMTP_PASSWORD=os.environ.get('SMTP_PASSWORD'),
+        SMTP_USE_TLS=_env_flag('SMTP_USE_TLS', 'true'),
+        SEND_STEP_INTERVAL_HOURS=float(os.environ.get('SEND_STEP_INTERVAL_HOURS', 72)),
+        SEND_BATCH_SIZE=int(os.environ.get('SEND_BATCH_SIZE', 200)),
+        SEND_WINDOW_SECONDS=float(os.environ.get('SEND_WINDOW_SECONDS', 30)),
+        SEND_POLL_SECONDS=float(os.environ.get('SEND_POLL_SECONDS', 5)),
+        SEND_LEASE_SECONDS=float(os.environ.get('SEND_LEASE_SECONDS', 300)),
+        SEND_MAX_ATTEMPTS=int(os.environ.get('SEND_MAX_ATTEMPTS', 5)),
+        SEND_RETRY_SECONDS=float(os.environ.get('SEND_RETRY_SECONDS', 60)),
+        # Read replicas (comma-separated URIs) for @replica_reads views: a replica is skipped when its
+        # lag exceeds REPLICA_MAX_LAG_SECONDS, and for REPLICA_STICKY_SECONDS (plus its lag) after a
+        # write naming the same user or sequence; REPLICA_LAG_QUERY overrides the lag probe SQL
+        SQLALCHEMY_REPLICA_URIS=[uri.strip() for uri in os.environ.get('SQLALCHEMY_REPLICA_URIS', '').split(',')
+                                 if uri.strip()],
+        REPLICA_MAX_LAG_SECONDS=float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5)),
+        REPLICA_STICKY_SECONDS=float(os.environ.get('REPLICA_STICKY_SECONDS', 2)),
+        REPLICA_LAG_CHECK_SECONDS=float(os.environ.get('REPLICA_LAG_CHECK_SECONDS', 5)),
+        REPLICA_LAG_QUERY=os.environ.get('REPLICA_LAG_QUERY'),
+        # Cookie carrying a client's last write time to every worker, so its own reads skip replicas
+        REPLICA_WRITE_COOKIE=os.environ.get('REPLICA_WRITE_COOKIE', 'helix_wrote_at'),
+        # Read-through cache of encoded sequences for GET /api/sequences/<id> (ETag / 304): backend
+        # ('memory', 'none' or 'module:Class'), LRU size and TTL bounding writes it doesn't see (0: none)
+        SEQUENCE_CACHE_BACKEND=os.environ.get('SEQUENCE_CACHE_BACKEND', 'memory'),
+        SEQUENCE_CACHE_MAX_ENTRIES=int(os.environ.get('SEQUENCE_CACHE_MAX_ENTRIES', 10000)),
+        SEQUENCE_CACHE_TTL_SECONDS=float(os.environ.get('SEQUENCE_CACHE_TTL_SECONDS', 300)),
+        # Idempotency-Key on chat messages and sequence generation: how long responses are replayed,
+        # the lease after which a dead request's key can be retried, and how long (and how often) a
+        # retry waits on the request still running with its key
+        IDEMPOTENCY_TTL_SECONDS=float(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 86400)),
+        IDEMPOTENCY_LEASE_SECONDS=float(os.environ.get('IDEMPOTENCY_LEASE_SECONDS', 600)),
+        IDEMPOTENCY_WAIT_SECONDS=float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', 120)),
+        IDEMPOTENCY_POLL_SECONDS=float(os.environ.get('IDEMPOTENCY_POLL_SECONDS', 0.25)),
     )
     
     # Update config from the provided config object (from environment variables)
@@ -26,23 +136,60 @@ def create_app(config=None):
         app.config.update(config)
         
     # Enable CORS for all routes and origins
-    CORS(app, resources={r"/*": {"origins": "*"}})
+    CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
     
     # Initialize extensions
-    from .database import db
+    from .database import db, init_replicas
     db.init_app(app)
+    # Read-only views (@replica_reads) use SQLALCHEMY_REPLICA_URIS when they are fresh enough
+    init_replicas(app)
     
     # Register blueprints
-    from .api import chat_bp, sequence_bp
+    from .api import chat_bp, sequence_bp, admin_bp
     app.register_blueprint(chat_bp, url_prefix='/api/chat')
     app.register_blueprint(sequence_bp, url_prefix='/api/sequences')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    
+    # Report per-stage request timings (Server-Timing header + rolling stats)
+    from .utils.timing import finish_request_timer
+    app.after_request(finish_request_timer)
+    
+    # Write the request's LLM usage rows (and daily rollups) once it is done
+    from .services.usage_service import flush_llm_usage
+    app.teardown_request(flush_llm_usage)
     
-    # Initialize Socket.IO with the Flask app
-    socketio.init_app(app, cors_allowed_origins="*", ping_timeout=60, ping_interval=25)
+    # Initialize Socket.IO with the Flask app. Packets are encoded by
+    # utils/serialization so pre-encoded payloads (RawJSON) are emitted as-is
+    from .utils import serialization
+    socketio.init_app(
+        app,
+        json=serialization,
+        cors_allowed_origins="*",
+        async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+        logger=app.config['SOCKETIO_LOGGER'],
+        engineio_logger=app.config['ENGINEIO_LOGGER'],
+        ping_timeout=60,
+        ping_interval=25
+    )
+    
+    # Socket.IO connect/disconnect tracking (a disconnect cancels in-flight requests)
+    from .api import socket_events  # noqa: F401
     
     # Create a route for testing
     @app.route('/api/health')
     def health_check():
         return {'status': 'ok', 'message': 'Helix Recruiting API is running'}
     
+    # Prometheus scrape endpoint for tool and LLM instrumentation
+    @app.route('/metrics')
+    def metrics():
+        from .utils.metrics import registry
+        return Response(registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+    
+    # Recently finished spans, optionally filtered by ?traceId=
+    @app.route('/api/traces')
+    def traces():
+        from .utils.tracing import get_finished_spans
+        return jsonify({'success': True, 'data': get_finished_spans(request.args.get('traceId'))})
+    
     return app 
\ No newline at end of file
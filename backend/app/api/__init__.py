@@ -1,4 +1,5 @@
 from .chat import bp as chat_bp
 from .sequence import bp as sequence_bp
+from .admin import bp as admin_bp
 
-__all__ = ['chat_bp', 'sequence_bp'] 
\ No newline at end of file
+__all__ = ['chat_bp', 'sequence_bp', 'admin_bp']
\ No newline at end of file
@@ -0,0 +1,142 @@
+from flask import Blueprint, request, jsonify, current_app
+
+from ..utils.timing import stage_stats
+
+bp = Blueprint('admin', __name__)
+
+@bp.route('/timings', methods=['GET'])
+def get_timings():
+    """
+    Get rolling p50/p95/p99 latency (ms) per stage for instrumented routes.
+    Optional ?route= filter, e.g. ?route=chat.send_message
+    """
+    return jsonify({
+        'success': True,
+        'data': stage_stats.summary(request.args.get('route'))
+    })
+
+@bp.route('/model-routes', methods=['GET'])
+def get_model_routes():
+    """
+    Get each model route's state (off/shadow/live), tier model, per-mode call
+    count, latency and estimated cost, plus recent shadow comparisons.
+    """
+    from ..services.ai_service import AIService
+    return jsonify({
+        'success': True,
+        'data': AIService.get_instance().router.summary(current_app.config)
+    })
+
+@bp.route('/llm-queue', methods=['GET'])
+def get_llm_queue():
+    """
+    Get the LLM scheduler's slots and, per priority class (interactive, refine,
+    bulk), queued and running calls, wait percentiles (ms), deadline timeouts
+    and promotions, plus the users with the most queued calls.
+    """
+    from ..services.ai_service import AIService
+    return jsonify({
+        'success': True,
+        'data': AIService.get_instance().scheduler.summary()
+    })
+
+@bp.route('/usage', methods=['GET'])
+def get_usage():
+    """
+    Get LLM token usage and estimated cost over the last ?days= (default 30),
+    grouped by ?groupBy=day|user|call_type|model, optionally for one ?userId=.
+    Read from the daily rollup, so the cost doesn't grow with call volume.
+    """
+    from ..services.usage_service import UsageService, GROUP_BY_COLUMNS
+    group_by = request.args.get('groupBy', 'day')
+    if group_by not in GROUP_BY_COLUMNS:
+        return jsonify({'success': False, 'error': f"groupBy must be one of {', '.join(GROUP_BY_COLUMNS)}"}), 400
+    days = request.args.get('days', 30, type=int)
+    return jsonify({
+        'success': True,
+        'data': UsageService.get_instance().summary(days, request.args.get('userId'), group_by)
+    })
+
+@bp.route('/usage/calls', methods=['GET'])
+def get_usage_calls():
+    """
+    Get individual LLM calls filtered by ?userId=, ?sequenceId= or
+    ?chatMessageId=, most recent first or most expensive first (?order=cost).
+    """
+    from ..services.usage_service import UsageService
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    return jsonify({
+        'success': True,
+        'data': UsageService.get_instance().calls(
+            user_id=request.args.get('userId'),
+            sequence_id=request.args.get('sequenceId'),
+            chat_message_id=request.args.get('chatMessageId'),
+            order=request.args.get('order', 'recent'),
+            limit=limit
+        )
+    })
+
+@bp.route('/prompt-anatomy', methods=['GET'])
+def get_prompt_anatomy():
+    """
+    Get the estimated token distribution of each prompt section (tools, base
+    system prompt, context blocks, history, user message) per call type, how
+    much of each is re-sent unchanged from the previous turn, and whether it
+    looks worth caching or trimming. Optional ?callType= filter.
+    Requires PROMPT_PROFILING_ENABLED.
+    """
+    from ..utils.prompt_profiler import prompt_profiler
+    return jsonify({
+        'success': True,
+        'data': {
+            'enabled': current_app.config['PROMPT_PROFILING_ENABLED'],
+            'callTypes': prompt_profiler.report(request.args.get('callType'))
+        }
+    })
+
+@bp.route('/intents', methods=['GET'])
+def get_intents():
+    """
+    Get the share of chat turns answered locally by the intent fast path,
+    counts per intent and the estimated model latency saved.
+    Optional ?message= (and &previous= for the last assistant reply) explains
+    how that message would be classified.
+    """
+    from ..services.ai_service import AIService
+    ai_service = AIService.get_instance()
+    data = ai_service.intent_stats()
+    if 'message' in request.args:
+        decision = ai_service.classify_intent(request.args['message'], request.args.get('previous'))
+        data['decision'] = {
+            'intent': decision.intent,
+            'reason': decision.reason,
+            'reply': decision.reply
+        } if decision else None
+    return jsonify({
+        'success': True,
+        'data': data
+    })
+
+@bp.route('/replicas', methods=['GET'])
+def get_replicas():
+    """
+    Get each read replica's health and last measured lag, plus how
+    replica-eligible reads were routed (replica, or primary and why).
+    """
+    from ..database.replicas import get_router
+    router = get_router()
+    return jsonify({
+        'success': True,
+        'data': router.summary() if router is not None else {'replicas': []}
+    })
+
+@bp.route('/sequence-cache', methods=['GET'])
+def get_sequence_cache():
+    """
+    Get the sequence document cache's size, TTL and hit/miss counts.
+    """
+    from ..services.sequence_cache import SequenceCache
+    return jsonify({
+        'success': True,
+        'data': SequenceCache.get_instance().summary()
+    })
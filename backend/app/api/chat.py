@@ -1,11 +1,20 @@
 import uuid
+from datetime import datetime
 from flask import Blueprint, request, jsonify, current_app
 from flask_socketio import emit
 
 from ..database.db import db
+from ..database.replicas import replica_reads
 from ..models import User, ChatMessage
 from ..services.ai_service import AIService
 from ..services.session_service import SessionService
+from ..services.retention_service import ChatRetentionService
+from ..services.llm_scheduler import set_llm_caller
+from ..services.usage_service import link_llm_usage
+from ..services.idempotency import idempotent
+from ..utils.tracing import traced
+from ..utils.timing import start_request_timer, stage
+from ..utils.cancellation import cancellable_route, raise_if_cancelled
 from .. import socketio
 
 bp = Blueprint('chat', __name__)
@@ -14,9 +23,14 @@ bp = Blueprint('chat', __name__)
 # We'll get an instance when needed within route functions
 
 @bp.route('/message', methods=['POST'])
+@traced('http.chat.send_message')
+@idempotent('chat.message')
+@cancellable_route('chat')
 async def send_message():
     """
     Handle a new message from the user and generate a response.
+    A newer message from the same user (or a Socket.IO disconnect) cancels this
+    one's in-flight work; it then returns 499 and nothing further is stored.
     """
     data = request.json
     
@@ -27,37 +41,45 @@ async def send_message():
     message_content = data['message']
     sequence_id = data.get('sequenceId')
     
+    # Per-stage timings are reported in the Server-Timing header
+    start_request_timer('chat.send_message')
+    
     # Check if user exists, create if not (for demo purposes)
-    user = User.query.get(user_id)
-    if not user:
-        user = User(
-            id=user_id,
-            email=f"user_{user_id}@example.com",  # Placeholder
-            name="Demo User"
-        )
-        db.session.add(user)
+    with stage('user_upsert'):
+        user = User.query.get(user_id)
+        if not user:
+            user = User(
+                id=user_id,
+                email=f"user_{user_id}@example.com",  # Placeholder
+                name="Demo User"
+            )
+            db.session.add(user)
+        set_llm_caller(user_id, user.company)
     
     # Store user message
-    user_message = ChatMessage(
-        id=str(uuid.uuid4()),
-        user_id=user_id,
-        sequence_id=sequence_id,
-        role='user',
-        content=message_content
-    )
-    db.session.add(user_message)
-    db.session.commit()
+    with stage('message_insert'):
+        user_message = ChatMessage(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            sequence_id=sequence_id,
+            role='user',
+            content=message_content
+        )
+        db.session.add(user_message)
+        db.session.commit()
     
     # Emit the user message via Socket.IO
-    socketio.emit('new_message', {
-        'id': user_message.id,
-        'role': 'user',
-        'content': user_message.content
-    })
+    with stage('socketio_emit'):
+        socketio.emit('new_message', {
+            'id': user_message.id,
+            'role': 'user',
+            'content': user_message.content
+        })
     
     try:
         # Get conversation history for context
-        history = get_conversation_history(user_id, limit=10)
+        with stage('history_query'):
+            history = get_conversation_history(user_id, limit=10)
         
         # Get user info for context
         user_info = {
@@ -69,8 +91,9 @@ async def send_message():
         current_app.logger.info(f"Processing message from user {user_id}: {message_content[:50]}...")
         
         # Get session context
-        session_service = SessionService.get_instance()
-        session_context = session_service.get_session_context(user_id)
+        with stage('session_context'):
+            session_service = SessionService.get_instance()
+            session_context = session_service.get_session_context(user_id)
         
         # Get AIService instance and generate response
         ai_service = AIService.get_instance()
@@ -82,6 +105,9 @@ async def send_message():
             session_context=session_context
         )
         
+        # Superseded while the response was being produced: don't store it (nor the tool messages below)
+        raise_if_cancelled()
+        
         # 如果有工具调用，将工具调用和结果添加到历史中
         if response.get('tool_calls') and len(response['tool_calls']) > 0:
             tool_call = response['tool_calls'][0]
@@ -96,7 +122,8 @@ async def send_message():
                     content="✅ Sequence updated successfully!"
                 )
                 db.session.add(chat_message)
-                db.session.commit()
+                with stage('commit'):
+                    db.session.commit()
                 
                 # 添加到返回消息中
                 history.append({
@@ -118,7 +145,8 @@ async def send_message():
                 content=f"I've executed the tool to generate a sequence for {response['tool_calls'][0]['arguments'].get('position')}. The sequence has been created successfully and is now available for review."
             )
             db.session.add(new_message)
-            db.session.commit()
+            with stage('commit'):
+                db.session.commit()
         
         # The response now contains both processed content and any tool calls
         response_content = response.get('content', '')
@@ -141,38 +169,46 @@ async def send_message():
             content=response_content
         )
         db.session.add(assistant_message)
+        link_llm_usage(chat_message_id=assistant_message.id)
         
         # Emit the assistant message via Socket.IO
-        socketio.emit('new_message', {
-            'id': assistant_message.id,
-            'role': 'assistant',
-            'content': response_content
-        })
-        
-        # Handle any tool calls
-        for tool_call in tool_calls:
-            # Emit the tool call notification
-            socketio.emit('tool_call', {
-                'name': tool_call['name'],
-                'arguments': tool_call['arguments']
+        with stage('socketio_emit'):
+            socketio.emit('new_message', {
+                'id': assistant_message.id,
+                'role': 'assistant',
+                'content': response_content
             })
             
-            # Handle specific tool responses if needed
-            if tool_call['name'] == 'generate_sequence' and 'result' in tool_call:
-                # If a sequence was generated, emit a sequence update
-                socketio.emit('sequence_updated', tool_call['result'])
+            # Handle any tool calls
+            for tool_call in tool_calls:
+                # Emit the tool call notification
+                socketio.emit('tool_call', {
+                    'name': tool_call['name'],
+                    'arguments': tool_call['arguments']
+                })
+                
+                # Handle specific tool responses if needed
+                if tool_call['name'] == 'generate_sequence' and 'result' in tool_call:
+                    # If a sequence was generated, emit a sequence update
+                    socketio.emit('sequence_updated', tool_call['result'])
         
         # Commit all database changes
-        db.session.commit()
+        with stage('commit'):
+            db.session.commit()
+        
+        response_data = {
+            'id': assistant_message.id,
+            'role': 'assistant',
+            'content': response_content,
+            'tool_calls': tool_calls
+        }
+        # Set when the turn was answered locally by the intent fast path
+        if response.get('intent'):
+            response_data['intent'] = response['intent']
         
         return jsonify({
             'success': True,
-            'data': {
-                'id': assistant_message.id,
-                'role': 'assistant',
-                'content': response_content,
-                'tool_calls': tool_calls
-            }
+            'data': response_data
         })
         
     except Exception as e:
@@ -181,6 +217,7 @@ async def send_message():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @bp.route('/history/<user_id>', methods=['GET'])
+@replica_reads
 def get_chat_history(user_id):
     """
     Get chat history for a specific user.
@@ -214,6 +251,36 @@ def get_chat_history(user_id):
         current_app.logger.error(f"Error retrieving chat history: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@bp.route('/history/<user_id>/full', methods=['GET'])
+@replica_reads
+def get_full_chat_history(user_id):
+    """
+    Get a page of a user's complete history, including archived messages.
+    Pass the returned nextBefore and nextBeforeId values as ?before=&beforeId=
+    to fetch the next older page.
+    """
+    try:
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        before = request.args.get('before')
+        before = datetime.fromisoformat(before) if before else None
+        
+        retention_service = ChatRetentionService.get_instance()
+        page = retention_service.get_full_history(user_id, limit=limit, before=before,
+                                                  before_id=request.args.get('beforeId') or None)
+        
+        return jsonify({
+            'success': True,
+            'data': page['messages'],
+            'nextBefore': page['nextBefore'],
+            'nextBeforeId': page['nextBeforeId']
+        })
+        
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid before timestamp'}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error retrieving full chat history: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 def get_conversation_history(user_id, limit=10):
     """
     Get recent conversation history for a user.
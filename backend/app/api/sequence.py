@@ -1,10 +1,17 @@
-from flask import Blueprint, request, jsonify, current_app
-from datetime import datetime
+from flask import Blueprint, Response, request, jsonify, current_app, send_file, stream_with_context
+import json
+from datetime import datetime, timezone
 from .. import socketio
 from ..database.db import db
+from ..database.replicas import replica_reads
 from ..models import User, Sequence, SequenceStep
 from ..services.sequence_service import SequenceService
 from ..services.session_service import SessionService
+from ..services.llm_scheduler import set_llm_caller
+from ..services.idempotency import idempotent
+from ..utils.tracing import traced
+from ..utils.cancellation import cancellable_route
+from ..utils.serialization import extend_object, json_response
 
 bp = Blueprint('sequence', __name__)
 
@@ -12,9 +19,13 @@ bp = Blueprint('sequence', __name__)
 # We'll get instances when needed within route functions
 
 @bp.route('/generate', methods=['POST'])
+@traced('http.sequences.generate')
+@idempotent('sequences.generate')
+@cancellable_route('generate', supersede=False)
 def generate_sequence():
     """
     Generate a new recruiting outreach sequence.
+    Cancelled (and the partial sequence removed) if the user's Socket.IO connection drops.
     """
     data = request.json
     
@@ -25,6 +36,13 @@ def generate_sequence():
     title = data['title']
     position = data['position']
     additional_info = data.get('additionalInfo')
+    # With reuse enabled, a near-duplicate of the user's sequences is offered as a reuseSuggestion
+    # instead of generating; send its id back as reuseFrom to accept it, or reuse=false to generate anyway
+    reuse = data.get('reuse')
+    reuse_from = data.get('reuseFrom')
+    step_count = data.get('stepCount')
+    if step_count is not None and (not isinstance(step_count, int) or not 1 <= step_count <= 10):
+        return jsonify({'success': False, 'error': 'stepCount must be an integer between 1 and 10'}), 400
     
     try:
         # Check if user exists, create if not (for demo purposes)
@@ -37,18 +55,35 @@ def generate_sequence():
             )
             db.session.add(user)
             db.session.commit()
+        set_llm_caller(user_id, user.company)
         
         # Get SequenceService instance and create sequence
         sequence_service = SequenceService.get_instance()
         
+        if reuse_from:
+            source = Sequence.query.get(reuse_from)
+            if source is None or source.user_id != user_id:
+                return jsonify({'success': False, 'error': "reuseFrom is not one of this user's sequences"}), 400
+        if reuse is None:
+            reuse = current_app.config['SEQUENCE_REUSE_ENABLED']
+        if reuse and not reuse_from:
+            suggestion = sequence_service.suggest_reuse(user_id, position, additional_info, step_count)
+            if suggestion:
+                return jsonify({'success': True, 'data': None, 'reuseSuggestion': suggestion})
+        
         # Handle async function with asyncio.run()
         import asyncio
         sequence = asyncio.run(sequence_service.create_sequence(
             user_id=user_id,
             title=title,
             position=position,
-            additional_info=additional_info
+            additional_info=additional_info,
+            reuse_from=reuse_from,
+            step_count=step_count
         ))
+        sequence_data = sequence.to_json()
+        if getattr(sequence, 'reused_from', None):
+            sequence_data = extend_object(sequence_data, {'reusedFrom': sequence.reused_from})
         
         # Update session state with new sequence
         session_service = SessionService.get_instance()
@@ -62,13 +97,10 @@ def generate_sequence():
             }
         })
         
-        # Emit event that a new sequence has been created
-        socketio.emit('sequence_updated', sequence.to_dict())
+        # Emit event that a new sequence has been created (the response reuses the same bytes)
+        socketio.emit('sequence_updated', sequence_data)
         
-        return jsonify({
-            'success': True,
-            'data': sequence.to_dict()
-        })
+        return json_response(sequence_data)
         
     except Exception as e:
         current_app.logger.error(f"Error generating sequence: {str(e)}")
@@ -113,63 +145,325 @@ def update_sequence():
             }
         })
         
-        # Emit event that sequence has been updated
+        # Emit event that sequence has been updated (the response reuses the same bytes)
         socketio.emit('sequence_updated', updated_sequence)
         
-        return jsonify({
-            'success': True,
-            'data': updated_sequence
-        })
+        return json_response(updated_sequence)
         
     except Exception as e:
         current_app.logger.error(f"Error updating sequence: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @bp.route('/<sequence_id>', methods=['GET'])
+@replica_reads
 def get_sequence(sequence_id):
     """
     Get a sequence by ID.
+    Served from the sequence cache when possible; answers 304 when If-None-Match has its ETag.
     """
     try:
-        # Get SequenceService instance and retrieve sequence
+        # Get SequenceService instance and retrieve the encoded sequence
         sequence_service = SequenceService.get_instance()
+        document = sequence_service.get_sequence_document(sequence_id)
         
-        # Handle async function with asyncio.run()
-        import asyncio
-        sequence = asyncio.run(sequence_service.get_sequence(sequence_id))
-        
-        if not sequence:
+        if not document:
             return jsonify({'success': False, 'error': 'Sequence not found'}), 404
         
-        return jsonify({
-            'success': True,
-            'data': sequence.to_dict() if sequence else None
-        })
+        if request.if_none_match.contains(document.etag):
+            response = Response(status=304)
+        else:
+            response = json_response(document.payload)
+        response.set_etag(document.etag)
+        # Clients may keep the document but must revalidate it before each use
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
         
     except Exception as e:
         current_app.logger.error(f"Error retrieving sequence: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @bp.route('/user/<user_id>', methods=['GET'])
+@replica_reads
 def get_user_sequences(user_id):
     """
     Get all sequences for a specific user.
+    Loads everything in memory; use /export for bulk downloads.
     """
     try:
         # Get SequenceService instance and retrieve user sequences
         sequence_service = SequenceService.get_instance()
         sequences = sequence_service.get_user_sequences(user_id)
         
+        return json_response(sequences)
+        
+    except Exception as e:
+        current_app.logger.error(f"Error retrieving user sequences: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@bp.route('/export', methods=['GET'])
+@replica_reads
+def export_sequences():
+    """
+    Stream sequences and their steps as JSONL (one sequence per line, default)
+    or CSV (one step per row). Query params: format, userId, position
+    (case-insensitive substring), from / to (ISO dates on createdAt; a date-only
+    `to` is inclusive). Memory use doesn't grow with the size of the export.
+    """
+    from ..services.export_service import ExportService, EXPORT_FORMATS, parse_date_bound
+    fmt = request.args.get('format', 'jsonl')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        since = parse_date_bound(request.args.get('from'))
+        until = parse_date_bound(request.args.get('to'), end=True)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'from and to must be ISO dates'}), 400
+    
+    chunks = ExportService.get_instance().export(
+        fmt,
+        user_id=request.args.get('userId'),
+        position=request.args.get('position'),
+        since=since,
+        until=until
+    )
+    mimetype = 'application/x-ndjson' if fmt == 'jsonl' else 'text/csv'
+    filename = f"sequences-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
+    # stream_with_context keeps the request (and its DB session) alive while the body streams
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+def _candidate_upload():
+    """(error response, upload, input format, defaults) from a candidate-list multipart form."""
+    from ..services.personalization_service import INPUT_FORMATS
+    upload = request.files.get('candidates')
+    if upload is None:
+        return (jsonify({'success': False, 'error': 'A candidates file is required'}), 400), None, None, None
+    filename = (upload.filename or '').lower()
+    input_format = request.form.get('inputFormat') or (
+        'jsonl' if filename.endswith(('.jsonl', '.ndjson')) else 'csv')
+    if input_format not in INPUT_FORMATS:
+        error = f"inputFormat must be one of {', '.join(INPUT_FORMATS)}"
+        return (jsonify({'success': False, 'error': error}), 400), None, None, None
+    try:
+        defaults = json.loads(request.form.get('defaults') or '{}')
+    except ValueError:
+        defaults = None
+    if not isinstance(defaults, dict):
+        return (jsonify({'success': False, 'error': 'defaults must be a JSON object'}), 400), None, None, None
+    return None, upload, input_format, defaults
+
+@bp.route('/<sequence_id>/personalize', methods=['POST'])
+def personalize_sequence(sequence_id):
+    """
+    Mail-merge a sequence for a list of candidates.
+    Multipart form: candidates (CSV with a header row, or JSONL), inputFormat
+    (defaults from the file extension), format (jsonl or csv output), defaults
+    (JSON object of values for placeholders the file doesn't have) and
+    skipIncomplete. Placeholders are checked against the columns before
+    anything is rendered; the rendered emails are streamed back.
+    """
+    from ..services.personalization_service import PersonalizationService, OUTPUT_FORMATS
+    from ..utils.mail_merge import MissingFieldsError
+    error, upload, input_format, defaults = _candidate_upload()
+    if error:
+        return error
+    fmt = request.form.get('format', request.args.get('format', 'jsonl'))
+    if fmt not in OUTPUT_FORMATS:
+        return jsonify({'success': False, 'error': f"format must be one of {', '.join(OUTPUT_FORMATS)}"}), 400
+    skip_incomplete = request.form.get('skipIncomplete', 'false').lower() in ('1', 'true', 'yes')
+
+    try:
+        job = PersonalizationService.get_instance().prepare(
+            sequence_id, upload.stream, input_format, defaults=defaults, skip_incomplete=skip_incomplete)
+    except MissingFieldsError as e:
+        return jsonify({'success': False, 'error': str(e), 'missingFields': e.missing}), 400
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if job is None:
+        return jsonify({'success': False, 'error': 'Sequence not found'}), 404
+
+    mimetype = 'application/x-ndjson' if fmt == 'jsonl' else 'text/csv'
+    # The upload stays open for as long as the request context does
+    return Response(stream_with_context(job.render(fmt)), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="personalized-{sequence_id}.{fmt}"'})
+
+@bp.route('/<sequence_id>/personalize/jobs', methods=['POST'])
+def create_personalization_job(sequence_id):
+    """
+    Start a clustered LLM personalization job for a candidate list.
+    Same form as /personalize, plus profileColumns (comma-separated; by
+    default every column except name, email and similar identifiers).
+    Similar profiles are clustered and the opening step is rewritten once per
+    cluster; progress arrives as personalization_progress Socket.IO events.
+    Returns 202 with the job.
+    """
+    from ..services.personalization_pipeline import PersonalizationPipeline
+    from ..utils.mail_merge import MissingFieldsError
+    error, upload, input_format, defaults = _candidate_upload()
+    if error:
+        return error
+    profile_columns = [c.strip() for c in request.form.get('profileColumns', '').split(',') if c.strip()]
+
+    sequence = db.session.get(Sequence, sequence_id)
+    if sequence is None:
+        return jsonify({'success': False, 'error': 'Sequence not found'}), 404
+    pipeline = PersonalizationPipeline.get_instance()
+    try:
+        job = pipeline.create_job(sequence, upload.stream, input_format, profile_columns=profile_columns,
+                                  defaults=defaults)
+    except MissingFieldsError as e:
+        return jsonify({'success': False, 'error': str(e), 'missingFields': e.missing}), 400
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    pipeline.start(job.id)
+    return jsonify({'success': True, 'data': job.to_dict()}), 202
+
+@bp.route('/personalize/jobs/<job_id>', methods=['GET'])
+@replica_reads
+def get_personalization_job(job_id):
+    """
+    A personalization job's status and counters, with the variant written for each cluster.
+    """
+    from ..models import PersonalizationJob
+    from ..services.personalization_pipeline import PersonalizationPipeline
+    job = db.session.get(PersonalizationJob, job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({
+        'success': True,
+        'data': {**job.to_dict(), 'variants': PersonalizationPipeline.get_instance().variants(job_id)}
+    })
+
+@bp.route('/personalize/jobs/<job_id>/resume', methods=['POST'])
+def resume_personalization_job(job_id):
+    """
+    Resume a failed or interrupted job after its last finished phase.
+    """
+    from ..models import PersonalizationJob
+    from ..services.personalization_pipeline import PersonalizationPipeline
+    job = db.session.get(PersonalizationJob, job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    if job.status == 'completed':
+        return jsonify({'success': False, 'error': 'Job is already completed'}), 409
+    if not PersonalizationPipeline.get_instance().start(job_id):
+        return jsonify({'success': False, 'error': 'Job is already running'}), 409
+    return jsonify({'success': True, 'data': job.to_dict()}), 202
+
+@bp.route('/personalize/jobs/<job_id>/result', methods=['GET'])
+def get_personalization_result(job_id):
+    """
+    Download a completed job's output: one JSON line per candidate with their rendered steps.
+    """
+    from ..models import PersonalizationJob
+    from ..services.personalization_pipeline import PersonalizationPipeline
+    job = db.session.get(PersonalizationJob, job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    if job.status != 'completed':
+        return jsonify({'success': False, 'error': f'Job is {job.status}'}), 409
+    return send_file(PersonalizationPipeline.get_instance().output_path(job), mimetype='application/x-ndjson',
+                     as_attachment=True, download_name=f'personalized-{job.sequence_id}.jsonl')
+
+@bp.route('/<sequence_id>/enrollments', methods=['POST'])
+def enroll_candidates(sequence_id):
+    """
+    Enroll candidates in a sequence: its steps are emailed to them on a schedule by the send workers.
+    JSON body: candidates (list of {email, name, ...merge fields}), startAt
+    (ISO datetime of the first step, default now) and delaysHours (hours
+    before each step; later steps default to SEND_STEP_INTERVAL_HOURS).
+    Candidates already active in the sequence are skipped.
+    """
+    from ..services.send_scheduler import SendScheduler
+    from ..utils.mail_merge import MissingFieldsError
+    data = request.json
+    if not data or not isinstance(data.get('candidates'), list) or not data['candidates']:
+        return jsonify({'success': False, 'error': 'candidates must be a non-empty list'}), 400
+    delays = data.get('delaysHours')
+    if delays is not None and (not isinstance(delays, list) or
+                               not all(isinstance(d, (int, float)) and d >= 0 for d in delays)):
+        return jsonify({'success': False, 'error': 'delaysHours must be a list of non-negative numbers'}), 400
+    start_at = None
+    if data.get('startAt'):
+        try:
+            start_at = datetime.fromisoformat(data['startAt'].replace('Z', '+00:00'))
+        except (AttributeError, ValueError):
+            return jsonify({'success': False, 'error': 'startAt must be an ISO datetime'}), 400
+        if start_at.tzinfo is not None:
+            start_at = start_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    sequence = db.session.get(Sequence, sequence_id)
+    if sequence is None:
+        return jsonify({'success': False, 'error': 'Sequence not found'}), 404
+    try:
+        result = SendScheduler.get_instance().enroll(sequence, data['candidates'], start_at=start_at, delays=delays)
+    except MissingFieldsError as e:
+        return jsonify({'success': False, 'error': str(e), 'missingFields': e.missing}), 400
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'data': result}), 201
+
+@bp.route('/<sequence_id>/enrollments', methods=['GET'])
+@replica_reads
+def get_enrollments(sequence_id):
+    """
+    A page of a sequence's enrollments with counts by status (?status=, ?page=, ?pageSize=).
+    """
+    from ..services.send_scheduler import SendScheduler
+    page = max(1, request.args.get('page', 1, type=int))
+    page_size = min(200, max(1, request.args.get('pageSize', 50, type=int)))
+    return jsonify({
+        'success': True,
+        'data': SendScheduler.get_instance().enrollments(sequence_id, request.args.get('status'), page, page_size)
+    })
+
+@bp.route('/enrollments/<enrollment_id>/stop', methods=['POST'])
+def stop_enrollment(enrollment_id):
+    """
+    Stop an enrollment (e.g. the candidate replied); its next step is not sent.
+    """
+    from ..services.send_scheduler import SendScheduler
+    enrollment = SendScheduler.get_instance().stop(enrollment_id)
+    if enrollment is None:
+        return jsonify({'success': False, 'error': 'Enrollment not found'}), 404
+    return jsonify({'success': True, 'data': enrollment.to_dict()})
+
+@bp.route('/search', methods=['GET'])
+def search_sequences():
+    """
+    Full-text search over a user's sequences and their steps.
+    Query params: userId, q, page (default 1), pageSize (default 20, max 100).
+    """
+    user_id = request.args.get('userId')
+    query = request.args.get('q', '')
+
+    if not user_id:
+        return jsonify({'success': False, 'error': 'Missing required fields'}), 400
+
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        page_size = min(max(int(request.args.get('pageSize', 20)), 1), 100)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'page and pageSize must be integers'}), 400
+
+    try:
+        sequence_service = SequenceService.get_instance()
+        results = sequence_service.search_sequences(user_id, query, page=page, page_size=page_size)
+
         return jsonify({
             'success': True,
-            'data': sequences
+            'data': results['results'],
+            'page': results['page'],
+            'pageSize': results['pageSize'],
+            'hasMore': results['hasMore']
         })
-        
+
     except Exception as e:
-        current_app.logger.error(f"Error retrieving user sequences: {str(e)}")
+        current_app.logger.error(f"Error searching sequences: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @bp.route('/refine', methods=['POST'])
+@traced('http.sequences.refine')
 def refine_step():
     """
     Refine a specific step based on user feedback.
@@ -184,6 +478,12 @@ def refine_step():
     feedback = data['feedback']
     
     try:
+        # The sequence owner's LLM share pays for the refinement
+        owner = db.session.query(Sequence.user_id, User.company).outerjoin(
+            User, User.id == Sequence.user_id).filter(Sequence.id == sequence_id).first()
+        if owner:
+            set_llm_caller(owner.user_id, owner.company)
+        
         # Get SequenceService instance and refine step
         sequence_service = SequenceService.get_instance()
         
@@ -200,12 +500,9 @@ def refine_step():
         
         # Get the full sequence to emit an update
         sequence = asyncio.run(sequence_service.get_sequence(sequence_id))
-        socketio.emit('sequence_updated', sequence.to_dict() if sequence else {})
+        socketio.emit('sequence_updated', sequence.to_json() if sequence else {})
         
-        return jsonify({
-            'success': True,
-            'data': updated_step
-        })
+        return json_response(updated_step)
         
     except Exception as e:
         current_app.logger.error(f"Error refining step: {str(e)}")
@@ -0,0 +1,89 @@
+import time
+import threading
+from typing import Dict, Set
+
+from flask import request, current_app
+from flask_socketio import join_room
+
+from .. import socketio
+from ..utils.cancellation import request_cancellations
+
+# Connected Socket.IO session ids per user; clients identify themselves with
+# ?userId= (or auth={'userId': ...}) when connecting
+_user_sids: Dict[str, Set[str]] = {}
+_sid_users: Dict[str, str] = {}
+# Users whose last connection dropped, by disconnect number, until the grace window ends
+_pending_cancels: Dict[str, int] = {}
+_disconnects = 0
+_lock = threading.Lock()
+
+
+def user_room(user_id: str) -> str:
+    """Room every connection of this user joins, for events meant only for them."""
+    return f"user:{user_id}"
+
+
+@socketio.on('connect')
+def handle_connect(auth=None):
+    user_id = (auth or {}).get('userId') if isinstance(auth, dict) else None
+    user_id = user_id or request.args.get('userId')
+    if not user_id:
+        return
+    with _lock:
+        _user_sids.setdefault(user_id, set()).add(request.sid)
+        _sid_users[request.sid] = user_id
+        # Back within the grace window: their requests keep running
+        _pending_cancels.pop(user_id, None)
+    join_room(user_room(user_id))
+
+
+@socketio.on('disconnect')
+def handle_disconnect(*args):
+    """Cancel the user's in-flight requests once their last connection is gone
+    and they haven't reconnected within SOCKETIO_DISCONNECT_GRACE_SECONDS."""
+    global _disconnects
+    with _lock:
+        user_id = _sid_users.pop(request.sid, None)
+        if user_id is None:
+            return
+        sids = _user_sids.get(user_id, set())
+        sids.discard(request.sid)
+        if sids:
+            return
+        _user_sids.pop(user_id, None)
+        _disconnects += 1
+        _pending_cancels[user_id] = disconnect = _disconnects
+    grace = current_app.config['SOCKETIO_DISCONNECT_GRACE_SECONDS']
+    if grace > 0:
+        socketio.start_background_task(_cancel_after_grace, current_app._get_current_object(), user_id,
+                                       disconnect, grace)
+    else:
+        _cancel_if_gone(current_app, user_id, disconnect)
+
+
+@socketio.on('cancel')
+def handle_cancel(*args):
+    """Explicit cancel from the client (e.g. a Stop button): cancel the user's in-flight requests now."""
+    with _lock:
+        user_id = _sid_users.get(request.sid)
+    if user_id is None:
+        return
+    cancelled = request_cancellations.cancel_user(user_id, 'client')
+    current_app.logger.info(f"Cancelled {cancelled} in-flight request(s) for {user_id} on request")
+
+
+def _cancel_after_grace(app, user_id: str, disconnect: int, grace: float) -> None:
+    time.sleep(grace)
+    with app.app_context():
+        _cancel_if_gone(app, user_id, disconnect)
+
+
+def _cancel_if_gone(app, user_id: str, disconnect: int) -> None:
+    with _lock:
+        # Reconnected (and maybe dropped again, which has its own window) since this disconnect
+        if _pending_cancels.get(user_id) != disconnect:
+            return
+        del _pending_cancels[user_id]
+    cancelled = request_cancellations.cancel_user(user_id, 'disconnect')
+    if cancelled:
+        app.logger.info(f"Cancelled {cancelled} in-flight request(s) for {user_id} after disconnect")
@@ -1,3 +1,4 @@
-from .db import db, init_app
+from .db import db, init_app, prewarm_connections
+from .replicas import init_replicas, replica_reads
 
-__all__ = ['db', 'init_app'] 
\ No newline at end of file
+__all__ = ['db', 'init_app', 'prewarm_connections', 'init_replicas', 'replica_reads']
\ No newline at end of file
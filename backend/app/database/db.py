@@ -1,11 +1,46 @@
+import itertools
+
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import text
+from sqlalchemy.sql import Select
+from sqlalchemy import event, text
+
+from .replicas import row_keys
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+class RoutingSession(Session):
+    """Session that runs a @replica_reads view's plain SELECTs on the replica chosen for it.
+
+    Flushes, INSERT/UPDATE/DELETE statements and SELECT ... FOR UPDATE always
+    go to the primary; see app/database/replicas.py for how replicas are chosen.
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and isinstance(clause, Select) and clause._for_update_arg is None and has_app_context():
+            engine = g.get('db_read_engine')
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _note_flush(session, flush_context):
+    # Read-your-writes: the users and sequences of the flushed rows are remembered once the request finishes
+    if has_app_context():
+        g.db_wrote = True
+        keys = g.setdefault('db_write_keys', set())
+        for row in itertools.chain(session.new, session.dirty, session.deleted):
+            keys.update(row_keys(row))
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _note_write_statement(orm_execute_state):
+    if has_app_context() and (orm_execute_state.is_insert or orm_execute_state.is_update
+                              or orm_execute_state.is_delete):
+        g.db_wrote = True
+
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
 
 def init_app(app):
     # SQLAlchemy configuration should already be set in app.config
@@ -13,4 +48,26 @@ def init_app(app):
     if 'SQLALCHEMY_TRACK_MODIFICATIONS' not in app.config:
         app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
-    db.init_app(app) 
\ No newline at end of file
+    db.init_app(app) 
+
+def prewarm_connections(app, count=None):
+    """Open `count` pooled connections up front so the first requests don't pay for connects.
+    
+    Defaults to the DB_POOL_PREWARM config value. Returns the number of connections opened.
+    """
+    count = app.config.get('DB_POOL_PREWARM', 0) if count is None else count
+    if not count:
+        return 0
+    
+    with app.app_context():
+        connections = []
+        try:
+            for _ in range(count):
+                conn = db.engine.connect()
+                conn.execute(text('SELECT 1'))
+                connections.append(conn)
+        finally:
+            # Returning them to the pool keeps them open for reuse
+            for conn in connections:
+                conn.close()
+    return len(connections)
@@ -0,0 +1,119 @@
+"""
+Operations available to migration scripts through MigrationContext.
+
+New-style migrations define `upgrade(ctx)` and receive a MigrationContext.
+Operations that must not hold long locks on large tables are provided here:
+
+- create_index: CREATE INDEX CONCURRENTLY on PostgreSQL (outside a
+  transaction), plain CREATE INDEX IF NOT EXISTS elsewhere
+- backfill: UPDATE in bounded batches, one transaction per batch, with
+  progress output and a sleep between batches to throttle write load
+"""
+
+import time
+from typing import Dict, Any, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+
+class MigrationContext:
+    def __init__(self, engine: Engine, dry_run: bool = False):
+        self.engine = engine
+        self.dry_run = dry_run
+
+    @property
+    def dialect(self) -> str:
+        return self.engine.dialect.name
+
+    @property
+    def is_postgres(self) -> bool:
+        return self.dialect == 'postgresql'
+
+    def execute(self, sql: str, params: Optional[Dict[str, Any]] = None, autocommit: bool = False) -> None:
+        """Execute one statement in its own transaction (or in autocommit mode)."""
+        if self.dry_run:
+            print(f"  [dry-run] {' '.join(sql.split())}")
+            return
+        if autocommit:
+            with self.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                conn.execute(text(sql), params or {})
+        else:
+            with self.engine.begin() as conn:
+                conn.execute(text(sql), params or {})
+
+    def scalar(self, sql: str, params: Optional[Dict[str, Any]] = None):
+        with self.engine.connect() as conn:
+            return conn.execute(text(sql), params or {}).scalar()
+
+    def create_index(self, name: str, table: str, columns: Sequence[str], unique: bool = False,
+                     where: Optional[str] = None, using: Optional[str] = None) -> None:
+        """Create an index without blocking writes on PostgreSQL.
+
+        A failed CONCURRENTLY build leaves an INVALID index behind; it is
+        dropped and rebuilt so the migration can simply be re-run.
+        """
+        unique_sql = 'UNIQUE ' if unique else ''
+        where_sql = f" WHERE {where}" if where else ''
+        using_sql = f" USING {using}" if using else ''
+        column_sql = ', '.join(columns)
+
+        if self.is_postgres:
+            invalid = self.scalar(
+                "SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name",
+                {'name': name}
+            )
+            if invalid:
+                print(f"  Dropping invalid index {name} left by an interrupted build")
+                self.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}", autocommit=True)
+            self.execute(
+                f"CREATE {unique_sql}INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table}{using_sql} ({column_sql}){where_sql}",
+                autocommit=True
+            )
+        else:
+            self.execute(f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table}{using_sql} ({column_sql}){where_sql}")
+
+    def drop_index(self, name: str) -> None:
+        if self.is_postgres:
+            self.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}", autocommit=True)
+        else:
+            self.execute(f"DROP INDEX IF EXISTS {name}")
+
+    def backfill(self, table: str, set_sql: str, where_sql: str, key: str = 'id', batch_size: int = 1000,
+                 sleep_seconds: float = 0.05, max_batches: Optional[int] = None,
+                 params: Optional[Dict[str, Any]] = None) -> int:
+        """Apply `UPDATE table SET set_sql` to rows matching `where_sql` in batches.
+
+        `where_sql` must stop matching a row once it has been updated (e.g.
+        `new_col IS NULL`), otherwise the loop never finishes. Each batch
+        commits on its own, so locks are held only for one batch at a time and
+        an interrupted backfill resumes where it stopped.
+        """
+        params = dict(params or {})
+        remaining = self.scalar(f"SELECT COUNT(*) FROM {table} WHERE {where_sql}", params) or 0
+        print(f"  Backfilling {remaining} rows in {table} (batch size {batch_size})")
+        if self.dry_run or not remaining:
+            return 0
+
+        # On PostgreSQL, skip rows locked by live traffic instead of waiting on them
+        lock_sql = ' FOR UPDATE SKIP LOCKED' if self.is_postgres else ''
+        batch_sql = (
+            f"UPDATE {table} SET {set_sql} WHERE {key} IN "
+            f"(SELECT {key} FROM {table} WHERE {where_sql} LIMIT :_batch_size{lock_sql})"
+        )
+        updated = 0
+        batches = 0
+        start = time.perf_counter()
+        while max_batches is None or batches < max_batches:
+            with self.engine.begin() as conn:
+                count = conn.execute(text(batch_sql), {**params, '_batch_size': batch_size}).rowcount
+            if not count:
+                break
+            updated += count
+            batches += 1
+            elapsed = time.perf_counter() - start
+            rate = updated / elapsed if elapsed else 0.0
+            print(f"  ... {updated}/{remaining} rows ({rate:.0f} rows/s)")
+            if sleep_seconds:
+                time.sleep(sleep_seconds)
+        return updated
@@ -0,0 +1,273 @@
+"""
+Read-replica routing.
+
+Views decorated with @replica_reads run their SELECTs on a read replica
+(SQLALCHEMY_REPLICA_URIS) instead of the primary; everything else, and any
+write or SELECT ... FOR UPDATE such a view makes, stays on the primary (see
+RoutingSession in db.py). A replica is used only when:
+
+- it answered its last health/lag probe (every REPLICA_LAG_CHECK_SECONDS)
+- its replication lag is at most REPLICA_MAX_LAG_SECONDS
+- read-your-writes: no write mentioning the same user or sequence happened
+  within the replica's lag plus REPLICA_STICKY_SECONDS, and the client made
+  no write of its own in that time
+
+otherwise the read falls back to the primary. A request that wrote is
+remembered two ways:
+
+- in this process, by the user and sequence ids of the rows it flushed
+  (row_keys(), from the session's after_flush) and the ids it names (path,
+  JSON body or query string), so anyone's read of a just-changed sequence
+  handled here uses the primary
+- in a cookie holding the write's time (REPLICA_WRITE_COOKIE), which the
+  client sends to whichever worker serves its next read, so its own reads
+  use the primary there too
+
+while reads of other sequences, and other clients' reads in other
+processes, may use a replica.
+
+Lag is measured on PostgreSQL from the WAL replay position and timestamp;
+REPLICA_LAG_QUERY (SQL returning seconds) overrides that, e.g. for a
+heartbeat table. Replicas on other databases without a lag query are
+treated as current.
+"""
+
+import time
+import logging
+import threading
+import itertools
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+
+from ..utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_db_reads_total = registry.counter('helix_db_replica_reads_total',
+                                   'Replica-eligible requests by target (replica, primary) and reason')
+_replica_lag_seconds = registry.gauge('helix_db_replica_lag_seconds', 'Last measured replication lag per replica')
+_replica_up = registry.gauge('helix_db_replica_up', 'Whether the replica answered its last probe (1) or not (0)')
+
+POSTGRES_LAG_QUERY = (
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+# Request fields whose values key read-your-writes stickiness
+_KEY_FIELDS = {'user_id': 'user', 'userId': 'user', 'sequence_id': 'sequence', 'sequenceId': 'sequence'}
+
+# Tables whose own id is a stickiness key, and columns naming the user or sequence a row belongs to
+_ROW_TABLES = {'users': 'user', 'sequences': 'sequence'}
+_ROW_ATTRIBUTES = {'user_id': 'user', 'sequence_id': 'sequence', 'active_sequence_id': 'sequence'}
+
+_READ_ROUTES = (('replica', 'fresh'), ('primary', 'recent_write'), ('primary', 'lagging'),
+                ('primary', 'unavailable'))
+
+# Remembered writes are pruned once there are this many
+_MAX_TRACKED_WRITES = 100000
+
+
+class Replica:
+    def __init__(self, name: str, engine: Engine, lag_query: Optional[str]):
+        self.name = name
+        self.engine = engine
+        self.lag_query = lag_query
+        self.healthy = True
+        self.lag = 0.0
+        self.checked_at = 0.0
+        self.error: Optional[str] = None
+
+    def probe(self) -> None:
+        try:
+            with self.engine.connect() as conn:
+                lag = conn.execute(text(self.lag_query or 'SELECT 0')).scalar()
+            self.lag = max(0.0, float(lag or 0))
+            self.healthy = True
+            self.error = None
+        except Exception as e:
+            if self.healthy:
+                logger.warning(f"Read replica {self.name} is unavailable: {str(e)}")
+            self.healthy = False
+            self.error = str(e)
+        self.checked_at = time.monotonic()
+        _replica_up.set(1 if self.healthy else 0, {'replica': self.name})
+        _replica_lag_seconds.set(self.lag, {'replica': self.name})
+
+    def summary(self) -> Dict[str, Any]:
+        return {'name': self.name, 'healthy': self.healthy, 'lagSeconds': round(self.lag, 3), 'error': self.error,
+                'checkedSecondsAgo': round(time.monotonic() - self.checked_at, 1) if self.checked_at else None}
+
+
+class ReplicaRouter:
+    def __init__(self, uris: List[str], config: Dict[str, Any]):
+        self.max_lag = config['REPLICA_MAX_LAG_SECONDS']
+        self.sticky_seconds = config['REPLICA_STICKY_SECONDS']
+        self.check_seconds = config['REPLICA_LAG_CHECK_SECONDS']
+        engine_options = config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+        self.replicas: List[Replica] = []
+        for number, uri in enumerate(uris):
+            engine = create_engine(uri, **engine_options)
+            lag_query = config.get('REPLICA_LAG_QUERY') or (
+                POSTGRES_LAG_QUERY if engine.dialect.name == 'postgresql' else None)
+            self.replicas.append(Replica(f"replica{number}", engine, lag_query))
+        self._writes: Dict[str, float] = {}
+        self._probe_lock = threading.Lock()
+        self._next = itertools.count()
+
+    def _refresh(self) -> None:
+        # One thread probes while the others route on the previous results
+        if not self._probe_lock.acquire(blocking=False):
+            return
+        try:
+            now = time.monotonic()
+            for replica in self.replicas:
+                if now - replica.checked_at >= self.check_seconds:
+                    replica.probe()
+        finally:
+            self._probe_lock.release()
+
+    def note_write(self, keys: Iterable[str]) -> None:
+        now = time.monotonic()
+        if len(self._writes) >= _MAX_TRACKED_WRITES:
+            horizon = now - self.max_lag - self.sticky_seconds
+            self._writes = {key: at for key, at in self._writes.items() if at > horizon}
+        for key in keys:
+            self._writes[key] = now
+
+    def choose(self, keys: Iterable[str], client_wrote_at: Optional[float] = None) -> Optional[Replica]:
+        """A replica fresh enough for a read naming these keys, or None to read from the primary.
+
+        client_wrote_at is the wall-clock time of the client's own last write, if known.
+        """
+        self._refresh()
+        now = time.monotonic()
+        last_write = max((self._writes.get(key, 0.0) for key in keys), default=0.0)
+        since_write = now - last_write if last_write else None
+        if client_wrote_at is not None:
+            since_client_write = max(0.0, time.time() - client_wrote_at)
+            since_write = since_client_write if since_write is None else min(since_write, since_client_write)
+        candidates = [replica for replica in self.replicas if replica.healthy]
+        if not candidates:
+            _db_reads_total.inc(labels={'target': 'primary', 'reason': 'unavailable'})
+            return None
+        candidates = [replica for replica in candidates if replica.lag <= self.max_lag]
+        if not candidates:
+            _db_reads_total.inc(labels={'target': 'primary', 'reason': 'lagging'})
+            return None
+        if since_write is not None:
+            candidates = [replica for replica in candidates if since_write > replica.lag + self.sticky_seconds]
+            if not candidates:
+                _db_reads_total.inc(labels={'target': 'primary', 'reason': 'recent_write'})
+                return None
+        _db_reads_total.inc(labels={'target': 'replica', 'reason': 'fresh'})
+        return candidates[next(self._next) % len(candidates)]
+
+    def summary(self) -> Dict[str, Any]:
+        reads = {f"{target}:{reason}": int(_db_reads_total.get({'target': target, 'reason': reason}))
+                 for target, reason in _READ_ROUTES}
+        return {'replicas': [replica.summary() for replica in self.replicas], 'reads': reads,
+                'maxLagSeconds': self.max_lag, 'stickySeconds': self.sticky_seconds,
+                'trackedWrites': len(self._writes)}
+
+    def dispose(self) -> None:
+        for replica in self.replicas:
+            replica.engine.dispose()
+
+
+def get_router() -> Optional[ReplicaRouter]:
+    return current_app.extensions.get('db_replicas')
+
+
+def request_keys(include_body: bool = False) -> Set[str]:
+    """Stickiness keys ('user:<id>', 'sequence:<id>') for the ids this request names."""
+    keys = set()
+    sources = [request.view_args or {}, request.args]
+    if include_body:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            sources.append(body)
+        sources.append(request.form)
+    for source in sources:
+        for field, kind in _KEY_FIELDS.items():
+            value = source.get(field)
+            if isinstance(value, (str, int)) and value != '':
+                keys.add(f"{kind}:{value}")
+    return keys
+
+
+def row_keys(row: Any) -> Set[str]:
+    """Stickiness keys for the user and sequence a model instance belongs to."""
+    keys = set()
+    table = getattr(row, '__tablename__', None)
+    if table in _ROW_TABLES and getattr(row, 'id', None):
+        keys.add(f"{_ROW_TABLES[table]}:{row.id}")
+    for attribute, kind in _ROW_ATTRIBUTES.items():
+        value = getattr(row, attribute, None)
+        if isinstance(value, (str, int)) and value != '':
+            keys.add(f"{kind}:{value}")
+    return keys
+
+
+def _client_wrote_at() -> Optional[float]:
+    try:
+        return float(request.cookies[current_app.config['REPLICA_WRITE_COOKIE']])
+    except (KeyError, ValueError):
+        return None
+
+
+def replica_reads(view):
+    """Run this view's SELECTs on a read replica when one is fresh enough (see module docstring)."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        router = get_router()
+        if router is not None:
+            replica = router.choose(request_keys(), _client_wrote_at())
+            g.db_read_engine = replica.engine if replica is not None else None
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def primary_reads():
+    """Run the enclosed reads on the primary, even within a @replica_reads view.
+
+    For reads whose result outlives the request (e.g. filling a cache), where
+    a lagging replica's answer would be kept after it was corrected.
+    """
+    engine = g.pop('db_read_engine', None) if has_app_context() else None
+    try:
+        yield
+    finally:
+        if engine is not None:
+            g.db_read_engine = engine
+
+
+def note_request_writes(response):
+    """after_request hook: remember the ids of a request that wrote to the primary, here and in a cookie."""
+    router = get_router()
+    if router is None or not has_request_context():
+        return response
+    keys = g.pop('db_write_keys', set())
+    if g.pop('db_wrote', False):
+        router.note_write(keys | request_keys(include_body=True))
+        # Long enough to outlast the stickiness window on any replica within REPLICA_MAX_LAG_SECONDS
+        response.set_cookie(current_app.config['REPLICA_WRITE_COOKIE'], f"{time.time():.3f}",
+                            max_age=int(router.max_lag + router.sticky_seconds) + 1,
+                            httponly=True, samesite='Lax')
+    return response
+
+
+def init_replicas(app) -> Optional[ReplicaRouter]:
+    uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+    if not uris:
+        return None
+    router = ReplicaRouter(uris, app.config)
+    app.extensions['db_replicas'] = router
+    app.after_request(note_request_writes)
+    return router
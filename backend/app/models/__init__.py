@@ -1,6 +1,12 @@
 from .user import User
 from .sequence import Sequence, SequenceStep
-from .chat import ChatMessage
+from .chat import ChatMessage, ChatMessageArchive
 from .session import SessionState
+from .usage import LLMUsage, LLMUsageDaily
+from .personalization import PersonalizationJob, PersonalizationVariant
+from .sending import SequenceEnrollment, ScheduledSend
+from .idempotency import IdempotencyKey
 
-__all__ = ['User', 'Sequence', 'SequenceStep', 'ChatMessage', 'SessionState'] 
\ No newline at end of file
+__all__ = ['User', 'Sequence', 'SequenceStep', 'ChatMessage', 'ChatMessageArchive', 'SessionState',
+           'LLMUsage', 'LLMUsageDaily', 'PersonalizationJob', 'PersonalizationVariant', 'SequenceEnrollment',
+           'ScheduledSend', 'IdempotencyKey']
\ No newline at end of file
@@ -1,12 +1,16 @@
 from datetime import datetime
 import uuid
-from sqlalchemy import String, DateTime, Text, ForeignKey
+from sqlalchemy import String, DateTime, Text, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from ..database.db import db
 
 class ChatMessage(db.Model):
     __tablename__ = 'chat_messages'
+    __table_args__ = (
+        Index('ix_chat_messages_user_created', 'user_id', 'created_at'),
+        Index('ix_chat_messages_created_at', 'created_at'),  # Retention scans
+    )
     
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id: Mapped[str] = mapped_column(ForeignKey('users.id'), nullable=False)
@@ -24,4 +28,31 @@ class ChatMessage(db.Model):
             'role': self.role,
             'content': self.content,
             'created_at': self.created_at.isoformat()
-        } 
\ No newline at end of file
+        } 
+
+class ChatMessageArchive(db.Model):
+    """Cold storage for chat messages moved out of chat_messages by the retention job.
+    
+    On PostgreSQL the table is range-partitioned by created_at (one partition per
+    month, see migrations/0003), so the primary key includes created_at.
+    """
+    __tablename__ = 'chat_messages_archive'
+    __table_args__ = (
+        Index('ix_chat_messages_archive_user_created', 'user_id', 'created_at'),
+    )
+    
+    id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(36), nullable=False)
+    sequence_id: Mapped[str] = mapped_column(String(36), nullable=True)
+    role: Mapped[str] = mapped_column(String(50), nullable=False)
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'role': self.role,
+            'content': self.content,
+            'created_at': self.created_at.isoformat()
+        }
@@ -0,0 +1,33 @@
+from datetime import datetime
+from sqlalchemy import String, DateTime, Text, Integer, Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..database.db import db
+
+class IdempotencyKey(db.Model):
+    """A client's Idempotency-Key for one endpoint, and the response it got.
+
+    The row is `in_progress` while the first request carrying the key runs,
+    then `completed` with the stored response, which retries get instead of
+    running again. `expires_at` is the in-progress lease (a key whose request
+    died can be retried once it passes) and, once completed, how long the
+    response is kept.
+    """
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        Index('ix_idempotency_keys_expires', 'expires_at'),
+    )
+
+    id: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256 of scope, user and key
+    scope: Mapped[str] = mapped_column(String(50), nullable=False)
+    key: Mapped[str] = mapped_column(String(255), nullable=False)
+    user_id: Mapped[str] = mapped_column(String(36), nullable=True)
+    request_hash: Mapped[str] = mapped_column(String(64), nullable=False)  # sha256 of the request body
+    # in_progress or completed
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default='in_progress')
+    response_status: Mapped[int] = mapped_column(Integer, nullable=True)
+    response_body: Mapped[str] = mapped_column(Text, nullable=True)
+    response_mimetype: Mapped[str] = mapped_column(String(100), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    completed_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
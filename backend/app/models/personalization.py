@@ -0,0 +1,90 @@
+from datetime import datetime
+import uuid
+import json
+from sqlalchemy import String, DateTime, Text, Integer, Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..database.db import db
+
+class PersonalizationJob(db.Model):
+    """A clustered LLM personalization run over an uploaded candidate list.
+
+    The row is the job's checkpoint: `phase` is the last phase that finished
+    (None, clustered, generated, rendered), so a failed or interrupted job
+    resumes with the next one, and the counters say how far it got. The
+    upload, cluster assignments and output live in the job's directory.
+    """
+    __tablename__ = 'personalization_jobs'
+    __table_args__ = (
+        Index('ix_personalization_jobs_user_created', 'user_id', 'created_at'),
+    )
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id: Mapped[str] = mapped_column(String(36), nullable=False)
+    sequence_id: Mapped[str] = mapped_column(String(36), nullable=False)
+    # pending, running, completed or failed
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default='pending')
+    phase: Mapped[str] = mapped_column(String(20), nullable=True)
+    input_format: Mapped[str] = mapped_column(String(10), nullable=False, default='csv')
+    profile_columns: Mapped[str] = mapped_column(Text, nullable=True)  # JSON list
+    defaults: Mapped[str] = mapped_column(Text, nullable=True)  # JSON object
+    candidates: Mapped[int] = mapped_column(Integer, default=0)
+    clusters: Mapped[int] = mapped_column(Integer, default=0)
+    overflow: Mapped[int] = mapped_column(Integer, default=0)  # Candidates left with the original step
+    variants_done: Mapped[int] = mapped_column(Integer, default=0)
+    rendered: Mapped[int] = mapped_column(Integer, default=0)
+    llm_calls: Mapped[int] = mapped_column(Integer, default=0)
+    error: Mapped[str] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+    def get_profile_columns(self):
+        return json.loads(self.profile_columns) if self.profile_columns else []
+
+    def get_defaults(self):
+        return json.loads(self.defaults) if self.defaults else {}
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'userId': self.user_id,
+            'sequenceId': self.sequence_id,
+            'status': self.status,
+            'phase': self.phase,
+            'inputFormat': self.input_format,
+            'profileColumns': self.get_profile_columns(),
+            'candidates': self.candidates,
+            'clusters': self.clusters,
+            'overflow': self.overflow,
+            'variantsDone': self.variants_done,
+            'rendered': self.rendered,
+            'llmCalls': self.llm_calls,
+            'error': self.error,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'updatedAt': self.updated_at.isoformat() if self.updated_at else None,
+            'finishedAt': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class PersonalizationVariant(db.Model):
+    """The opening step written for one cluster of a job (null until generated)."""
+    __tablename__ = 'personalization_variants'
+
+    job_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    cluster: Mapped[int] = mapped_column(Integer, primary_key=True)
+    size: Mapped[int] = mapped_column(Integer, default=0)
+    profile: Mapped[str] = mapped_column(Text, nullable=True)  # JSON: fields most members share
+    # pending, generated, or fallback (the original step is used)
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default='pending')
+    title: Mapped[str] = mapped_column(String(255), nullable=True)
+    content: Mapped[str] = mapped_column(Text, nullable=True)
+
+    def to_dict(self):
+        return {
+            'cluster': self.cluster,
+            'size': self.size,
+            'profile': json.loads(self.profile) if self.profile else {},
+            'status': self.status,
+            'title': self.title,
+            'content': self.content
+        }
@@ -0,0 +1,96 @@
+from datetime import datetime
+import uuid
+import json
+from sqlalchemy import String, DateTime, Text, Integer, Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..database.db import db
+
+class SequenceEnrollment(db.Model):
+    """A candidate going through a sequence's steps, one email at a time.
+
+    Steps are addressed by their order rather than their id (editing a
+    sequence replaces its step rows), so an edit applies to every step an
+    enrollment hasn't been sent yet.
+    """
+    __tablename__ = 'sequence_enrollments'
+    __table_args__ = (
+        Index('ix_sequence_enrollments_sequence_status', 'sequence_id', 'status'),
+        Index('ix_sequence_enrollments_sequence_email', 'sequence_id', 'email'),
+    )
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    sequence_id: Mapped[str] = mapped_column(String(36), nullable=False)
+    user_id: Mapped[str] = mapped_column(String(36), nullable=False)
+    email: Mapped[str] = mapped_column(String(255), nullable=False)
+    name: Mapped[str] = mapped_column(String(255), nullable=True)
+    fields: Mapped[str] = mapped_column(Text, nullable=True)  # JSON object: merge values for [PLACEHOLDER]s
+    delays: Mapped[str] = mapped_column(Text, nullable=True)  # JSON list: hours before each step (else the default)
+    # active, completed, stopped or failed
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default='active')
+    steps_sent: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+    def get_fields(self):
+        return json.loads(self.fields) if self.fields else {}
+
+    def get_delays(self):
+        return json.loads(self.delays) if self.delays else []
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sequenceId': self.sequence_id,
+            'userId': self.user_id,
+            'email': self.email,
+            'name': self.name,
+            'fields': self.get_fields(),
+            'delaysHours': self.get_delays() or None,
+            'status': self.status,
+            'stepsSent': self.steps_sent,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'updatedAt': self.updated_at.isoformat() if self.updated_at else None,
+            'finishedAt': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class ScheduledSend(db.Model):
+    """The next email of an enrollment, due at `due_at`.
+
+    Each enrollment has at most one pending send; the one for the following
+    step is created when this one goes out. Claiming a send moves `due_at`
+    past the claim's lease (a visibility timeout), so rows claimed by a
+    worker that died become due again without a separate sweep, and the
+    (status, due_at) index is the only one the send loop reads.
+    `scheduled_at` keeps the original due time.
+    """
+    __tablename__ = 'scheduled_sends'
+    __table_args__ = (
+        Index('ix_scheduled_sends_status_due', 'status', 'due_at'),
+        Index('ix_scheduled_sends_enrollment', 'enrollment_id'),
+    )
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    enrollment_id: Mapped[str] = mapped_column(String(36), nullable=False)
+    step_order: Mapped[int] = mapped_column(Integer, nullable=False)
+    # pending, sent, failed or cancelled
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default='pending')
+    scheduled_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    due_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    claim_token: Mapped[str] = mapped_column(String(36), nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[str] = mapped_column(Text, nullable=True)
+    sent_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'enrollmentId': self.enrollment_id,
+            'stepOrder': self.step_order,
+            'status': self.status,
+            'scheduledAt': self.scheduled_at.isoformat() if self.scheduled_at else None,
+            'attempts': self.attempts,
+            'lastError': self.last_error,
+            'sentAt': self.sent_at.isoformat() if self.sent_at else None
+        }
@@ -1,12 +1,16 @@
 from datetime import datetime
 import uuid
-from sqlalchemy import String, DateTime, Text, ForeignKey
+from sqlalchemy import String, DateTime, Text, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from ..database.db import db
+from ..utils.serialization import encode_raw, memoized
 
 class SequenceStep(db.Model):
     __tablename__ = 'sequence_steps'
+    __table_args__ = (
+        Index('ix_sequence_steps_sequence_order', 'sequence_id', 'order'),
+    )
     
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     sequence_id: Mapped[str] = mapped_column(ForeignKey('sequences.id'), nullable=False)
@@ -26,9 +30,16 @@ class SequenceStep(db.Model):
             'content': self.content,
             'order': self.order
         }
+    
+    def to_json(self):
+        """to_dict() encoded, memoized per row version (see utils/serialization.py)."""
+        return memoized(('sequence_steps', self.id), lambda: encode_raw(self.to_dict()), self.updated_at)
 
 class Sequence(db.Model):
     __tablename__ = 'sequences'
+    __table_args__ = (
+        Index('ix_sequences_user_id', 'user_id'),
+    )
     
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id: Mapped[str] = mapped_column(ForeignKey('users.id'), nullable=False)
@@ -52,4 +63,11 @@ class Sequence(db.Model):
             'steps': [step.to_dict() for step in self.steps],
             'createdAt': self.created_at.isoformat(),
             'updatedAt': self.updated_at.isoformat()
-        } 
\ No newline at end of file
+        }
+    
+    def to_json(self):
+        """to_dict() encoded, memoized per version of the sequence and its steps."""
+        versions = tuple((step.id, step.updated_at) for step in self.steps)
+        unsaved = self.updated_at is None or any(updated_at is None for _, updated_at in versions)
+        return memoized(('sequences', self.id), lambda: encode_raw(self.to_dict()),
+                        None if unsaved else (self.updated_at, versions))
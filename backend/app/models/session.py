@@ -5,6 +5,7 @@ from sqlalchemy import String, DateTime, Text, ForeignKey, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from ..database.db import db
+from ..utils.serialization import encode_raw, memoized
 
 class SessionState(db.Model):
     """Model to track conversation context and active sequences for users"""
@@ -47,4 +48,8 @@ class SessionState(db.Model):
             'contextData': self.get_context_data(),
             'createdAt': self.created_at.isoformat(),
             'updatedAt': self.updated_at.isoformat()
-        } 
\ No newline at end of file
+        } 
+    
+    def to_json(self):
+        """to_dict() encoded, memoized per row version (see utils/serialization.py)"""
+        return memoized(('session_states', self.id), lambda: encode_raw(self.to_dict()), self.updated_at)
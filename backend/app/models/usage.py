@@ -0,0 +1,77 @@
+from datetime import datetime, date
+import uuid
+from sqlalchemy import String, DateTime, Date, Integer, Float, Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from ..database.db import db
+
+class LLMUsage(db.Model):
+    """Token usage, latency and estimated cost of one Messages API call.
+
+    Written by UsageService after the request that made the call; ids are
+    plain columns (no foreign keys) so the row survives a rolled-back or
+    deleted sequence - the tokens were spent either way.
+    """
+    __tablename__ = 'llm_usage'
+    __table_args__ = (
+        Index('ix_llm_usage_user_created', 'user_id', 'created_at'),
+        Index('ix_llm_usage_sequence_id', 'sequence_id'),
+        Index('ix_llm_usage_chat_message_id', 'chat_message_id'),
+    )
+
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    user_id: Mapped[str] = mapped_column(String(36), nullable=False)
+    call_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    model: Mapped[str] = mapped_column(String(100), nullable=False)
+    status: Mapped[str] = mapped_column(String(20), nullable=False)  # success, error or cancelled
+    input_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    output_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    cache_read_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    cache_write_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    latency_ms: Mapped[float] = mapped_column(Float, default=0.0)
+    cost_usd: Mapped[float] = mapped_column(Float, default=0.0)
+    chat_message_id: Mapped[str] = mapped_column(String(36), nullable=True)
+    sequence_id: Mapped[str] = mapped_column(String(36), nullable=True)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'createdAt': self.created_at.isoformat(),
+            'userId': self.user_id,
+            'callType': self.call_type,
+            'model': self.model,
+            'status': self.status,
+            'inputTokens': self.input_tokens,
+            'outputTokens': self.output_tokens,
+            'cacheReadTokens': self.cache_read_tokens,
+            'cacheWriteTokens': self.cache_write_tokens,
+            'latencyMs': round(self.latency_ms, 1),
+            'costUsd': round(self.cost_usd, 6),
+            'chatMessageId': self.chat_message_id,
+            'sequenceId': self.sequence_id
+        }
+
+class LLMUsageDaily(db.Model):
+    """Per-day, per-user rollup of llm_usage, updated incrementally (upsert) on every write.
+
+    Keyed by call type and model too, so per-user, per-day, per-prompt and
+    per-model totals are all small GROUP BYs over this table.
+    """
+    __tablename__ = 'llm_usage_daily'
+    __table_args__ = (
+        Index('ix_llm_usage_daily_user_day', 'user_id', 'day'),
+    )
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    call_type: Mapped[str] = mapped_column(String(50), primary_key=True)
+    model: Mapped[str] = mapped_column(String(100), primary_key=True)
+    calls: Mapped[int] = mapped_column(Integer, default=0)
+    errors: Mapped[int] = mapped_column(Integer, default=0)
+    input_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    output_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    cache_read_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    cache_write_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    latency_ms: Mapped[float] = mapped_column(Float, default=0.0)  # Sum; divide by calls for the mean
+    cost_usd: Mapped[float] = mapped_column(Float, default=0.0)
@@ -1,11 +1,102 @@
 import os
-import json
-import anthropic
-from flask import current_app
-from typing import List, Dict, Any, Optional
+import time
+import asyncio
+import contextvars
+from contextlib import nullcontext
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, g
+from typing import List, Dict, Any, Optional, Callable
 
 from ..utils.response_processor import process_complete_response
+from ..utils.metrics import registry
+from ..utils.tracing import start_span
+from ..utils.timing import stage, record_stage, RollingPercentiles
+from ..utils.stream_parser import JSONArrayStreamParser
+from ..utils.intent_classifier import IntentClassifier
+from ..utils.cancellation import RequestCancelled, current_token, raise_if_cancelled, abort_stream
+from ..utils.prompt_profiler import prompt_profiler
 from .tools import get_tools, execute_tool_call
+from .model_router import ModelRouter, RouteDecision, chat_features, refine_features
+from .llm_scheduler import LLMScheduler, LLMQueueTimeout, current_caller
+from .usage_service import record_llm_usage
+
+# LLM instrumentation, exported from /metrics
+_llm_requests_total = registry.counter('helix_llm_requests_total', 'Anthropic API calls by call type, model and status')
+_llm_duration_seconds = registry.histogram('helix_llm_request_duration_seconds', 'Anthropic API call latency in seconds')
+_sequence_first_step_seconds = registry.histogram('helix_sequence_first_step_seconds',
+                                                  'Time from the generation request to the first parsed sequence step')
+_sequence_step_retries_total = registry.counter('helix_sequence_step_retries_total',
+                                                'Single-step regenerations of failed or missing steps, by outcome')
+_chat_turns_total = registry.counter('helix_chat_turns_total', 'Chat turns by path (local, model)')
+_chat_local_intents_total = registry.counter('helix_chat_local_intents_total', 'Chat turns answered locally, by intent')
+_chat_latency_saved_seconds_total = registry.counter('helix_chat_latency_saved_seconds_total',
+                                                    'Estimated model latency saved by answering chat turns locally')
+_llm_calls_avoided_total = registry.counter('helix_llm_calls_avoided_total',
+                                            'LLM calls skipped because a local result was used, by reason')
+_llm_cancelled_total = registry.counter('helix_llm_cancelled_calls_total',
+                                        'LLM calls aborted mid-flight because their request was cancelled, by reason')
+_cancelled_tokens_saved_total = registry.counter('helix_cancellation_output_tokens_saved_total',
+                                                 'Estimated output tokens not generated thanks to cancellation')
+_cancelled_seconds_saved_total = registry.counter('helix_cancellation_seconds_saved_total',
+                                                  'Estimated LLM seconds not spent thanks to cancellation')
+
+MAX_SEQUENCE_STEPS = 10
+MAX_STEP_RETRIES = 2
+
+# Structured output for sequence generation: the model is forced to call one of
+# these tools, so steps arrive as schema-shaped JSON rather than free text
+_STEP_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string", "description": "Short step title, e.g. \"Initial Outreach\""},
+        "content": {"type": "string", "description": "Full email content with appropriate personalization"}
+    },
+    "required": ["title", "content"]
+}
+
+EMIT_SEQUENCE_TOOL = {
+    "name": "emit_sequence",
+    "description": "Return the recruiting outreach sequence, one object per step in send order.",
+    "input_schema": {
+        "type": "object",
+        "properties": {"steps": {"type": "array", "items": _STEP_SCHEMA}},
+        "required": ["steps"]
+    }
+}
+
+EMIT_STEP_TOOL = {
+    "name": "emit_step",
+    "description": "Return a single step of a recruiting outreach sequence.",
+    "input_schema": _STEP_SCHEMA
+}
+
+EMIT_OUTLINE_TOOL = {
+    "name": "emit_outline",
+    "description": "Return the plan for a recruiting outreach sequence, one brief per step in send order.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "steps": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "title": {"type": "string", "description": "Short step title, e.g. \"Initial Outreach\""},
+                        "brief": {"type": "string",
+                                  "description": "One or two sentences: the angle, key points and call-to-action"}
+                    },
+                    "required": ["title", "brief"]
+                }
+            }
+        },
+        "required": ["steps"]
+    }
+}
+
+# Marks the end of a prompt prefix that is identical across calls, so the
+# API can serve it from the prompt cache
+_CACHE_CONTROL = {"type": "ephemeral"}
 
 class AIService:
     _instance = None
@@ -29,15 +120,29 @@ class AIService:
             import warnings
             warnings.warn("No Anthropic API key provided. AIService will not work properly.")
             
-        # Initialize client if we have an API key
-        if self.api_key:
-            self.client = anthropic.Anthropic(api_key=self.api_key)
-        else:
-            self.client = None
+        # The Anthropic client (and the anthropic package import) is created
+        # lazily by _ensure_client on the first LLM call
+        self.client = None
         
         # Get model from environment, with fallback to a strong default model
         self.model = os.environ.get('ANTHROPIC_MODEL', "claude-3-5-sonnet-20241022")
         
+        # Per-call model choice (cheaper tiers for simple calls) and per-route metrics
+        self.router = ModelRouter()
+        
+        # Every LLM call waits for a slot here, fairly across users and priority classes
+        self.scheduler = LLMScheduler()
+        
+        # Local answers for trivial chat turns, plus recent model-path chat latency
+        # so the time saved by each local answer can be estimated
+        self._intent_classifier = None
+        self._intent_config = None
+        self.chat_llm_seconds = RollingPercentiles(window=200)
+        
+        # Recent successful call duration and output tokens per call type, used
+        # to estimate what a cancelled call would have cost
+        self._call_profiles: Dict[str, Dict[str, RollingPercentiles]] = {}
+        
         self.system_message = """You are Helix, an agentic AI recruiting assistant designed to help create effective recruiting outreach sequences.
 
 Your primary goal is to guide recruiters through creating compelling outreach sequences tailored to specific roles and candidate profiles.
@@ -117,6 +222,246 @@ The recruiter can view and edit the sequence in the workspace panel. You can hel
         
         return converted_messages
     
+    def _create_message(self, call_type: str, route: Optional[RouteDecision] = None, **request_params):
+        """Call the Messages API inside an 'llm.messages.create' span and record latency.
+        
+        Latency and cost are also recorded per route (the call type unless a
+        RouteDecision is given), and a route in shadow mode replays the call on
+        its candidate model in the background.
+        """
+        model = request_params.get('model', self.model)
+        route_name = route.route if route else call_type
+        labels = {'call_type': call_type, 'model': model}
+        tiers = self._model_tiers()
+        token = current_token()
+        self._profile_prompt(call_type, request_params)
+        with start_span('llm.messages.create', call_type=call_type, model=model, route=route_name) as span, \
+                self._llm_slot(call_type, request_params) as queue_wait:
+            span.set_attribute('queue_wait_ms', round(queue_wait * 1000, 1))
+            start = time.perf_counter()
+            try:
+                if token is None:
+                    message = self.client.messages.create(**request_params)
+                else:
+                    message = self._create_cancellable(token, call_type, start, **request_params)
+            except RequestCancelled:
+                _llm_requests_total.inc(labels={**labels, 'status': 'cancelled'})
+                self.router.record(route_name, model, time.perf_counter() - start, 'cancelled')
+                record_llm_usage(call_type, model, 'cancelled', None, time.perf_counter() - start, 0.0)
+                span.set_attribute('cancelled', True)
+                raise
+            except Exception:
+                _llm_requests_total.inc(labels={**labels, 'status': 'error'})
+                self.router.record(route_name, model, time.perf_counter() - start, 'error')
+                record_llm_usage(call_type, model, 'error', None, time.perf_counter() - start, 0.0)
+                raise
+            finally:
+                _llm_duration_seconds.observe(time.perf_counter() - start, labels)
+            elapsed = time.perf_counter() - start
+            _llm_requests_total.inc(labels={**labels, 'status': 'success'})
+            usage = getattr(message, 'usage', None)
+            if usage is not None:
+                span.set_attribute('input_tokens', getattr(usage, 'input_tokens', None))
+                span.set_attribute('output_tokens', getattr(usage, 'output_tokens', None))
+                span.set_attribute('cache_read_input_tokens', getattr(usage, 'cache_read_input_tokens', None))
+            self._profile(call_type, elapsed, getattr(usage, 'output_tokens', None))
+            cost = self.router.cost(model, usage, tiers)
+            self.router.record(route_name, model, elapsed, 'success', cost)
+            record_llm_usage(call_type, model, 'success', usage, elapsed, cost)
+            if route is not None and route.shadow_model:
+                self.router.shadow(route, request_params, message, elapsed, self._shadow_create(call_type, tiers),
+                                   tiers, self._shadow_max_pending())
+            return message
+    
+    def _shadow_create(self, call_type: str, tiers: Dict[str, Dict[str, Any]]) -> Callable[..., Any]:
+        """messages.create for a shadow replay, run on the router's thread after this request ends.
+        
+        Like any call it waits for a scheduler slot, for the live call's user, and
+        its usage is recorded, under call type shadow_<call_type> (bulk priority).
+        """
+        try:
+            app = current_app._get_current_object()
+        except RuntimeError:
+            app = None
+        caller = current_caller()
+        shadow_call_type = f"shadow_{call_type}"
+        
+        def create(**request_params):
+            model = request_params['model']
+            with app.app_context() if app is not None else nullcontext():
+                if app is not None:
+                    g.llm_caller = caller
+                with self._llm_slot(shadow_call_type, request_params):
+                    start = time.perf_counter()
+                    try:
+                        message = self.client.messages.create(**request_params)
+                    except Exception:
+                        record_llm_usage(shadow_call_type, model, 'error', None, time.perf_counter() - start, 0.0)
+                        raise
+                    seconds = time.perf_counter() - start
+                usage = getattr(message, 'usage', None)
+                record_llm_usage(shadow_call_type, model, 'success', usage, seconds,
+                                 self.router.cost(model, usage, tiers))
+            return message, seconds
+        return create
+    
+    @staticmethod
+    def _shadow_max_pending() -> int:
+        try:
+            return current_app.config['MODEL_SHADOW_MAX_PENDING']
+        except (RuntimeError, KeyError):
+            return 8
+    
+    def _create_cancellable(self, token, call_type: str, start: float, **request_params):
+        """messages.create as a stream the cancellation token can abort; returns the final Message."""
+        token.raise_if_cancelled()
+        with self.client.messages.stream(**request_params) as stream:
+            unregister = token.on_cancel(lambda: abort_stream(stream))
+            try:
+                stream.until_done()
+                return stream.get_final_message()
+            except Exception:
+                if not token.cancelled:
+                    raise
+                try:
+                    output_tokens = stream.current_message_snapshot.usage.output_tokens
+                except Exception:
+                    output_tokens = 0
+                self._record_cancelled(call_type, token.reason, time.perf_counter() - start, output_tokens)
+                raise RequestCancelled(token.reason) from None
+            finally:
+                unregister()
+    
+    def _profile(self, call_type: str, seconds: float, output_tokens: Optional[int]) -> None:
+        profile = self._call_profiles.get(call_type)
+        if profile is None:
+            profile = self._call_profiles.setdefault(call_type, {
+                'seconds': RollingPercentiles(window=200), 'output_tokens': RollingPercentiles(window=200)
+            })
+        profile['seconds'].add(seconds)
+        if output_tokens:
+            profile['output_tokens'].add(output_tokens)
+    
+    def _record_cancelled(self, call_type: str, reason: str, elapsed: float, output_tokens: int) -> None:
+        """Count an aborted call and what it would have cost, from recent calls of the same type."""
+        _llm_cancelled_total.inc(labels={'call_type': call_type, 'reason': reason})
+        profile = self._call_profiles.get(call_type)
+        if profile is None:
+            return
+        seconds = profile['seconds'].summary().get('mean')
+        tokens = profile['output_tokens'].summary().get('mean')
+        if seconds is not None:
+            _cancelled_seconds_saved_total.inc(max(seconds - elapsed, 0.0))
+        if tokens is not None:
+            _cancelled_tokens_saved_total.inc(max(tokens - output_tokens, 0.0))
+    
+    def _create_routed_message(self, call_type: str, route: RouteDecision, **request_params):
+        """_create_message on the route's model, falling back to the default model if a live route fails."""
+        try:
+            return self._create_message(call_type, route=route, **{**request_params, 'model': route.model})
+        except LLMQueueTimeout:
+            raise
+        except Exception as e:
+            if route.model == self.model:
+                raise
+            current_app.logger.warning(f"Model route {route.route} ({route.model}) failed, retrying on {self.model}: {e}")
+            return self._create_message(call_type, route=RouteDecision(route.route, self.model, route.state),
+                                        **{**request_params, 'model': self.model})
+    
+    def _llm_slot(self, call_type: str, request_params: Dict[str, Any]):
+        """Scheduler slot for one call, sized by its max_tokens (a no-op outside the app or when disabled)."""
+        try:
+            config = current_app.config
+        except RuntimeError:
+            return nullcontext(0.0)
+        if not config.get('LLM_SCHEDULER_ENABLED'):
+            return nullcontext(0.0)
+        self.scheduler.configure(config)
+        return self.scheduler.slot(call_type, cost=request_params.get('max_tokens', 1000) / 1000)
+    
+    @staticmethod
+    def _profile_prompt(call_type: str, request_params: Dict[str, Any]) -> None:
+        """Record the prompt's per-section token estimates when PROMPT_PROFILING_ENABLED."""
+        try:
+            config = current_app.config
+        except RuntimeError:
+            return
+        prompt_profiler.profile(call_type, current_caller().user_id, request_params.get('system'),
+                                request_params.get('messages', []), request_params.get('tools'), config)
+    
+    @staticmethod
+    def _model_tiers() -> Dict[str, Dict[str, Any]]:
+        try:
+            return current_app.config['MODEL_TIERS']
+        except (RuntimeError, KeyError):
+            return {}
+    
+    def _stream_message(self, call_type: str, **request_params):
+        """Stream a Messages API call, yielding raw events inside an 'llm.messages.stream' span."""
+        model = request_params.get('model', self.model)
+        labels = {'call_type': call_type, 'model': model}
+        tiers = self._model_tiers()
+        token = current_token()
+        self._profile_prompt(call_type, request_params)
+        with start_span('llm.messages.stream', call_type=call_type, model=model) as span, \
+                self._llm_slot(call_type, request_params) as queue_wait:
+            span.set_attribute('queue_wait_ms', round(queue_wait * 1000, 1))
+            start = time.perf_counter()
+            status = 'success'
+            stream = None
+            unregister = None
+            usage = SimpleNamespace(input_tokens=0, output_tokens=0, cache_read_input_tokens=0,
+                                    cache_creation_input_tokens=0)
+            received_chars = 0
+            try:
+                if token is not None:
+                    token.raise_if_cancelled()
+                stream = self.client.messages.create(stream=True, **request_params)
+                if token is not None:
+                    unregister = token.on_cancel(lambda: abort_stream(stream))
+                for event in stream:
+                    if event.type == 'message_start':
+                        for name in ('input_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens'):
+                            setattr(usage, name, getattr(event.message.usage, name, 0) or 0)
+                        span.set_attribute('input_tokens', usage.input_tokens)
+                    elif event.type == 'message_delta':
+                        usage.output_tokens = getattr(event.usage, 'output_tokens', 0)
+                        span.set_attribute('output_tokens', usage.output_tokens)
+                    elif event.type == 'content_block_delta':
+                        received_chars += len(getattr(event.delta, 'partial_json', None)
+                                              or getattr(event.delta, 'text', None) or '')
+                    yield event
+            except RequestCancelled:
+                status = 'cancelled'
+                raise
+            except Exception:
+                if token is None or not token.cancelled:
+                    status = 'error'
+                    raise
+                status = 'cancelled'
+                span.set_attribute('cancelled', True)
+                # Output usage only arrives at the end; estimate ~4 characters per token
+                self._record_cancelled(call_type, token.reason, time.perf_counter() - start, received_chars // 4)
+                raise RequestCancelled(token.reason) from None
+            finally:
+                if unregister is not None:
+                    unregister()
+                if stream is not None:
+                    stream.close()
+                elapsed = time.perf_counter() - start
+                _llm_duration_seconds.observe(elapsed, labels)
+                _llm_requests_total.inc(labels={**labels, 'status': status})
+                if status == 'success':
+                    self._profile(call_type, elapsed, usage.output_tokens)
+                cost = self.router.cost(model, usage, tiers)
+                self.router.record(call_type, model, elapsed, status, cost)
+                record_llm_usage(call_type, model, status, usage, elapsed, cost)
+    
+    def _build_client(self):
+        """Create the Anthropic client; the package is imported on first use to keep startup fast."""
+        import anthropic
+        return anthropic.Anthropic(api_key=self.api_key)
+    
     def _ensure_client(self):
         """Ensure we have a valid client, initializing if needed."""
         if not self.client:
@@ -124,7 +469,7 @@ The recruiter can view and edit the sequence in the workspace panel. You can hel
             try:
                 self.api_key = self.api_key or current_app.config.get('ANTHROPIC_API_KEY')
                 if self.api_key:
-                    self.client = anthropic.Anthropic(api_key=self.api_key)
+                    self.client = self._build_client()
                 else:
                     raise ValueError("No Anthropic API key available")
             except RuntimeError:
@@ -136,6 +481,7 @@ The recruiter can view and edit the sequence in the workspace panel. You can hel
         """Generate a response from Claude based on the conversation history."""
         try:
             self._ensure_client()
+            raise_if_cancelled()
             
             # Get the user's most recent message for quality validation
             user_message = ""
@@ -145,7 +491,17 @@ The recruiter can view and edit the sequence in the workspace panel. You can hel
                         user_message = msg.get("content", "")
                         break
             
+            # Trivial turns (greetings, thanks, ...) are answered without the model
+            local_start = time.perf_counter()
+            previous_assistant = next((msg.get("content", "") for msg in reversed(messages)
+                                       if msg.get("role") == "assistant"), None)
+            decision = self.classify_intent(user_message, previous_assistant, session_context)
+            if decision is not None and decision.local:
+                return self._local_response(decision, time.perf_counter() - local_start)
+            _chat_turns_total.inc(labels={'path': 'model'})
+            
             # Add user context to the system message if provided
+            prompt_start = time.perf_counter()
             system_message = self.system_message
             
             # Add session context if available
@@ -190,13 +546,18 @@ When the user doesn't specify which step to modify, assume they mean the entire
             
             # Create message history excluding system messages
             converted_messages = self._create_message_history(messages)
+            record_stage('prompt_build', prompt_start)
             
             # Get tools in the format expected by Anthropic
             tools = get_tools()
             
+            # Pick the model for this turn from cheap features of the conversation
+            route = self.router.choose('chat', chat_features(user_message, previous_assistant, bool(tools)),
+                                       current_app.config, self.model)
+            
             # Create the message request with tools
             request_params = {
-                "model": self.model,
+                "model": route.model,
                 "system": system_message,
                 "messages": converted_messages,
                 "max_tokens": 1000,
@@ -209,11 +570,14 @@ When the user doesn't specify which step to modify, assume they mean the entire
             
             # Log the model being used
             try:
-                current_app.logger.info(f"Using AI model: {self.model}")
+                current_app.logger.info(f"Using AI model: {route.model} (route: {route.route})")
             except RuntimeError:
-                print(f"Using AI model: {self.model}")
+                print(f"Using AI model: {route.model} (route: {route.route})")
             
-            message = self.client.messages.create(**request_params)
+            with stage('llm_call'):
+                llm_start = time.perf_counter()
+                message = self._create_routed_message('chat', route, **request_params)
+                self.chat_llm_seconds.add(time.perf_counter() - llm_start)
             
             # Process the response
             raw_response = {
@@ -236,10 +600,11 @@ When the user doesn't specify which step to modify, assume they mean the entire
                             tool_arguments['sequence_id'] = active_sequence_id
                     
                     # Execute the tool call and get the result
-                    tool_result = await execute_tool_call({
-                        "name": content.name,
-                        "arguments": tool_arguments
-                    })
+                    with stage('tool_calls'):
+                        tool_result = await execute_tool_call({
+                            "name": content.name,
+                            "arguments": tool_arguments
+                        })
                     
                     # Add the tool call and result to the response
                     raw_response["tool_calls"].append({
@@ -257,7 +622,8 @@ When the user doesn't specify which step to modify, assume they mean the entire
                         print(f"Tool result: {tool_result}")
             
             # Process and validate the complete response
-            processed_response = process_complete_response(raw_response, user_message)
+            with stage('postprocess'):
+                processed_response = process_complete_response(raw_response, user_message)
             return processed_response
             
         except Exception as e:
@@ -267,11 +633,48 @@ When the user doesn't specify which step to modify, assume they mean the entire
                 print(f"Error generating chat response: {str(e)}")
             raise
     
-    async def generate_sequence(self, position: str, company_context: dict, additional_info: str = None) -> List[Dict[str, str]]:
-        """Generate a recruiting outreach sequence"""
-        try:
-            self._ensure_client()
-            prompt = f"""
+    def classify_intent(self, user_message: str, previous_assistant: Optional[str] = None,
+                        session_context: Optional[Dict[str, Any]] = None):
+        """Local intent decision for a chat turn, or None when the fast path is disabled."""
+        config = current_app.config
+        if not config['INTENT_FAST_PATH_ENABLED']:
+            return None
+        key = (tuple(config['INTENT_FAST_PATH_INTENTS']), config['INTENT_FAST_PATH_MAX_CHARS'])
+        if self._intent_config != key:
+            self._intent_classifier = IntentClassifier(key[0], max_chars=key[1])
+            self._intent_config = key
+        return self._intent_classifier.classify(
+            user_message, previous_assistant,
+            has_active_sequence=bool(session_context and session_context.get('active_sequence'))
+        )
+    
+    def _local_response(self, decision, elapsed: float) -> Dict[str, Any]:
+        _chat_turns_total.inc(labels={'path': 'local'})
+        _chat_local_intents_total.inc(labels={'intent': decision.intent})
+        _llm_calls_avoided_total.inc(labels={'reason': 'intent_fast_path'})
+        # Saved time is estimated from the mean of recent model-path chat calls
+        recent = self.chat_llm_seconds.summary()
+        if recent.get('mean') is not None:
+            _chat_latency_saved_seconds_total.inc(max(recent['mean'] - elapsed, 0.0))
+        current_app.logger.info(f"Answered chat turn locally: {decision.intent} ({decision.reason})")
+        return {"content": decision.reply, "tool_calls": [], "intent": decision.intent}
+    
+    @staticmethod
+    def intent_stats() -> Dict[str, Any]:
+        """Share of chat turns served locally, per-intent counts and estimated latency saved."""
+        local = _chat_turns_total.get({'path': 'local'})
+        model = _chat_turns_total.get({'path': 'model'})
+        return {
+            'turns': {'local': int(local), 'model': int(model)},
+            'localShare': round(local / (local + model), 3) if local + model else None,
+            'latencySavedSeconds': round(_chat_latency_saved_seconds_total.get(), 3),
+            'byIntent': {rule.name: int(_chat_local_intents_total.get({'intent': rule.name}))
+                         for rule in IntentClassifier().rules}
+        }
+    
+    def _sequence_prompt(self, position: str, company_context: dict, additional_info: Optional[str],
+                         step_count: int) -> str:
+        return f"""
             Create a recruiting outreach sequence for a {position} position.
             
             Company Context:
@@ -280,7 +683,7 @@ When the user doesn't specify which step to modify, assume they mean the entire
             
             {f"Additional Information:\n{additional_info}" if additional_info else ""}
             
-            Create a 3-step recruiting outreach sequence. For each step, provide:
+            Create a {step_count}-step recruiting outreach sequence. For each step, provide:
             1. A title for the step (e.g., "Initial Outreach", "Follow-up")
             2. Email content with appropriate personalization
 
@@ -291,40 +694,66 @@ When the user doesn't specify which step to modify, assume they mean the entire
             - Includes a clear call-to-action
             - Natural, conversational tone
             - Avoids generic recruiting language
-            
-            Format your response as a JSON object with this structure:
-            [
-              {{
-                "title": "Step Title",
-                "content": "Email content here"
-              }},
-              ...
-            ]
             """
+    
+    @staticmethod
+    def _valid_step(step: Any) -> bool:
+        return (isinstance(step, dict) and isinstance(step.get('title'), str) and step['title'].strip() != ''
+                and isinstance(step.get('content'), str) and step['content'].strip() != '')
+    
+    @staticmethod
+    def _clean_step(step: Dict[str, Any]) -> Dict[str, str]:
+        return {'title': step['title'].strip(), 'content': step['content'].strip()}
+    
+    async def generate_sequence(self, position: str, company_context: dict, additional_info: str = None,
+                                on_step: Optional[Callable[[int, Dict[str, str]], None]] = None,
+                                step_count: Optional[int] = None, mode: Optional[str] = None) -> List[Dict[str, str]]:
+        """Generate a recruiting outreach sequence.
+        
+        step_count defaults to SEQUENCE_STEP_COUNT and mode to SEQUENCE_GENERATION_MODE:
+        - 'stream': all steps in one streamed emit_sequence call, parsed as they arrive
+        - 'outline': a short emit_outline call plans the steps, then every step is
+          written by its own emit_step call, SEQUENCE_STEP_CONCURRENCY at a time
+        - 'auto': 'outline' from SEQUENCE_OUTLINE_MIN_STEPS steps up, else 'stream'
+        
+        Either way on_step(index, step) is called as soon as each step is ready, and
+        a step that comes back malformed, or is lost to an API error (a stream that
+        breaks off, a failed step call), is regenerated on its own.
+        """
+        try:
+            self._ensure_client()
+            config = current_app.config
+            step_count = min(max(int(step_count or config['SEQUENCE_STEP_COUNT']), 1), MAX_SEQUENCE_STEPS)
+            mode = mode or config['SEQUENCE_GENERATION_MODE']
+            if mode == 'auto':
+                mode = 'outline' if step_count >= config['SEQUENCE_OUTLINE_MIN_STEPS'] else 'stream'
+            prompt = self._sequence_prompt(position, company_context, additional_info, step_count)
+            
+            start = time.perf_counter()
+            steps: Dict[int, Dict[str, str]] = {}
+            
+            def emit(index: int, step: Dict[str, str]) -> None:
+                if not steps:
+                    _sequence_first_step_seconds.observe(time.perf_counter() - start, {'mode': mode})
+                steps[index] = step
+                if on_step:
+                    on_step(index, step)
+            
+            outline = self._generate_outline(prompt, step_count) if mode == 'outline' else None
+            if outline:
+                await self._write_outlined_steps(prompt, outline, config['SEQUENCE_STEP_CONCURRENCY'], emit)
+            else:
+                if mode == 'outline':
+                    current_app.logger.warning("Sequence outline was unusable; generating in a single call")
+                    mode = 'stream'
+                self._stream_sequence(prompt, step_count, emit)
             
-            message = self.client.messages.create(
-                model=self.model,
-                system=self.system_message,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=2000,
-                temperature=0.7
-            )
-            
-            # Extract JSON from the response
-            response_text = message.content[0].text
-            
-            # Handle potential formatting issues by finding JSON in the response
-            json_start = response_text.find('[')
-            json_end = response_text.rfind(']') + 1
+            # Retry only what failed, with the good steps as context
+            for index in range(step_count):
+                if index not in steps:
+                    emit(index, self._regenerate_step(prompt, index, step_count, steps))
             
-            if json_start >= 0 and json_end > json_start:
-                json_str = response_text[json_start:json_end]
-                sequence_steps = json.loads(json_str)
-                return sequence_steps
-            else:
-                raise ValueError("Failed to extract valid JSON from the response")
+            return [steps[index] for index in range(step_count)]
                 
         except Exception as e:
             try:
@@ -333,6 +762,197 @@ When the user doesn't specify which step to modify, assume they mean the entire
                 print(f"Error generating sequence: {str(e)}")
             raise
     
+    def _stream_sequence(self, prompt: str, step_count: int,
+                         emit: Callable[[int, Dict[str, str]], None]) -> None:
+        """Stream one forced emit_sequence call, emitting each valid step as it completes."""
+        parser = JSONArrayStreamParser()
+        events = self._stream_message(
+            'generate_sequence',
+            model=self.model,
+            system=self.system_message,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            tools=[EMIT_SEQUENCE_TOOL],
+            tool_choice={"type": "tool", "name": EMIT_SEQUENCE_TOOL["name"]},
+            max_tokens=600 * step_count + 200,
+            temperature=0.7
+        )
+        emitted = 0
+        try:
+            for event in events:
+                if event.type != 'content_block_delta' or getattr(event.delta, 'type', None) != 'input_json_delta':
+                    continue
+                for index, step in parser.feed(event.delta.partial_json):
+                    if index >= step_count:
+                        continue
+                    if not self._valid_step(step):
+                        current_app.logger.warning(f"Sequence step {index + 1} was malformed; it will be regenerated")
+                        continue
+                    emit(index, self._clean_step(step))
+                    emitted += 1
+        except Exception as e:
+            if not emitted:
+                raise
+            # Keep the steps that arrived; the caller regenerates the rest one by one
+            current_app.logger.warning(f"Sequence stream failed after {emitted} step(s); "
+                                       f"regenerating the rest: {str(e)}")
+    
+    def _cached_context(self, prompt: str):
+        """System and leading user block shared by every call for one sequence.
+        
+        Both carry cache_control, so after the outline call the step calls read
+        this prefix from the prompt cache instead of re-processing it.
+        """
+        system = [{"type": "text", "text": self.system_message, "cache_control": _CACHE_CONTROL}]
+        context = {"type": "text", "text": prompt, "cache_control": _CACHE_CONTROL}
+        return system, context
+    
+    def _generate_outline(self, prompt: str, step_count: int) -> Optional[List[Dict[str, str]]]:
+        """Plan the sequence with a short forced emit_outline call; None if the outline is unusable."""
+        system, context = self._cached_context(prompt)
+        message = self._create_message(
+            'generate_sequence_outline',
+            model=self.model,
+            system=system,
+            messages=[
+                {"role": "user", "content": [context, {
+                    "type": "text",
+                    "text": f"Before writing any emails, plan the {step_count} steps: give each a title and a "
+                            f"one or two sentence brief, and return them with the emit_outline tool."
+                }]}
+            ],
+            tools=[EMIT_OUTLINE_TOOL],
+            tool_choice={"type": "tool", "name": EMIT_OUTLINE_TOOL["name"]},
+            max_tokens=80 * step_count + 100,
+            temperature=0.7
+        )
+        block = next((b for b in message.content if getattr(b, 'type', None) == 'tool_use'), None)
+        briefs = block.input.get('steps') if block is not None and isinstance(block.input, dict) else None
+        if not isinstance(briefs, list) or len(briefs) < step_count:
+            return None
+        outline = []
+        for brief in briefs[:step_count]:
+            if not (isinstance(brief, dict) and isinstance(brief.get('title'), str)
+                    and isinstance(brief.get('brief'), str)):
+                return None
+            outline.append({'title': brief['title'].strip(), 'brief': brief['brief'].strip()})
+        return outline
+    
+    async def _write_outlined_steps(self, prompt: str, outline: List[Dict[str, str]], concurrency: int,
+                                    emit: Callable[[int, Dict[str, str]], None]) -> None:
+        """Write every outlined step concurrently, emitting each one as it finishes.
+        
+        The blocking client calls run on a pool of `concurrency` threads (the
+        loop's default executor is capped by CPU count); emit() runs back on the
+        caller's thread, so on_step callbacks can use the request's DB session.
+        """
+        system, context = self._cached_context(prompt)
+        plan = "\n".join(f"{i + 1}. {item['title']}: {item['brief']}" for i, item in enumerate(outline))
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=max(min(concurrency, len(outline)), 1),
+                                      thread_name_prefix='sequence-step')
+        
+        async def write(index: int) -> None:
+            content = [context, {
+                "type": "text",
+                "text": f"The sequence is planned as follows:\n{plan}\n\n"
+                        f"Write only step {index + 1} of {len(outline)} (\"{outline[index]['title']}\"), following "
+                        f"its brief, and return it with the emit_step tool."
+            }]
+            try:
+                # Copy the context so step spans nest under the current trace
+                step = await loop.run_in_executor(executor, contextvars.copy_context().run,
+                                                  self._request_step, 'generate_sequence_step', system, content)
+            except Exception as e:
+                # Only this step is lost; the others carry on
+                current_app.logger.warning(f"Sequence step {index + 1} failed; it will be regenerated: {str(e)}")
+                return
+            if step is not None:
+                emit(index, step)
+            else:
+                current_app.logger.warning(f"Sequence step {index + 1} was malformed; it will be regenerated")
+        
+        tasks = [asyncio.ensure_future(write(index)) for index in range(len(outline))]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def _request_step(self, call_type: str, system: Any, content: Any) -> Optional[Dict[str, str]]:
+        """One forced emit_step call; returns the cleaned step, or None if it came back malformed."""
+        message = self._create_message(
+            call_type,
+            model=self.model,
+            system=system,
+            messages=[
+                {"role": "user", "content": content}
+            ],
+            tools=[EMIT_STEP_TOOL],
+            tool_choice={"type": "tool", "name": EMIT_STEP_TOOL["name"]},
+            max_tokens=1000,
+            temperature=0.7
+        )
+        block = next((b for b in message.content if getattr(b, 'type', None) == 'tool_use'), None)
+        if block is not None and self._valid_step(block.input):
+            return self._clean_step(block.input)
+        return None
+    
+    def _regenerate_step(self, prompt: str, index: int, step_count: int,
+                         steps: Dict[int, Dict[str, str]]) -> Dict[str, str]:
+        """Generate one missing step with a forced emit_step call, retrying malformed steps and API errors."""
+        other_steps = "\n\n".join(
+            f"Step {i + 1} - {step['title']}:\n{step['content']}" for i, step in sorted(steps.items())
+        )
+        step_prompt = (f"{prompt}\n\nThe other steps of this sequence are already written:\n\n"
+                       f"{other_steps or '(none yet)'}\n\n"
+                       f"Write only step {index + 1} of {step_count} and return it with the emit_step tool.")
+        error: Optional[Exception] = None
+        for _ in range(MAX_STEP_RETRIES):
+            try:
+                step = self._request_step('generate_sequence_step', self.system_message, step_prompt)
+            except Exception as e:
+                step, error = None, e
+            if step is not None:
+                _sequence_step_retries_total.inc(labels={'outcome': 'success'})
+                return step
+            _sequence_step_retries_total.inc(labels={'outcome': 'failure'})
+        if error is not None:
+            raise error
+        raise ValueError(f"Failed to generate step {index + 1} of the sequence")
+    
+    def personalize_step(self, step: Dict[str, str], position: str, profile: Dict[str, Any],
+                         placeholders: List[str]) -> Optional[Dict[str, str]]:
+        """Rewrite a step for one cluster of similar candidates; None if the result came back malformed.
+        
+        profile describes what the cluster's members have in common. Details
+        that differ per candidate stay as [PLACEHOLDER] tokens, so the variant
+        is mail-merged for every member afterwards. The step and instructions
+        are the cached prefix; only the profile differs between clusters.
+        """
+        self._ensure_client()
+        tokens = ", ".join(f"[{name}]" for name in placeholders) or "(none)"
+        system, context = self._cached_context(f"""
+            Personalize this opening message of a recruiting outreach sequence for a {position} position
+            for a group of similar candidates.
+            
+            CURRENT MESSAGE:
+            Title: {step['title']}
+            {step['content']}
+            
+            Tailor the hook and value proposition to what the group has in common. Keep the
+            length, tone and call-to-action. Use only these placeholders for details that
+            differ per candidate, exactly as written: {tokens}. Never write a specific
+            candidate's name or other individual details. Return the message with the emit_step tool.
+            """)
+        traits = "\n".join(f"- {field}: {', '.join(words)}" for field, words in profile.items()) or "- (no shared traits)"
+        return self._request_step('personalize_step', system,
+                                  [context, {"type": "text", "text": f"What this group has in common:\n{traits}"}])
+    
     async def refine_sequence_step(self, step_content: str, feedback: str) -> str:
         """Refine a specific sequence step based on feedback.
         
@@ -360,8 +980,11 @@ When the user doesn't specify which step to modify, assume they mean the entire
             requested in the feedback while preserving the core value proposition.
             """
             
-            message = self.client.messages.create(
-                model=self.model,
+            route = self.router.choose('refine_step', refine_features(step_content, feedback),
+                                       current_app.config, self.model)
+            message = self._create_routed_message(
+                'refine_step',
+                route,
                 system=self.system_message,
                 messages=[
                     {"role": "user", "content": prompt}
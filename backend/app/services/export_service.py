@@ -0,0 +1,166 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, Optional
+
+from sqlalchemy import select, func
+
+from ..database.db import db
+from ..models import Sequence, SequenceStep
+from ..utils.metrics import registry
+
+_export_rows_total = registry.counter('helix_export_rows_total', 'Rows written by sequence exports, by format')
+_export_duration_seconds = registry.histogram('helix_export_duration_seconds',
+                                              'Wall time of completed sequence exports, by format',
+                                              buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 1800.0))
+
+EXPORT_FORMATS = ('jsonl', 'csv')
+
+# One CSV row per step, with its sequence's columns repeated
+CSV_COLUMNS = ['sequence_id', 'user_id', 'title', 'position', 'additional_info', 'created_at', 'updated_at',
+               'step_id', 'step_order', 'step_title', 'step_content']
+
+# Responses are flushed in chunks of about this many bytes
+CHUNK_CHARS = 64 * 1024
+
+
+def parse_date_bound(value: Optional[str], end: bool = False) -> Optional[datetime]:
+    """ISO date or datetime; a date-only upper bound covers that whole day."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def iter_chunks(lines: Iterator[str], chunk_chars: int = CHUNK_CHARS) -> Iterator[str]:
+    """Join lines into chunks of about chunk_chars for a streamed response."""
+    chunk = []
+    size = 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= chunk_chars:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+class ExportService:
+    """Streams sequences and their steps as JSONL or CSV in constant memory.
+
+    Rows come from one Core SELECT (no ORM objects, so nothing accumulates in
+    the session's identity map) executed with stream_results/yield_per: a
+    server-side cursor on PostgreSQL, fetched batch_size rows at a time.
+    Output is produced sequence by sequence as the cursor advances.
+    """
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Get or create a singleton instance of ExportService."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def _query(self, user_id: Optional[str], position: Optional[str], since: Optional[datetime],
+               until: Optional[datetime]):
+        query = (
+            select(Sequence.id, Sequence.user_id, Sequence.title, Sequence.position, Sequence.additional_info,
+                   Sequence.created_at, Sequence.updated_at, SequenceStep.id.label('step_id'),
+                   SequenceStep.order.label('step_order'), SequenceStep.title.label('step_title'),
+                   SequenceStep.content.label('step_content'))
+            .outerjoin(SequenceStep, SequenceStep.sequence_id == Sequence.id)
+        )
+        if user_id:
+            query = query.where(Sequence.user_id == user_id)
+        if position:
+            query = query.where(func.lower(Sequence.position).contains(position.lower(), autoescape=True))
+        if since:
+            query = query.where(Sequence.created_at >= since)
+        if until:
+            query = query.where(Sequence.created_at < until)
+        # Steps of one sequence are adjacent, so each sequence can be emitted as soon as it ends
+        return query.order_by(Sequence.created_at, Sequence.id, SequenceStep.order)
+
+    def iter_rows(self, user_id: Optional[str] = None, position: Optional[str] = None,
+                  since: Optional[datetime] = None, until: Optional[datetime] = None,
+                  batch_size: int = 1000) -> Iterator[Any]:
+        query = self._query(user_id, position, since, until).execution_options(
+            stream_results=True, yield_per=batch_size)
+        result = db.session.execute(query)
+        try:
+            yield from result
+        finally:
+            result.close()
+
+    def iter_sequences(self, **filters) -> Iterator[Dict[str, Any]]:
+        """Sequences as dicts (same shape as Sequence.to_dict()), one at a time."""
+        current = None
+        for row in self.iter_rows(**filters):
+            if current is None or current['id'] != row.id:
+                if current is not None:
+                    yield current
+                current = {
+                    'id': row.id,
+                    'title': row.title,
+                    'position': row.position,
+                    'userId': row.user_id,
+                    'additionalInfo': row.additional_info,
+                    'steps': [],
+                    'createdAt': row.created_at.isoformat() if row.created_at else None,
+                    'updatedAt': row.updated_at.isoformat() if row.updated_at else None
+                }
+            if row.step_id is not None:
+                current['steps'].append({
+                    'id': row.step_id,
+                    'title': row.step_title,
+                    'content': row.step_content,
+                    'order': row.step_order
+                })
+        if current is not None:
+            yield current
+
+    def _jsonl_lines(self, **filters) -> Iterator[str]:
+        for sequence in self.iter_sequences(**filters):
+            _export_rows_total.inc(labels={'format': 'jsonl'})
+            yield json.dumps(sequence, ensure_ascii=False) + '\n'
+
+    def _csv_lines(self, **filters) -> Iterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS)
+        # On its own, so an export matching nothing is still a header-only CSV
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        for row in self.iter_rows(**filters):
+            writer.writerow([
+                row.id, row.user_id, row.title, row.position, row.additional_info or '',
+                row.created_at.isoformat() if row.created_at else '',
+                row.updated_at.isoformat() if row.updated_at else '',
+                row.step_id or '', '' if row.step_order is None else row.step_order,
+                row.step_title or '', row.step_content or ''
+            ])
+            _export_rows_total.inc(labels={'format': 'csv'})
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    def export(self, fmt: str = 'jsonl', chunk_chars: int = CHUNK_CHARS, **filters) -> Iterator[str]:
+        """Export as JSONL (one sequence per line) or CSV (one step per row), yielded in ~chunk_chars chunks.
+
+        Filters: user_id, position (case-insensitive substring), since/until
+        (created_at range, until exclusive) and batch_size.
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        lines = self._jsonl_lines(**filters) if fmt == 'jsonl' else self._csv_lines(**filters)
+        start = time.perf_counter()
+        yield from iter_chunks(lines, chunk_chars)
+        _export_duration_seconds.observe(time.perf_counter() - start, {'format': fmt})
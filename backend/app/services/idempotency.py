@@ -0,0 +1,280 @@
+"""
+Idempotency-Key support for POSTs that clients retry (chat messages,
+sequence generation).
+
+The first request carrying a key claims it: an idempotency_keys row, keyed
+by endpoint, userId and key, marked in_progress. When the view returns, its
+response is stored on the row. A retry then gets:
+
+- the stored response (header Idempotent-Replayed: true), if the first
+  request finished
+- the same response once the first request finishes, if it is still
+  running. The retry waits for it (up to IDEMPOTENCY_WAIT_SECONDS, else
+  409) rather than running the work again.
+- 422, if the key was used with a different request body
+
+Server errors and cancelled requests (5xx, 499) aren't stored: the key is
+released so a retry runs the request again. A claim whose request died
+without releasing it can be taken over after IDEMPOTENCY_LEASE_SECONDS;
+completed responses are kept for IDEMPOTENCY_TTL_SECONDS.
+
+Requests without the header are not affected.
+"""
+
+import time
+import hashlib
+import inspect
+import functools
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from flask import Response, current_app, jsonify, request
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+
+from ..database.db import db
+from ..models import IdempotencyKey
+from ..utils.metrics import registry
+
+_requests_total = registry.counter('helix_idempotency_requests_total',
+                                   'Requests with an Idempotency-Key by outcome (new, replayed, attached, '
+                                   'in_progress, mismatch)')
+
+HEADER = 'Idempotency-Key'
+
+# Longest key accepted (the column's size)
+_MAX_KEY_LENGTH = 255
+
+# Expired rows are deleted at most this often per process
+_PRUNE_INTERVAL_SECONDS = 60
+
+
+class IdempotencyStore:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Get or create a singleton instance of IdempotencyStore."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        # Keys this process is running, set when they finish, so local retries don't poll
+        self._running: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+
+    @staticmethod
+    def record_id(scope: str, user_id: Optional[str], key: str) -> str:
+        return hashlib.sha256(f"{scope}\0{user_id or ''}\0{key}".encode('utf-8')).hexdigest()
+
+    def claim(self, record_id: str, scope: str, key: str, user_id: Optional[str],
+              request_hash: str) -> Tuple[str, Optional[IdempotencyKey]]:
+        """('new', None) when this request should run; otherwise the key's status
+        ('completed', 'in_progress' or 'mismatch') and its row."""
+        config = current_app.config
+        self._prune()
+        for _ in range(3):
+            now = datetime.utcnow()
+            expires_at = now + timedelta(seconds=config['IDEMPOTENCY_LEASE_SECONDS'])
+            db.session.add(IdempotencyKey(id=record_id, scope=scope, key=key, user_id=user_id,
+                                          request_hash=request_hash, status='in_progress', expires_at=expires_at))
+            try:
+                db.session.commit()
+                self._start(record_id)
+                return 'new', None
+            except IntegrityError:
+                db.session.rollback()
+            row = db.session.get(IdempotencyKey, record_id, populate_existing=True)
+            if row is None:
+                # Released between the insert and the read; claim it again
+                continue
+            if row.expires_at <= now:
+                # A dead request's lease, or a response past its TTL: take the key over
+                taken = db.session.execute(
+                    update(IdempotencyKey)
+                    .where(IdempotencyKey.id == record_id, IdempotencyKey.expires_at == row.expires_at)
+                    .values(request_hash=request_hash, status='in_progress', response_status=None,
+                            response_body=None, response_mimetype=None, created_at=now, completed_at=None,
+                            expires_at=expires_at)
+                ).rowcount
+                db.session.commit()
+                if taken:
+                    self._start(record_id)
+                    return 'new', None
+                continue
+            if row.request_hash != request_hash:
+                return 'mismatch', row
+            return row.status, row
+        return 'in_progress', None
+
+    def wait(self, record_id: str, timeout: float) -> Optional[IdempotencyKey]:
+        """The key's row once it completes, or as it is at the timeout; None if it was released."""
+        deadline = time.monotonic() + timeout
+        poll = current_app.config['IDEMPOTENCY_POLL_SECONDS']
+        while True:
+            remaining = deadline - time.monotonic()
+            with self._lock:
+                event = self._running.get(record_id)
+            if event is not None:
+                event.wait(max(0.0, min(remaining, poll)))
+            elif remaining > 0:
+                time.sleep(min(remaining, poll))
+            # End the read transaction so the next read sees the other request's commit
+            db.session.rollback()
+            row = db.session.get(IdempotencyKey, record_id, populate_existing=True)
+            if row is None:
+                return None
+            if row.status == 'completed' or time.monotonic() >= deadline:
+                return row
+            if row.expires_at <= datetime.utcnow():
+                # The request holding it died
+                return None
+
+    def complete(self, record_id: str, response: Response) -> None:
+        config = current_app.config
+        now = datetime.utcnow()
+        try:
+            # Drop whatever the view left uncommitted (teardown would discard it anyway)
+            db.session.rollback()
+            db.session.execute(
+                update(IdempotencyKey).where(IdempotencyKey.id == record_id)
+                .values(status='completed', response_status=response.status_code,
+                        response_body=response.get_data(as_text=True), response_mimetype=response.mimetype,
+                        completed_at=now, expires_at=now + timedelta(seconds=config['IDEMPOTENCY_TTL_SECONDS']))
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error storing idempotent response: {str(e)}")
+        finally:
+            self._finish(record_id)
+
+    def release(self, record_id: str) -> None:
+        try:
+            db.session.rollback()
+            db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.id == record_id))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error releasing idempotency key: {str(e)}")
+        finally:
+            self._finish(record_id)
+
+    def _start(self, record_id: str) -> None:
+        with self._lock:
+            self._running[record_id] = threading.Event()
+
+    def _finish(self, record_id: str) -> None:
+        with self._lock:
+            event = self._running.pop(record_id, None)
+        if event is not None:
+            event.set()
+
+    def _prune(self) -> None:
+        if time.monotonic() - self._pruned_at < _PRUNE_INTERVAL_SECONDS:
+            return
+        self._pruned_at = time.monotonic()
+        try:
+            db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < datetime.utcnow()))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"Error pruning idempotency keys: {str(e)}")
+
+
+def _replay(row: IdempotencyKey) -> Response:
+    response = Response(row.response_body, status=row.response_status, mimetype=row.response_mimetype)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _begin(scope: str):
+    """(record_id, None) when the view should run, or (None, the response to return instead)."""
+    key = request.headers.get(HEADER, '').strip()
+    if len(key) > _MAX_KEY_LENGTH:
+        return None, (jsonify({'success': False, 'error': f"{HEADER} is longer than {_MAX_KEY_LENGTH} characters"}), 400)
+    user_id = (request.get_json(silent=True) or {}).get('userId')
+    user_id = str(user_id) if user_id is not None else None
+    store = IdempotencyStore.get_instance()
+    record_id = store.record_id(scope, user_id, key)
+    request_hash = hashlib.sha256(request.get_data()).hexdigest()
+    waited = False
+    for _ in range(3):
+        status, row = store.claim(record_id, scope, key, user_id, request_hash)
+        if status == 'new':
+            _requests_total.inc(labels={'outcome': 'new'})
+            return record_id, None
+        if status == 'mismatch':
+            _requests_total.inc(labels={'outcome': 'mismatch'})
+            return None, (jsonify({'success': False,
+                                   'error': f"{HEADER} was already used for a different request"}), 422)
+        if status == 'completed':
+            _requests_total.inc(labels={'outcome': 'attached' if waited else 'replayed'})
+            return None, _replay(row)
+        # Still running elsewhere: wait for its response instead of running it twice
+        waited = True
+        row = store.wait(record_id, current_app.config['IDEMPOTENCY_WAIT_SECONDS'])
+        if row is not None and row.status == 'completed':
+            _requests_total.inc(labels={'outcome': 'attached'})
+            return None, _replay(row)
+        if row is not None:
+            break
+        # Released (the first request failed) or its lease ran out: claim it again
+    _requests_total.inc(labels={'outcome': 'in_progress'})
+    response = jsonify({'success': False, 'error': f"A request with this {HEADER} is still in progress"})
+    response.headers['Retry-After'] = '1'
+    return None, (response, 409)
+
+
+def _end(record_id: str, rv) -> Response:
+    response = current_app.make_response(rv)
+    store = IdempotencyStore.get_instance()
+    # Failures and cancellations can be retried; everything else is the answer for this key
+    if response.status_code >= 500 or response.status_code == 499:
+        store.release(record_id)
+    else:
+        store.complete(record_id, response)
+    return response
+
+
+def idempotent(scope: str):
+    """Decorator honouring an Idempotency-Key header (see module docstring).
+
+    Apply it outside @cancellable_route, so a retry attaches to the running
+    request instead of superseding it.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not request.headers.get(HEADER, '').strip():
+                    return await func(*args, **kwargs)
+                record_id, early = _begin(scope)
+                if early is not None:
+                    return early
+                try:
+                    rv = await func(*args, **kwargs)
+                except BaseException:
+                    IdempotencyStore.get_instance().release(record_id)
+                    raise
+                return _end(record_id, rv)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not request.headers.get(HEADER, '').strip():
+                return func(*args, **kwargs)
+            record_id, early = _begin(scope)
+            if early is not None:
+                return early
+            try:
+                rv = func(*args, **kwargs)
+            except BaseException:
+                IdempotencyStore.get_instance().release(record_id)
+                raise
+            return _end(record_id, rv)
+        return wrapper
+    return decorator
@@ -0,0 +1,279 @@
+"""
+Fair scheduling of LLM calls across users and companies.
+
+Every Messages API call takes a slot from LLMScheduler first. At most
+LLM_MAX_CONCURRENCY calls run at once; the rest wait in one queue per
+priority class (interactive chat > refinement > bulk generation), and bulk
+calls may never hold the last LLM_RESERVED_SLOTS slots, so a chat turn finds
+a free slot even while a batch job saturates the rest.
+
+Within a class, calls are ordered by start-time fair queuing: each user is a
+flow whose share is its LLM_USER_WEIGHTS weight times its company's
+LLM_COMPANY_WEIGHTS weight, split between that company's users currently
+queued, so one user (or one tenant) with a deep backlog cannot push everyone
+else's calls behind it. Each waiting call also has a deadline per class: a
+call within LLM_QUEUE_URGENT_SECONDS of its deadline is served next,
+earliest deadline first, and one that reaches it gives up with
+LLMQueueTimeout instead of sending a request nobody is waiting for.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from flask import g
+
+from ..utils.metrics import registry
+from ..utils.timing import RollingPercentiles
+from ..utils.cancellation import RequestCancelled, current_token
+
+_queue_depth = registry.gauge('helix_llm_queue_depth', 'LLM calls waiting for a scheduler slot, by priority class')
+_inflight = registry.gauge('helix_llm_inflight', 'LLM calls holding a scheduler slot, by priority class')
+_queue_wait_seconds = registry.histogram('helix_llm_queue_wait_seconds',
+                                         'Time LLM calls waited for a scheduler slot, by priority class',
+                                         buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+_queue_timeouts_total = registry.counter('helix_llm_queue_timeouts_total',
+                                         'LLM calls that reached their queue deadline without a slot, by priority class')
+_queue_promotions_total = registry.counter('helix_llm_queue_deadline_promotions_total',
+                                           'LLM calls served ahead of fair order because their deadline was near')
+
+PRIORITY_CLASSES = ('interactive', 'refine', 'bulk')
+
+# Call types (as passed to AIService._create_message) -> priority class;
+# unknown call types, including shadow replays (shadow_<call type>), are
+# treated as bulk
+CALL_PRIORITIES = {
+    'chat': 'interactive',
+    'refine_step': 'refine',
+    'generate_sequence': 'bulk',
+    'generate_sequence_outline': 'bulk',
+    'generate_sequence_step': 'bulk',
+    'personalize_step': 'bulk',
+}
+
+
+class LLMQueueTimeout(Exception):
+    """An LLM call waited in the scheduler queue past its deadline."""
+
+
+@dataclass(frozen=True)
+class LLMCaller:
+    user_id: str
+    company: Optional[str] = None
+
+
+def set_llm_caller(user_id: str, company: Optional[str] = None) -> None:
+    """Attribute this request's LLM calls to a user and company for fair scheduling."""
+    g.llm_caller = LLMCaller(str(user_id), company or None)
+
+
+def current_caller() -> LLMCaller:
+    try:
+        caller = g.get('llm_caller')
+    except RuntimeError:
+        caller = None
+    if caller is None:
+        token = current_token()
+        caller = LLMCaller(token.user_id if token is not None and token.user_id else 'anonymous')
+    return caller
+
+
+class _Waiter:
+    __slots__ = ('priority', 'caller', 'tag', 'deadline', 'enqueued', 'seq', 'state', 'event', 'waited')
+
+    def __init__(self, priority: str, caller: LLMCaller, deadline: float, enqueued: float, seq: int):
+        self.priority = priority
+        self.caller = caller
+        self.tag = 0.0
+        self.deadline = deadline
+        self.enqueued = enqueued
+        self.seq = seq
+        self.state = 'queued'       # queued -> granted | expired | cancelled
+        self.event = threading.Event()
+        self.waited = 0.0
+
+
+class LLMScheduler:
+    """Admission control for LLM calls; see module docstring."""
+
+    def __init__(self, max_concurrency: int = 8, reserved_slots: int = 2, urgent_seconds: float = 2.0,
+                 deadlines: Optional[Dict[str, float]] = None, user_weights: Optional[Dict[str, float]] = None,
+                 company_weights: Optional[Dict[str, float]] = None):
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._heaps: Dict[str, List[Any]] = {p: [] for p in PRIORITY_CLASSES}
+        self._queued: Dict[_Waiter, None] = {}
+        self._depth = {p: 0 for p in PRIORITY_CLASSES}
+        self._running = {p: 0 for p in PRIORITY_CLASSES}
+        self._virtual = {p: 0.0 for p in PRIORITY_CLASSES}
+        self._finish: Dict[str, Dict[str, float]] = {p: {} for p in PRIORITY_CLASSES}
+        self._wait_stats = {p: RollingPercentiles(window=500) for p in PRIORITY_CLASSES}
+        self._config_key = None
+        self._apply(max_concurrency, reserved_slots, urgent_seconds, deadlines or {}, user_weights or {},
+                    company_weights or {})
+
+    def configure(self, config: Dict[str, Any]) -> None:
+        """Apply LLM_* scheduler settings from the app config (no-op when unchanged)."""
+        key = (config['LLM_MAX_CONCURRENCY'], config['LLM_RESERVED_SLOTS'], config['LLM_QUEUE_URGENT_SECONDS'],
+               tuple(sorted(config['LLM_QUEUE_DEADLINES'].items())), tuple(sorted(config['LLM_USER_WEIGHTS'].items())),
+               tuple(sorted(config['LLM_COMPANY_WEIGHTS'].items())))
+        if key == self._config_key:
+            return
+        self._apply(config['LLM_MAX_CONCURRENCY'], config['LLM_RESERVED_SLOTS'], config['LLM_QUEUE_URGENT_SECONDS'],
+                    config['LLM_QUEUE_DEADLINES'], config['LLM_USER_WEIGHTS'], config['LLM_COMPANY_WEIGHTS'])
+        self._config_key = key
+
+    def _apply(self, max_concurrency, reserved_slots, urgent_seconds, deadlines, user_weights, company_weights):
+        with self._lock:
+            self.max_concurrency = max(int(max_concurrency), 1)
+            self.reserved_slots = min(max(int(reserved_slots), 0), self.max_concurrency - 1)
+            self.urgent_seconds = float(urgent_seconds)
+            self.deadlines = {p: float(deadlines.get(p, 60.0)) for p in PRIORITY_CLASSES}
+            self.user_weights = {k: float(v) for k, v in user_weights.items()}
+            self.company_weights = {k: float(v) for k, v in company_weights.items()}
+            self._dispatch(time.monotonic())
+
+    @contextmanager
+    def slot(self, call_type: str, cost: float = 1.0, caller: Optional[LLMCaller] = None):
+        """Hold a scheduler slot for one LLM call; yields the seconds spent waiting.
+
+        cost is the call's expected size (e.g. thousands of max output tokens).
+        Raises LLMQueueTimeout at the class deadline, or RequestCancelled if the
+        request's cancellation token fires while waiting.
+        """
+        priority = CALL_PRIORITIES.get(call_type, 'bulk')
+        waiter = self._enqueue(priority, caller or current_caller(), max(cost, 0.01))
+        self._wait(waiter, current_token())
+        try:
+            yield waiter.waited
+        finally:
+            with self._lock:
+                self._running[priority] -= 1
+                _inflight.set(self._running[priority], {'priority': priority})
+                self._dispatch(time.monotonic())
+
+    def _enqueue(self, priority: str, caller: LLMCaller, cost: float) -> _Waiter:
+        now = time.monotonic()
+        with self._lock:
+            waiter = _Waiter(priority, caller, now + self.deadlines[priority], now, next(self._seq))
+            weight = self._weight(priority, caller)
+            finish = self._finish[priority]
+            waiter.tag = max(self._virtual[priority], finish.get(caller.user_id, 0.0))
+            finish[caller.user_id] = waiter.tag + cost / weight
+            heapq.heappush(self._heaps[priority], (waiter.tag, waiter.seq, waiter))
+            self._queued[waiter] = None
+            self._depth[priority] += 1
+            _queue_depth.set(self._depth[priority], {'priority': priority})
+            self._dispatch(now)
+        return waiter
+
+    def _weight(self, priority: str, caller: LLMCaller) -> float:
+        weight = self.user_weights.get(caller.user_id, 1.0)
+        if caller.company:
+            # The company's share is split between its users with queued calls
+            users = {w.caller.user_id for w in self._queued
+                     if w.priority == priority and w.caller.company == caller.company}
+            users.add(caller.user_id)
+            weight *= self.company_weights.get(caller.company, 1.0) / len(users)
+        return max(weight, 1e-6)
+
+    def _wait(self, waiter: _Waiter, token) -> None:
+        unregister = token.on_cancel(lambda: self._cancel(waiter)) if token is not None else None
+        try:
+            if not waiter.event.wait(max(waiter.deadline - time.monotonic(), 0.0)):
+                with self._lock:
+                    if waiter.state == 'queued':
+                        self._remove(waiter, 'expired')
+        finally:
+            if unregister is not None:
+                unregister()
+        labels = {'priority': waiter.priority}
+        if waiter.state == 'cancelled':
+            raise RequestCancelled(token.reason)
+        if waiter.state == 'expired':
+            _queue_timeouts_total.inc(labels=labels)
+            raise LLMQueueTimeout(f"No LLM slot within {self.deadlines[waiter.priority]:g}s "
+                                  f"({waiter.priority} queue)")
+        _queue_wait_seconds.observe(waiter.waited, labels)
+        self._wait_stats[waiter.priority].add(waiter.waited)
+
+    def _cancel(self, waiter: _Waiter) -> None:
+        with self._lock:
+            if waiter.state == 'queued':
+                self._remove(waiter, 'cancelled')
+        waiter.event.set()
+
+    def _remove(self, waiter: _Waiter, state: str) -> None:
+        # Lock held. Heap entries are dropped lazily when popped
+        waiter.state = state
+        del self._queued[waiter]
+        priority = waiter.priority
+        self._depth[priority] -= 1
+        _queue_depth.set(self._depth[priority], {'priority': priority})
+        if not self._depth[priority]:
+            # No backlog left in this class: finish tags no longer matter
+            self._heaps[priority].clear()
+            self._finish[priority].clear()
+
+    def _dispatch(self, now: float) -> None:
+        # Lock held. Grant free slots to the best waiters
+        while sum(self._running.values()) < self.max_concurrency:
+            waiter = self._pick(now)
+            if waiter is None:
+                return
+            self._remove(waiter, 'granted')
+            self._running[waiter.priority] += 1
+            _inflight.set(self._running[waiter.priority], {'priority': waiter.priority})
+            waiter.waited = now - waiter.enqueued
+            waiter.event.set()
+
+    def _pick(self, now: float) -> Optional[_Waiter]:
+        bulk_open = self._running['bulk'] < self.max_concurrency - self.reserved_slots
+        fair = None
+        for priority in PRIORITY_CLASSES:
+            if priority == 'bulk' and not bulk_open:
+                continue
+            heap = self._heaps[priority]
+            while heap and heap[0][2].state != 'queued':
+                heapq.heappop(heap)
+            if heap:
+                fair = heap[0][2]
+                break
+        # Calls close to their deadline go first (queues are short, so a scan is fine)
+        urgent = [w for w in self._queued
+                  if w.deadline - now <= self.urgent_seconds and (bulk_open or w.priority != 'bulk')]
+        if urgent:
+            waiter = min(urgent, key=lambda w: (w.deadline, w.seq))
+            if waiter is not fair:
+                # Its heap entry is skipped once popped
+                _queue_promotions_total.inc(labels={'priority': waiter.priority})
+                return waiter
+        if fair is not None:
+            heapq.heappop(self._heaps[fair.priority])
+            self._virtual[fair.priority] = fair.tag
+        return fair
+
+    def summary(self) -> Dict[str, Any]:
+        """Slots, queue depth, wait percentiles (ms) and timeouts per class, for the admin API."""
+        with self._lock:
+            queued_users: Dict[str, int] = {}
+            for waiter in self._queued:
+                queued_users[waiter.caller.user_id] = queued_users.get(waiter.caller.user_id, 0) + 1
+            classes = {p: {'queued': self._depth[p], 'running': self._running[p],
+                           'deadlineSeconds': self.deadlines[p]} for p in PRIORITY_CLASSES}
+        for priority, entry in classes.items():
+            wait = self._wait_stats[priority].summary()
+            entry['waitMs'] = {k: round(wait[k] * 1000, 1) for k in ('p50', 'p95', 'p99', 'max') if k in wait}
+            entry['served'] = wait['count']
+            entry['timeouts'] = int(_queue_timeouts_total.get({'priority': priority}))
+            entry['deadlinePromotions'] = int(_queue_promotions_total.get({'priority': priority}))
+        return {
+            'maxConcurrency': self.max_concurrency,
+            'reservedSlots': self.reserved_slots,
+            'classes': classes,
+            'queuedByUser': dict(sorted(queued_users.items(), key=lambda item: -item[1])[:20])
+        }
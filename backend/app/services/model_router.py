@@ -0,0 +1,251 @@
+import time
+import random
+import difflib
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ..utils.metrics import registry
+from ..utils.intent_classifier import ACTION_RE, OFFER_RE
+
+logger = logging.getLogger(__name__)
+
+_route_requests_total = registry.counter('helix_model_route_requests_total',
+                                         'LLM calls by route, model, mode (live, shadow) and status')
+_route_duration_seconds = registry.histogram('helix_model_route_duration_seconds',
+                                             'LLM call latency in seconds by route, model and mode')
+_route_cost_usd_total = registry.counter('helix_model_route_cost_usd_total',
+                                         'Estimated LLM spend in USD by route, model and mode')
+_shadow_comparisons_total = registry.counter('helix_model_route_shadow_total',
+                                             'Shadow comparisons against the live model by route and outcome '
+                                             '(agree, disagree, error, dropped)')
+_shadow_pending = registry.gauge('helix_model_route_shadow_pending', 'Shadow replays queued or running')
+_shadow_similarity = registry.histogram('helix_model_route_shadow_similarity',
+                                        'Text similarity (0-1) of shadow vs live responses by route',
+                                        buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0))
+
+ROUTE_STATES = ('off', 'shadow', 'live')
+
+# Texts longer than this are truncated before the (quadratic) similarity check
+_COMPARE_CHARS = 2000
+
+
+@dataclass(frozen=True)
+class Route:
+    """A rule sending some calls of one call type to a cheaper tier."""
+    name: str
+    call_type: str
+    tier: str
+    matches: Callable[[Dict[str, Any], Dict[str, Any]], bool]
+    description: str
+
+
+ROUTES: List[Route] = [
+    Route('chat_short', 'chat', 'small',
+          lambda f, c: f['message_chars'] <= c['MODEL_ROUTE_SHORT_MESSAGE_CHARS'] and not f['tools_likely'],
+          'Short chat turns (acknowledgements, greetings) that are unlikely to need a tool'),
+    Route('refine_small', 'refine_step', 'small',
+          lambda f, c: (f['step_chars'] <= c['MODEL_ROUTE_SMALL_STEP_CHARS']
+                        and f['feedback_chars'] <= c['MODEL_ROUTE_SHORT_MESSAGE_CHARS'] * 4),
+          'Small edits to a step of ordinary length'),
+]
+
+
+@dataclass
+class RouteDecision:
+    route: str
+    model: str                      # Model that serves the response
+    state: str = 'off'
+    shadow_model: Optional[str] = None
+    features: Dict[str, Any] = field(default_factory=dict)
+
+
+def chat_features(user_message: str, previous_assistant: Optional[str], tools_available: bool) -> Dict[str, Any]:
+    """Cheap features of a chat turn used for routing."""
+    tools_likely = tools_available and bool(
+        ACTION_RE.search(user_message or '')
+        or (len((user_message or '').strip()) <= 12 and OFFER_RE.search(previous_assistant or ''))
+    )
+    return {'message_chars': len((user_message or '').strip()), 'tools_likely': tools_likely}
+
+
+def refine_features(step_content: str, feedback: str) -> Dict[str, Any]:
+    return {'step_chars': len(step_content or ''), 'feedback_chars': len(feedback or '')}
+
+
+class ModelRouter:
+    """Picks a model per call from configurable tiers, and measures each route.
+
+    A route is a rule in ROUTES that moves matching calls to a cheaper tier.
+    MODEL_ROUTES sets each route's state: 'off' (default model), 'shadow'
+    (default model serves the response; a sample of calls is replayed on the
+    route's model in the background and the outcomes compared) or 'live'.
+    """
+
+    def __init__(self, max_shadow_workers: int = 2, recent: int = 50):
+        self._executor = ThreadPoolExecutor(max_workers=max_shadow_workers, thread_name_prefix='model-shadow')
+        self._pending = 0
+        self._recent_shadow = deque(maxlen=recent)
+        self._stats: Dict[tuple, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def choose(self, call_type: str, features: Dict[str, Any], config: Dict[str, Any],
+               default_model: str) -> RouteDecision:
+        states = config.get('MODEL_ROUTES') or {}
+        for route in ROUTES:
+            if route.call_type != call_type or not route.matches(features, config):
+                continue
+            state = states.get(route.name, 'off')
+            model = config['MODEL_TIERS'][route.tier]['model']
+            if state == 'live':
+                return RouteDecision(route.name, model, state, features=features)
+            shadow = (state == 'shadow' and model != default_model
+                      and random.random() < config['MODEL_SHADOW_SAMPLE_RATE'])
+            return RouteDecision(route.name, default_model, state, model if shadow else None, features)
+        return RouteDecision(call_type, default_model, features=features)
+
+    def cost(self, model: str, usage: Any, tiers: Dict[str, Dict[str, Any]]) -> float:
+        """Estimated USD cost of one call from its token usage and the tier price table."""
+        prices = next((tier for tier in tiers.values() if tier['model'] == model), None)
+        if prices is None or usage is None:
+            return 0.0
+        input_tokens = (getattr(usage, 'input_tokens', 0) or 0) + (getattr(usage, 'cache_creation_input_tokens', 0) or 0)
+        cached_tokens = getattr(usage, 'cache_read_input_tokens', 0) or 0
+        output_tokens = getattr(usage, 'output_tokens', 0) or 0
+        # Cache reads are billed at a tenth of the input price
+        return (input_tokens * prices['input_cost'] + cached_tokens * prices['input_cost'] * 0.1
+                + output_tokens * prices['output_cost']) / 1_000_000
+
+    def record(self, route: str, model: str, seconds: float, status: str, cost: float = 0.0,
+               mode: str = 'live') -> None:
+        labels = {'route': route, 'model': model, 'mode': mode}
+        _route_requests_total.inc(labels={**labels, 'status': status})
+        _route_duration_seconds.observe(seconds, labels)
+        if cost:
+            _route_cost_usd_total.inc(cost, labels)
+        with self._lock:
+            stats = self._stats.setdefault((route, mode, model), {'calls': 0, 'errors': 0, 'seconds': 0.0, 'cost': 0.0})
+            stats['calls'] += 1
+            stats['errors'] += status != 'success'
+            stats['seconds'] += seconds
+            stats['cost'] += cost
+
+    def shadow(self, decision: RouteDecision, request_params: Dict[str, Any], primary: Any,
+               primary_seconds: float, create: Callable[..., Tuple[Any, float]], tiers: Dict[str, Dict[str, Any]],
+               max_pending: int) -> bool:
+        """Replay a live call on the route's candidate model in the background and compare.
+
+        create(**params) sends the replay and returns (message, seconds); the
+        caller makes it take a scheduler slot and record usage. The sample is
+        dropped (False) while max_pending replays are already queued or running.
+        """
+        if not decision.shadow_model:
+            return False
+        with self._lock:
+            if self._pending >= max_pending:
+                _shadow_comparisons_total.inc(labels={'route': decision.route, 'outcome': 'dropped'})
+                return False
+            self._pending += 1
+            _shadow_pending.set(self._pending)
+        params = {**request_params, 'model': decision.shadow_model}
+        self._executor.submit(self._run_shadow, decision, params, primary, primary_seconds, create, tiers)
+        return True
+
+    def _run_shadow(self, decision: RouteDecision, params: Dict[str, Any], primary: Any,
+                    primary_seconds: float, create: Callable[..., Tuple[Any, float]],
+                    tiers: Dict[str, Dict[str, Any]]) -> None:
+        try:
+            self._compare_shadow(decision, params, primary, primary_seconds, create, tiers)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                _shadow_pending.set(self._pending)
+
+    def _compare_shadow(self, decision: RouteDecision, params: Dict[str, Any], primary: Any,
+                        primary_seconds: float, create: Callable[..., Tuple[Any, float]],
+                        tiers: Dict[str, Dict[str, Any]]) -> None:
+        start = time.perf_counter()
+        try:
+            candidate, seconds = create(**params)
+        except Exception as e:
+            self.record(decision.route, decision.shadow_model, time.perf_counter() - start, 'error', mode='shadow')
+            _shadow_comparisons_total.inc(labels={'route': decision.route, 'outcome': 'error'})
+            logger.warning(f"Shadow call for route {decision.route} failed: {e}")
+            return
+        cost = self.cost(decision.shadow_model, getattr(candidate, 'usage', None), tiers)
+        self.record(decision.route, decision.shadow_model, seconds, 'success', cost, mode='shadow')
+
+        comparison = compare_responses(primary, candidate)
+        _shadow_similarity.observe(comparison['similarity'], {'route': decision.route})
+        _shadow_comparisons_total.inc(labels={'route': decision.route,
+                                              'outcome': 'agree' if comparison['agree'] else 'disagree'})
+        self._recent_shadow.append({
+            'route': decision.route,
+            'liveModel': decision.model,
+            'shadowModel': decision.shadow_model,
+            'liveMs': round(primary_seconds * 1000, 1),
+            'shadowMs': round(seconds * 1000, 1),
+            'shadowCostUsd': round(cost, 6),
+            'features': decision.features,
+            **comparison
+        })
+
+    def summary(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Per-route state, tier, live/shadow stats and shadow agreement, for the admin API."""
+        states = config.get('MODEL_ROUTES') or {}
+        with self._lock:
+            stats = {key: dict(value) for key, value in self._stats.items()}
+        routes = {}
+        for (route, mode, model), values in sorted(stats.items()):
+            entry = routes.setdefault(route, {'modes': {}})
+            entry['modes'].setdefault(mode, {})[model] = {
+                'calls': int(values['calls']),
+                'errors': int(values['errors']),
+                'avgMs': round(values['seconds'] / values['calls'] * 1000, 1) if values['calls'] else None,
+                'costUsd': round(values['cost'], 6)
+            }
+        for route in ROUTES:
+            entry = routes.setdefault(route.name, {'modes': {}})
+            agree = _shadow_comparisons_total.get({'route': route.name, 'outcome': 'agree'})
+            disagree = _shadow_comparisons_total.get({'route': route.name, 'outcome': 'disagree'})
+            entry.update({
+                'state': states.get(route.name, 'off'),
+                'tier': route.tier,
+                'model': config['MODEL_TIERS'][route.tier]['model'],
+                'description': route.description,
+                'shadowAgreement': round(agree / (agree + disagree), 3) if agree + disagree else None,
+                'shadowDropped': int(_shadow_comparisons_total.get({'route': route.name, 'outcome': 'dropped'}))
+            })
+        return {'routes': routes, 'recentShadow': list(self._recent_shadow), 'shadowPending': self._pending}
+
+
+def _tool_names(message: Any) -> List[str]:
+    return sorted(block.name for block in getattr(message, 'content', []) if getattr(block, 'type', None) == 'tool_use')
+
+
+def _text(message: Any) -> str:
+    return ' '.join(block.text for block in getattr(message, 'content', [])
+                    if getattr(block, 'type', None) == 'text')
+
+
+def compare_responses(primary: Any, candidate: Any) -> Dict[str, Any]:
+    """Outcome comparison: same tool calls, and for text replies a comparable length.
+
+    Similarity is reported for trend-watching only; two good replies can be
+    worded very differently, so it does not decide agreement.
+    """
+    primary_tools, candidate_tools = _tool_names(primary), _tool_names(candidate)
+    primary_text, candidate_text = _text(primary), _text(candidate)
+    similarity = difflib.SequenceMatcher(None, primary_text[:_COMPARE_CHARS], candidate_text[:_COMPARE_CHARS]).ratio()
+    length_ratio = (len(candidate_text) + 1) / (len(primary_text) + 1)
+    agree = primary_tools == candidate_tools and (bool(primary_tools) or 0.5 <= length_ratio <= 2.0)
+    return {
+        'agree': agree,
+        'similarity': round(similarity, 3),
+        'lengthRatio': round(length_ratio, 2),
+        'liveTools': primary_tools,
+        'shadowTools': candidate_tools
+    }
@@ -0,0 +1,355 @@
+"""
+Clustered LLM personalization of a sequence's opening step.
+
+A job runs in three phases over an uploaded candidate list, each one
+checkpointed on its PersonalizationJob row:
+
+1. clustering - one pass over the candidates groups similar profiles
+   (ProfileClusterer) and writes each candidate's cluster to assignments.bin
+2. generating - one AIService.personalize_step call per cluster, at most
+   PERSONALIZATION_CONCURRENCY at a time, committed every
+   PERSONALIZATION_BATCH_SIZE clusters
+3. rendering - a second pass mail-merges every candidate with their
+   cluster's variant (the original step for overflow candidates and variants
+   that came back unusable) into output.jsonl
+
+So LLM calls scale with the number of clusters, not candidates, and memory
+with the number of clusters. A job that failed or was interrupted resumes
+after its last finished phase; variants already written are kept. Progress
+goes to the owner's Socket.IO room as personalization_progress events.
+"""
+
+import os
+import json
+import uuid
+import shutil
+import logging
+import threading
+import contextvars
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, IO, Iterator, List, Optional
+
+from flask import current_app
+
+from .. import socketio
+from ..api.socket_events import user_room
+from ..database.db import db
+from ..models import PersonalizationJob, PersonalizationVariant, Sequence, User
+from ..utils.mail_merge import Binding, MissingFieldsError, compile_template, normalize_field
+from ..utils.metrics import registry
+from ..utils.profile_clusters import OVERFLOW, ProfileClusterer
+from .ai_service import AIService
+from .llm_scheduler import set_llm_caller
+from .personalization_service import MergeJob, PersonalizationService, read_candidates
+from .usage_service import usage_scope
+
+logger = logging.getLogger(__name__)
+
+_jobs_total = registry.counter('helix_personalization_jobs_total', 'Personalization job runs finished, by status')
+_variants_total = registry.counter('helix_personalization_variants_total',
+                                   'Cluster variants by outcome (generated, fallback)')
+
+# Columns that identify a candidate rather than describe them; not clustered on by default
+IDENTITY_COLUMNS = {'ID', 'CANDIDATE_ID', 'NAME', 'FIRST_NAME', 'LAST_NAME', 'FULL_NAME', 'CANDIDATE_NAME',
+                    'EMAIL', 'PHONE', 'LINKEDIN', 'LINKEDIN_URL', 'URL'}
+
+ASSIGNMENTS_FILE = 'assignments.bin'
+OUTPUT_FILE = 'output.jsonl'
+
+# Candidates per clustering / rendering progress event (and rendering checkpoint)
+PROGRESS_EVERY = 5000
+
+
+def _iter_assignments(path: str, chunk: int = PROGRESS_EVERY) -> Iterator[int]:
+    with open(path, 'rb') as stream:
+        while True:
+            batch = array('i')
+            try:
+                batch.fromfile(stream, chunk)
+            except EOFError:
+                pass  # Short last chunk; what was read is in batch
+            if not batch:
+                return
+            yield from batch
+
+
+class PersonalizationPipeline:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Get or create a singleton instance of PersonalizationPipeline."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._running = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def job_dir(job_id: str) -> str:
+        base = current_app.config.get('PERSONALIZATION_JOB_DIR') or os.path.join(current_app.instance_path,
+                                                                                 'personalization_jobs')
+        return os.path.join(base, job_id)
+
+    def input_path(self, job: PersonalizationJob) -> str:
+        return os.path.join(self.job_dir(job.id), f"candidates.{job.input_format}")
+
+    def output_path(self, job: PersonalizationJob) -> str:
+        return os.path.join(self.job_dir(job.id), OUTPUT_FILE)
+
+    @staticmethod
+    def _steps(sequence: Sequence) -> List[Dict[str, Any]]:
+        return [{'order': step.order, 'title': step.title, 'content': step.content} for step in sequence.steps]
+
+    @staticmethod
+    def _defaults(sequence: Sequence, job: PersonalizationJob) -> Dict[str, Any]:
+        return {**PersonalizationService.get_instance().sequence_defaults(sequence), **job.get_defaults()}
+
+    def create_job(self, sequence: Sequence, upload: IO[bytes], input_format: str = 'csv',
+                   profile_columns: Optional[List[str]] = None,
+                   defaults: Optional[Dict[str, Any]] = None) -> PersonalizationJob:
+        """Store the upload and validate it, without starting the job.
+
+        Raises MissingFieldsError if a placeholder of any step can't be filled,
+        and ValueError for an unreadable upload or unknown profile columns.
+        Profile columns default to every column that doesn't identify the
+        candidate (name, email, ...).
+        """
+        if not sequence.steps:
+            raise ValueError("Sequence has no steps to personalize")
+        job = PersonalizationJob(id=str(uuid.uuid4()), user_id=sequence.user_id, sequence_id=sequence.id,
+                                 status='pending', input_format=input_format, defaults=json.dumps(defaults or {}))
+        directory = self.job_dir(job.id)
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.input_path(job), 'wb') as out:
+                shutil.copyfileobj(upload, out, 1024 * 1024)
+            with open(self.input_path(job), 'rb') as stream:
+                columns, _ = read_candidates(stream, input_format)
+            MergeJob(self._steps(sequence), columns, iter(()), self._defaults(sequence, job))
+            if profile_columns:
+                unknown = [column for column in profile_columns if column not in columns]
+                if unknown:
+                    raise ValueError(f"Unknown profile columns: {', '.join(unknown)}")
+            else:
+                profile_columns = [column for column in columns if normalize_field(column) not in IDENTITY_COLUMNS]
+            if not profile_columns:
+                raise ValueError("No profile columns to cluster candidates on")
+        except Exception:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        job.profile_columns = json.dumps(profile_columns)
+        db.session.add(job)
+        db.session.commit()
+        return job
+
+    def is_running(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._running
+
+    def start(self, job_id: str) -> bool:
+        """Run (or resume) the job in a background task; False if it is already running here."""
+        with self._lock:
+            if job_id in self._running:
+                return False
+            self._running.add(job_id)
+        socketio.start_background_task(self._run_in_app, current_app._get_current_object(), job_id)
+        return True
+
+    def _run_in_app(self, app, job_id: str) -> None:
+        try:
+            with app.app_context():
+                self.run(job_id)
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+
+    def run(self, job_id: str) -> Optional[PersonalizationJob]:
+        """Run the job's remaining phases in this thread."""
+        job = db.session.get(PersonalizationJob, job_id)
+        if job is None or job.status == 'completed':
+            return job
+        sequence = db.session.get(Sequence, job.sequence_id)
+        owner = db.session.get(User, job.user_id)
+        set_llm_caller(job.user_id, owner.company if owner else None)
+        job.status = 'running'
+        job.error = None
+        db.session.commit()
+        try:
+            if sequence is None:
+                raise ValueError("Sequence no longer exists")
+            with usage_scope(sequence_id=job.sequence_id):
+                if job.phase is None:
+                    self._cluster(job)
+                if job.phase == 'clustered':
+                    self._generate(job, sequence)
+                if job.phase == 'generated':
+                    self._render(job, sequence)
+            job.status = 'completed'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(PersonalizationJob, job_id)
+            job.status = 'failed'
+            job.error = str(e)
+            db.session.commit()
+            logger.error(f"Personalization job {job_id} failed after phase {job.phase or '(none)'}: {e}")
+        _jobs_total.inc(labels={'status': job.status})
+        self._progress(job, job.status, 1, 1)
+        return job
+
+    def _progress(self, job: PersonalizationJob, phase: str, done: int, total: int) -> None:
+        socketio.emit('personalization_progress', {
+            'jobId': job.id,
+            'sequenceId': job.sequence_id,
+            'status': job.status,
+            'phase': phase,
+            'done': done,
+            'total': total,
+            'llmCalls': job.llm_calls,
+            'error': job.error
+        }, to=user_room(job.user_id))
+
+    def _cluster(self, job: PersonalizationJob) -> None:
+        config = current_app.config
+        PersonalizationVariant.query.filter_by(job_id=job.id).delete()
+        clusterer = ProfileClusterer(threshold=config['PERSONALIZATION_CLUSTER_THRESHOLD'],
+                                     max_clusters=config['PERSONALIZATION_MAX_CLUSTERS'])
+        profile_columns = job.get_profile_columns()
+        path = os.path.join(self.job_dir(job.id), ASSIGNMENTS_FILE)
+        count = 0
+        with open(self.input_path(job), 'rb') as stream, open(path + '.tmp', 'wb') as out:
+            columns, rows = read_candidates(stream, job.input_format)
+            positions = [columns.index(column) for column in profile_columns]
+            batch = array('i')
+            for row in rows:
+                batch.append(clusterer.assign({column: row[position] if position < len(row) else ''
+                                               for column, position in zip(profile_columns, positions)}))
+                count += 1
+                if len(batch) >= PROGRESS_EVERY:
+                    batch.tofile(out)
+                    batch = array('i')
+                    self._progress(job, 'clustering', count, 0)
+            batch.tofile(out)
+        os.replace(path + '.tmp', path)
+
+        for cluster, size in enumerate(clusterer.sizes):
+            description = clusterer.common_features(cluster) or {
+                field: [str(value)] for field, value in clusterer.leaders[cluster].items() if value not in (None, '')}
+            db.session.add(PersonalizationVariant(job_id=job.id, cluster=cluster, size=size, status='pending',
+                                                  profile=json.dumps(description)))
+        job.candidates = count
+        job.clusters = len(clusterer.sizes)
+        job.overflow = clusterer.overflow
+        job.phase = 'clustered'
+        db.session.commit()
+        self._progress(job, 'clustering', count, count)
+
+    def _generate(self, job: PersonalizationJob, sequence: Sequence) -> None:
+        config = current_app.config
+        opening = sequence.steps[0]
+        step = {'title': opening.title, 'content': opening.content}
+        placeholders = list(dict.fromkeys(compile_template(opening.title).fields
+                                          + compile_template(opening.content).fields))
+        with open(self.input_path(job), 'rb') as stream:
+            columns, _ = read_candidates(stream, job.input_format)
+        defaults = self._defaults(sequence, job)
+        pending = PersonalizationVariant.query.filter_by(job_id=job.id, status='pending').order_by(
+            PersonalizationVariant.cluster).all()
+        batch_size = max(config['PERSONALIZATION_BATCH_SIZE'], 1)
+        ai_service = AIService.get_instance()
+        executor = ThreadPoolExecutor(max_workers=max(config['PERSONALIZATION_CONCURRENCY'], 1),
+                                      thread_name_prefix='personalize')
+        try:
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                # A fresh context copy per call: the app context and LLM caller, and spans nest correctly
+                futures = [executor.submit(contextvars.copy_context().run, ai_service.personalize_step, step,
+                                           sequence.position, json.loads(variant.profile or '{}'), placeholders)
+                           for variant in batch]
+                failure = None
+                for variant, future in zip(batch, futures):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # Left pending, so a resumed job retries it
+                        failure = failure or e
+                        continue
+                    job.llm_calls += 1
+                    job.variants_done += 1
+                    if result is not None and self._fits(result, columns, defaults):
+                        variant.title = result['title'][:255]
+                        variant.content = result['content']
+                        variant.status = 'generated'
+                    else:
+                        variant.status = 'fallback'
+                    _variants_total.inc(labels={'outcome': variant.status})
+                db.session.commit()
+                self._progress(job, 'generating', job.variants_done, job.clusters)
+                if failure is not None:
+                    raise failure
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        job.phase = 'generated'
+        db.session.commit()
+
+    @staticmethod
+    def _fits(result: Dict[str, str], columns: List[str], defaults: Dict[str, Any]) -> bool:
+        """Whether every placeholder the variant uses can be filled for this upload."""
+        try:
+            Binding({'title': compile_template(result['title']), 'content': compile_template(result['content'])},
+                    columns, defaults)
+        except MissingFieldsError as e:
+            logger.warning(f"Variant used unknown placeholders {sorted(e.missing)}; using the original step")
+            return False
+        return True
+
+    def _render(self, job: PersonalizationJob, sequence: Sequence) -> None:
+        steps = self._steps(sequence)
+        defaults = self._defaults(sequence, job)
+        variants = {variant.cluster: variant for variant in
+                    PersonalizationVariant.query.filter_by(job_id=job.id, status='generated')}
+        path = self.output_path(job)
+        with open(self.input_path(job), 'rb') as stream, open(path + '.tmp', 'w', encoding='utf-8') as out:
+            columns, rows = read_candidates(stream, job.input_format)
+            original = MergeJob(steps, columns, iter(()), defaults).binding
+            bindings: Dict[int, Binding] = {}
+            count = 0
+            for row, cluster in zip(rows, _iter_assignments(os.path.join(self.job_dir(job.id), ASSIGNMENTS_FILE))):
+                variant = variants.get(cluster)
+                if variant is None:
+                    binding = original
+                else:
+                    binding = bindings.get(cluster)
+                    if binding is None:
+                        personalized = [{**steps[0], 'title': variant.title, 'content': variant.content}] + steps[1:]
+                        binding = bindings[cluster] = MergeJob(personalized, columns, iter(()), defaults).binding
+                text, blank = binding.render(row)
+                count += 1
+                out.write(json.dumps({
+                    'row': count,
+                    'candidate': dict(zip(columns, row)),
+                    'cluster': None if cluster == OVERFLOW else cluster,
+                    'personalized': variant is not None,
+                    'steps': [{'order': s['order'], 'title': text[2 * i], 'content': text[2 * i + 1]}
+                              for i, s in enumerate(steps)],
+                    'blankFields': blank
+                }, ensure_ascii=False) + '\n')
+                if count % PROGRESS_EVERY == 0:
+                    job.rendered = count
+                    db.session.commit()
+                    self._progress(job, 'rendering', count, job.candidates)
+        os.replace(path + '.tmp', path)
+        job.rendered = count
+        job.phase = 'rendered'
+        db.session.commit()
+        self._progress(job, 'rendering', count, job.candidates)
+
+    def variants(self, job_id: str) -> List[Dict[str, Any]]:
+        return [variant.to_dict() for variant in PersonalizationVariant.query.filter_by(job_id=job_id).order_by(
+            PersonalizationVariant.cluster)]
@@ -0,0 +1,197 @@
+import csv
+import io
+import json
+import time
+import logging
+from json.encoder import encode_basestring
+from typing import Any, Dict, IO, Iterator, List, Optional, Tuple
+
+from ..models import Sequence, User
+from ..utils.mail_merge import Binding, compile_template
+from ..utils.metrics import registry
+from .export_service import CHUNK_CHARS, iter_chunks
+
+logger = logging.getLogger(__name__)
+
+_merge_candidates_total = registry.counter('helix_mail_merge_candidates_total',
+                                           'Candidates processed by mail merge, by outcome')
+_merge_duration_seconds = registry.histogram('helix_mail_merge_duration_seconds',
+                                             'Wall time of completed mail merges',
+                                             buckets=(0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0))
+
+INPUT_FORMATS = ('csv', 'jsonl')
+OUTPUT_FORMATS = ('jsonl', 'csv')
+
+# Columns appended to the candidate's own columns, one CSV row per step
+OUTPUT_CSV_COLUMNS = ['step_order', 'step_title', 'step_content', 'blank_fields']
+
+
+def _json_escape(text: str) -> str:
+    """Contents of a JSON string literal (no quotes), as json.dumps(ensure_ascii=False) writes them."""
+    return encode_basestring(text)[1:-1]
+
+
+def _csv_escape(text: str) -> str:
+    """Contents of a quoted CSV field."""
+    return text.replace('"', '""')
+
+
+def read_candidates(stream: IO[bytes], input_format: str) -> Tuple[List[str], Iterator[List[Any]]]:
+    """Columns and a lazy row iterator for a CSV (header row) or JSONL upload.
+
+    A JSONL upload's columns are the keys of its first record; later records
+    are read in that column order and lines that are not JSON objects are
+    skipped.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if input_format == 'csv':
+        reader = csv.reader(text)
+        columns = next(reader, None)
+        if not columns:
+            raise ValueError("Candidate CSV is empty or has no header row")
+        return columns, reader
+
+    lines = (line for line in text if line.strip())
+    first = next(lines, None)
+    try:
+        record = json.loads(first) if first else None
+    except ValueError:
+        record = None
+    if not isinstance(record, dict):
+        raise ValueError("Candidate JSONL must start with a JSON object")
+    columns = list(record)
+
+    def rows():
+        yield ['' if record.get(column) is None else record[column] for column in columns]
+        for number, line in enumerate(lines, start=2):
+            try:
+                item = json.loads(line)
+            except ValueError:
+                item = None
+            if not isinstance(item, dict):
+                logger.warning(f"Skipping candidate line {number}: not a JSON object")
+                continue
+            yield ['' if item.get(column) is None else item[column] for column in columns]
+    return columns, rows()
+
+
+class MergeJob:
+    """Steps compiled and bound to one candidate upload, ready to render.
+
+    Constructing it validates the upload: MissingFieldsError if a placeholder
+    can't be filled from any column or default. Rendering then streams one
+    candidate at a time; candidates with blank values for a placeholder are
+    rendered with that slot empty and their blank fields listed, or left out
+    with skip_incomplete.
+    """
+
+    def __init__(self, steps: List[Dict[str, Any]], columns: List[str], rows: Iterator[List[Any]],
+                 defaults: Optional[Dict[str, Any]] = None, skip_incomplete: bool = False):
+        self.steps = sorted(steps, key=lambda step: step['order'])
+        self.columns = columns
+        self.rows = rows
+        self.defaults = defaults
+        self.skip_incomplete = skip_incomplete
+        # Title then content of each step, in step order
+        self.templates = {}
+        for step in self.steps:
+            self.templates[f"step {step['order']} title"] = compile_template(step['title'])
+            self.templates[f"step {step['order']} content"] = compile_template(step['content'])
+        self.binding = Binding(self.templates, columns, defaults)
+        self.rendered = 0
+        self.skipped = 0
+
+    def candidates(self, binding: Optional[Binding] = None) -> Iterator[Tuple[int, List[Any], List[str], List[str]]]:
+        """(row number, candidate row, rendered title/content per step, blank fields) per rendered candidate."""
+        render = (binding or self.binding).render
+        for number, row in enumerate(self.rows, start=1):
+            text, blank = render(row)
+            if blank and self.skip_incomplete:
+                self.skipped += 1
+                continue
+            self.rendered += 1
+            yield number, row, text, blank
+
+    def _jsonl_lines(self) -> Iterator[str]:
+        # Steps are rendered straight into JSON string contents, and the rest of
+        # the line is a format string built once
+        binding = Binding(self.templates, self.columns, self.defaults, escape=_json_escape)
+        steps = ', '.join(f'{{"order": {json.dumps(step["order"])}, "title": "%s", "content": "%s"}}'
+                          for step in self.steps)
+        line = '{"row": %d, "candidate": %s, "steps": [' + steps + '], "blankFields": %s}\n'
+        columns = self.columns
+        for number, row, text, blank in self.candidates(binding):
+            yield line % (number, json.dumps(dict(zip(columns, row)), ensure_ascii=False), *text,
+                          json.dumps(blank) if blank else '[]')
+
+    def _csv_lines(self) -> Iterator[str]:
+        # Same idea as JSONL: titles and contents are always quoted and rendered
+        # pre-escaped, so the csv module only handles the candidate's own columns
+        binding = Binding(self.templates, self.columns, self.defaults, escape=_csv_escape)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.columns + OUTPUT_CSV_COLUMNS)
+        yield buffer.getvalue()
+        line = ''.join(f'%s,{step["order"]},"%s","%s",%s\r\n' for step in self.steps)
+        width = len(self.columns)
+        for _, row, text, blank in self.candidates(binding):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerow((row + [''] * width)[:width] if len(row) != width else row)
+            candidate = buffer.getvalue()[:-2]
+            blank_fields = ' '.join(blank)
+            values = []
+            for i in range(0, len(text), 2):
+                values += (candidate, text[i], text[i + 1], blank_fields)
+            yield line % tuple(values)
+
+    def render(self, fmt: str = 'jsonl', chunk_chars: int = CHUNK_CHARS) -> Iterator[str]:
+        """Rendered emails as JSONL (one candidate per line) or CSV (one step per row), in ~chunk_chars chunks."""
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {fmt}")
+        start = time.perf_counter()
+        yield from iter_chunks(self._jsonl_lines() if fmt == 'jsonl' else self._csv_lines(), chunk_chars)
+        _merge_candidates_total.inc(self.rendered, {'outcome': 'rendered'})
+        _merge_candidates_total.inc(self.skipped, {'outcome': 'skipped'})
+        _merge_duration_seconds.observe(time.perf_counter() - start)
+
+
+class PersonalizationService:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Get or create a singleton instance of PersonalizationService."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def sequence_defaults(self, sequence: Sequence) -> Dict[str, str]:
+        """Values the sequence itself provides: [POSITION], [COMPANY_NAME], [RECRUITER_NAME]."""
+        defaults = {'POSITION': sequence.position}
+        user = User.query.get(sequence.user_id)
+        if user is not None:
+            if user.company:
+                defaults['COMPANY_NAME'] = user.company
+            if user.name:
+                defaults['RECRUITER_NAME'] = user.name
+        return defaults
+
+    def prepare(self, sequence_id: str, stream: IO[bytes], input_format: str = 'csv',
+                defaults: Optional[Dict[str, Any]] = None, skip_incomplete: bool = False) -> Optional[MergeJob]:
+        """Validated merge of a sequence's steps with an uploaded candidate list; None if there is no such sequence.
+
+        The steps are read (and compiled) here, so rendering needs no database
+        access. Raises ValueError for an unreadable upload and
+        MissingFieldsError for placeholders nothing fills; explicit defaults
+        override the sequence's own.
+        """
+        if input_format not in INPUT_FORMATS:
+            raise ValueError(f"Unsupported candidate format: {input_format}")
+        sequence = Sequence.query.get(sequence_id)
+        if sequence is None:
+            return None
+        steps = [{'order': step.order, 'title': step.title, 'content': step.content} for step in sequence.steps]
+        columns, rows = read_candidates(stream, input_format)
+        return MergeJob(steps, columns, rows, {**self.sequence_defaults(sequence), **(defaults or {})},
+                        skip_incomplete=skip_incomplete)
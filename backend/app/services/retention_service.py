@@ -0,0 +1,215 @@
+import time
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+
+from flask import current_app
+from sqlalchemy import select, insert, delete, text, and_, or_
+
+from ..database.db import db
+from ..models import ChatMessage, ChatMessageArchive
+
+# Columns copied from chat_messages into chat_messages_archive
+_ARCHIVE_COLUMNS = ['id', 'created_at', 'user_id', 'sequence_id', 'role', 'content']
+
+
+class ChatRetentionService:
+    """Moves old chat messages out of the hot chat_messages table.
+
+    Rows older than CHAT_RETENTION_DAYS are copied into chat_messages_archive and
+    deleted from chat_messages in bounded batches (one transaction per batch), so
+    the hot table and its indexes only ever hold recent turns.
+    """
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Get or create a singleton instance of ChatRetentionService."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._partitioned = None
+        self._known_partitions = set()
+
+    def _is_partitioned(self) -> bool:
+        """Whether chat_messages_archive is a native PostgreSQL partitioned table."""
+        if self._partitioned is None:
+            if db.engine.dialect.name != 'postgresql':
+                self._partitioned = False
+            else:
+                self._partitioned = bool(db.session.execute(text(
+                    "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+                    "WHERE c.relname = 'chat_messages_archive'"
+                )).scalar())
+        return self._partitioned
+
+    @staticmethod
+    def _month_start(value: datetime) -> datetime:
+        return datetime(value.year, value.month, 1)
+
+    @staticmethod
+    def _next_month(value: datetime) -> datetime:
+        return datetime(value.year + (value.month // 12), value.month % 12 + 1, 1)
+
+    def _ensure_partitions(self, oldest: datetime, newest: datetime) -> None:
+        """Create monthly archive partitions covering [oldest, newest]."""
+        month = self._month_start(oldest)
+        while month <= newest:
+            name = f"chat_messages_archive_{month:%Y_%m}"
+            if name not in self._known_partitions:
+                try:
+                    with db.engine.begin() as conn:
+                        conn.execute(text(
+                            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF chat_messages_archive "
+                            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{self._next_month(month):%Y-%m-%d}')"
+                        ))
+                    self._known_partitions.add(name)
+                except Exception as e:
+                    # e.g. the DEFAULT partition already holds rows for this month;
+                    # rows still land in DEFAULT, so archiving can continue
+                    current_app.logger.warning(f"Could not create archive partition {name}: {str(e)}")
+            month = self._next_month(month)
+
+    def archive_old_messages(self, older_than_days: Optional[int] = None, batch_size: Optional[int] = None,
+                             max_batches: Optional[int] = None, sleep_seconds: float = 0.0) -> Dict[str, Any]:
+        """Move chat messages older than the retention window into the archive."""
+        older_than_days = older_than_days if older_than_days is not None else current_app.config['CHAT_RETENTION_DAYS']
+        batch_size = batch_size or current_app.config['CHAT_RETENTION_BATCH_SIZE']
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+        archive_table = ChatMessageArchive.__table__
+        hot_table = ChatMessage.__table__
+        moved = 0
+        batches = 0
+        start = time.perf_counter()
+
+        while max_batches is None or batches < max_batches:
+            rows = db.session.execute(
+                select(hot_table.c.id, hot_table.c.created_at)
+                .where(hot_table.c.created_at < cutoff)
+                .order_by(hot_table.c.created_at)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            if self._is_partitioned():
+                self._ensure_partitions(rows[0].created_at, rows[-1].created_at)
+
+            ids = [row.id for row in rows]
+            try:
+                db.session.execute(
+                    insert(archive_table).from_select(
+                        _ARCHIVE_COLUMNS,
+                        select(*[hot_table.c[name] for name in _ARCHIVE_COLUMNS]).where(hot_table.c.id.in_(ids))
+                    )
+                )
+                db.session.execute(delete(hot_table).where(hot_table.c.id.in_(ids)))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+            moved += len(ids)
+            batches += 1
+            if sleep_seconds:
+                time.sleep(sleep_seconds)
+
+        duration = time.perf_counter() - start
+        current_app.logger.info(f"Archived {moved} chat messages older than {cutoff.isoformat()} "
+                                f"in {batches} batches ({duration:.2f}s)")
+        return {'archived': moved, 'batches': batches, 'cutoff': cutoff.isoformat(), 'seconds': round(duration, 3)}
+
+    def purge_archive(self, older_than_days: Optional[int] = None, batch_size: Optional[int] = None,
+                      sleep_seconds: float = 0.0) -> Dict[str, Any]:
+        """Permanently delete archived messages older than CHAT_ARCHIVE_PURGE_DAYS (0 keeps everything)."""
+        older_than_days = older_than_days if older_than_days is not None else current_app.config['CHAT_ARCHIVE_PURGE_DAYS']
+        if not older_than_days:
+            return {'purged': 0, 'dropped_partitions': []}
+        batch_size = batch_size or current_app.config['CHAT_RETENTION_BATCH_SIZE']
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+        # Whole monthly partitions entirely before the cutoff are dropped outright
+        dropped = []
+        if self._is_partitioned():
+            partitions = db.session.execute(text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = 'chat_messages_archive'"
+            )).scalars().all()
+            db.session.commit()
+            for name in partitions:
+                try:
+                    month = datetime.strptime(name[-7:], '%Y_%m')
+                except ValueError:
+                    continue  # DEFAULT partition
+                if self._next_month(month) <= cutoff:
+                    with db.engine.begin() as conn:
+                        conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                    self._known_partitions.discard(name)
+                    dropped.append(name)
+
+        # Anything left (DEFAULT partition, or a plain archive table) is deleted in batches
+        archive_table = ChatMessageArchive.__table__
+        purged = 0
+        while True:
+            ids = db.session.execute(
+                select(archive_table.c.id).where(archive_table.c.created_at < cutoff).limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+            db.session.execute(
+                delete(archive_table).where(archive_table.c.id.in_(ids), archive_table.c.created_at < cutoff)
+            )
+            db.session.commit()
+            purged += len(ids)
+            if sleep_seconds:
+                time.sleep(sleep_seconds)
+
+        current_app.logger.info(f"Purged {purged} archived messages and {len(dropped)} partitions "
+                                f"older than {cutoff.isoformat()}")
+        return {'purged': purged, 'dropped_partitions': dropped, 'cutoff': cutoff.isoformat()}
+
+    def get_full_history(self, user_id: str, limit: int = 50, before: Optional[datetime] = None,
+                         before_id: Optional[str] = None) -> Dict[str, Any]:
+        """Read a page of a user's history across the hot and archive tables.
+
+        Returns up to `limit` messages older than the (`before`, `before_id`)
+        cursor (newest page first, messages in chronological order) and the
+        cursor for the next older page. Messages are ordered by (created_at, id),
+        so ones sharing a timestamp are neither skipped nor repeated across pages;
+        without `before_id`, everything created before `before` is older.
+        """
+        query = ChatMessage.query.filter_by(user_id=user_id)
+        if before:
+            query = query.filter(self._older_than(ChatMessage, before, before_id))
+        messages: List[Any] = query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit).all()
+
+        # Only touch the archive when the hot table can't fill the page
+        if len(messages) < limit:
+            archive_query = ChatMessageArchive.query.filter_by(user_id=user_id)
+            if messages:
+                archive_query = archive_query.filter(
+                    self._older_than(ChatMessageArchive, messages[-1].created_at, messages[-1].id))
+            elif before:
+                archive_query = archive_query.filter(self._older_than(ChatMessageArchive, before, before_id))
+            messages.extend(
+                archive_query.order_by(ChatMessageArchive.created_at.desc(), ChatMessageArchive.id.desc())
+                .limit(limit - len(messages)).all()
+            )
+
+        messages.reverse()
+        more = len(messages) == limit
+        return {
+            'messages': [msg.to_dict() for msg in messages],
+            'nextBefore': messages[0].created_at.isoformat() if more else None,
+            'nextBeforeId': messages[0].id if more else None
+        }
+
+    @staticmethod
+    def _older_than(model, before: datetime, before_id: Optional[str]):
+        """Keyset condition: rows ordered before (before, before_id) by (created_at, id)."""
+        if before_id is None:
+            return model.created_at < before
+        return or_(model.created_at < before, and_(model.created_at == before, model.id < before_id))
@@ -0,0 +1,434 @@
+import re
+import html
+import time
+import threading
+from types import SimpleNamespace
+from typing import Callable, List, Dict, Any, Optional, Set
+
+from flask import current_app
+from sqlalchemy import text, bindparam
+
+from ..database.db import db
+from ..utils.metrics import registry
+
+SEARCH_DURATION = registry.histogram(
+    'helix_search_duration_seconds', 'Sequence search query latency',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+_index_errors_total = registry.counter('helix_search_index_errors_total',
+                                       'Failed search index updates by action (index, remove)')
+_reindex_pending = registry.gauge('helix_search_reindex_pending', 'Sequences queued to be indexed again')
+
+# Queries are reduced to at most this many word tokens
+MAX_QUERY_TERMS = 8
+
+# SQLite: bm25() column weights for (owner, title, position, additional_info, steps);
+# the owner token only filters, it never ranks
+SQLITE_BM25_WEIGHTS = (0.0, 10.0, 10.0, 4.0, 1.0)
+
+# Snippets are HTML: the step text escaped, with matches wrapped in these tags
+SNIPPET_START = '<mark>'
+SNIPPET_END = '</mark>'
+
+# The database marks matches with these private-use characters, which become the
+# tags only after the text around them has been escaped
+_MATCH_START = '\ue000'
+_MATCH_END = '\ue001'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# PostgreSQL: one row per sequence with a generated, weighted tsvector
+# (title/position A, additional info B, step content C) behind a GIN index.
+POSTGRES_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS sequence_search (
+        sequence_id VARCHAR(36) PRIMARY KEY,
+        user_id VARCHAR(36) NOT NULL,
+        title TEXT NOT NULL DEFAULT '',
+        position TEXT NOT NULL DEFAULT '',
+        additional_info TEXT NOT NULL DEFAULT '',
+        steps TEXT NOT NULL DEFAULT '',
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        document TSVECTOR GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', title), 'A') ||
+            setweight(to_tsvector('english', position), 'A') ||
+            setweight(to_tsvector('english', additional_info), 'B') ||
+            setweight(to_tsvector('english', steps), 'C')
+        ) STORED
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_sequence_search_document ON sequence_search USING GIN (document)",
+    "CREATE INDEX IF NOT EXISTS ix_sequence_search_user_id ON sequence_search (user_id)",
+]
+
+# Only created when the pg_trgm extension is available; used for typo-tolerant title matches
+POSTGRES_TRGM_DDL = ("CREATE INDEX IF NOT EXISTS ix_sequence_search_title_trgm "
+                     "ON sequence_search USING GIN (title gin_trgm_ops)")
+
+# SQLite: an FTS5 table keyed by the rowid of sequence_search_docs, which maps
+# rowids to sequence ids so updates and deletes are rowid lookups, not scans.
+# The owner column holds one token per user so the user filter is part of the
+# full-text query itself.
+SQLITE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS sequence_search_docs (
+        id INTEGER PRIMARY KEY,
+        sequence_id VARCHAR(36) NOT NULL UNIQUE,
+        user_id VARCHAR(36) NOT NULL
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS sequence_search_fts USING fts5(
+        owner, title, position, additional_info, steps,
+        tokenize = 'porter unicode61', prefix = '2 3 4'
+    )
+    """,
+]
+
+
+def owner_token(user_id: str) -> str:
+    """Single FTS token identifying a user (matches 'u' || lower(hex(user_id)) in SQL)."""
+    return 'u' + user_id.encode('utf-8').hex()
+
+
+def render_snippet(snippet: Optional[str]) -> str:
+    """A database snippet as HTML: its text escaped, matches in SNIPPET_START/SNIPPET_END."""
+    return html.escape(snippet or '').replace(_MATCH_START, SNIPPET_START).replace(_MATCH_END, SNIPPET_END)
+
+
+class SearchService:
+    """Full-text search over a user's sequences and their steps.
+
+    Each sequence is indexed as one document (title, position, additional
+    info and the concatenated step content). SequenceService calls
+    index_sequence()/remove_sequence() inside its own transaction, so the
+    index changes together with the rows it describes.
+
+    An index update that fails doesn't fail the write: it is logged, counted
+    in helix_search_index_errors_total and the sequence queued, to be brought
+    up to date with the next index update (or rebuild()).
+    """
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Get or create a singleton instance of SearchService."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._backend = None
+        self._engine_url = None
+        self._has_trgm = False
+        # Sequences whose index update failed, synced again with the next update
+        self._pending: Set[str] = set()
+        self._pending_lock = threading.Lock()
+
+    @staticmethod
+    def _terms(query: str) -> List[str]:
+        return [t.lower() for t in _TOKEN_RE.findall(query or '')][:MAX_QUERY_TERMS]
+
+    def ensure_index(self, populate: bool = False) -> str:
+        """Create the index tables if needed and return the backend in use.
+
+        With populate=True (used at startup, never inside a request
+        transaction) an empty index is rebuilt from existing sequences.
+        """
+        # Re-checked when the app is pointed at a different database (tests, benchmarks)
+        if self._backend is None or self._engine_url != str(db.engine.url):
+            self._engine_url = str(db.engine.url)
+            dialect = db.engine.dialect.name
+            statements = {'postgresql': POSTGRES_DDL, 'sqlite': SQLITE_DDL}.get(dialect)
+            backend = 'like'
+            if statements:
+                # Runs on the session's connection (in a savepoint when the caller
+                # has writes pending) so it cannot block on the caller's own locks
+                owns_transaction = not db.session().in_transaction()
+                try:
+                    with db.session.begin_nested():
+                        for statement in statements:
+                            db.session.execute(text(statement))
+                        if dialect == 'postgresql':
+                            self._has_trgm = bool(db.session.execute(text(
+                                "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+                            )).scalar())
+                            if self._has_trgm:
+                                db.session.execute(text(POSTGRES_TRGM_DDL))
+                    if owns_transaction:
+                        db.session.commit()
+                    backend = 'postgres' if dialect == 'postgresql' else 'fts5'
+                except Exception as e:
+                    current_app.logger.warning(f"Full-text index unavailable, falling back to LIKE search: {str(e)}")
+            self._backend = backend
+
+        if populate and self._backend != 'like' and self._needs_rebuild():
+            self.rebuild()
+        return self._backend
+
+    def _needs_rebuild(self) -> bool:
+        table = 'sequence_search' if self._backend == 'postgres' else 'sequence_search_docs'
+        empty = db.session.execute(text(f"SELECT 1 FROM {table} LIMIT 1")).scalar() is None
+        has_sequences = db.session.execute(text("SELECT 1 FROM sequences LIMIT 1")).scalar() is not None
+        return empty and has_sequences
+
+    def _load_document(self, sequence_id: str) -> Optional[Dict[str, str]]:
+        row = db.session.execute(
+            text("SELECT id, user_id, title, position, additional_info FROM sequences WHERE id = :id"),
+            {'id': sequence_id}
+        ).first()
+        if row is None:
+            return None
+        steps = db.session.execute(
+            text('SELECT content FROM sequence_steps WHERE sequence_id = :id ORDER BY "order"'),
+            {'id': sequence_id}
+        ).scalars().all()
+        return {
+            'sequence_id': row.id,
+            'user_id': row.user_id,
+            'title': row.title or '',
+            'position': row.position or '',
+            'additional_info': row.additional_info or '',
+            'steps': '\n\n'.join(steps)
+        }
+
+    def index_sequence(self, sequence_id: str) -> None:
+        """Add or refresh one sequence in the index from its current (flushed) rows.
+
+        Runs in a savepoint of the caller's transaction; a failure leaves the
+        caller's write intact and queues the sequence (see the class docstring).
+        """
+        self._update(sequence_id, 'index', self._upsert)
+
+    def remove_sequence(self, sequence_id: str) -> None:
+        """Drop a sequence from the index (inside the caller's transaction)."""
+        self._update(sequence_id, 'remove', self._delete)
+
+    def _update(self, sequence_id: str, action: str, operation: Callable[[str, str], None]) -> None:
+        backend = self.ensure_index()
+        if backend == 'like':
+            return
+        with self._pending_lock:
+            retry = self._pending - {sequence_id}
+            self._pending.clear()
+        for pending_id in retry:
+            self._run(backend, pending_id, 'index', self._sync)
+        self._run(backend, sequence_id, action, operation)
+        _reindex_pending.set(len(self._pending))
+
+    def _run(self, backend: str, sequence_id: str, action: str, operation: Callable[[str, str], None]) -> None:
+        try:
+            with db.session.begin_nested():
+                operation(backend, sequence_id)
+        except Exception as e:
+            current_app.logger.error(f"Error updating search index ({action}) for sequence {sequence_id}, "
+                                     f"queued to retry: {str(e)}")
+            _index_errors_total.inc(labels={'action': action})
+            with self._pending_lock:
+                self._pending.add(sequence_id)
+
+    def _sync(self, backend: str, sequence_id: str) -> None:
+        """Index the sequence as its rows are now, or drop it if it was deleted."""
+        if self._load_document(sequence_id) is None:
+            self._delete(backend, sequence_id)
+        else:
+            self._upsert(backend, sequence_id)
+
+    def _upsert(self, backend: str, sequence_id: str) -> None:
+        doc = self._load_document(sequence_id)
+        if doc is None:
+            return
+        if backend == 'postgres':
+            db.session.execute(text("""
+                INSERT INTO sequence_search (sequence_id, user_id, title, position, additional_info, steps, updated_at)
+                VALUES (:sequence_id, :user_id, :title, :position, :additional_info, :steps, CURRENT_TIMESTAMP)
+                ON CONFLICT (sequence_id) DO UPDATE SET
+                    user_id = EXCLUDED.user_id, title = EXCLUDED.title, position = EXCLUDED.position,
+                    additional_info = EXCLUDED.additional_info, steps = EXCLUDED.steps,
+                    updated_at = EXCLUDED.updated_at
+            """), doc)
+        else:
+            rowid = db.session.execute(
+                text("SELECT id FROM sequence_search_docs WHERE sequence_id = :sequence_id"), doc
+            ).scalar()
+            if rowid is None:
+                rowid = db.session.execute(
+                    text("INSERT INTO sequence_search_docs (sequence_id, user_id) "
+                         "VALUES (:sequence_id, :user_id) RETURNING id"), doc
+                ).scalar()
+            else:
+                db.session.execute(text("DELETE FROM sequence_search_fts WHERE rowid = :rowid"),
+                                   {'rowid': rowid})
+            db.session.execute(text(
+                "INSERT INTO sequence_search_fts (rowid, owner, title, position, additional_info, steps) "
+                "VALUES (:rowid, :owner, :title, :position, :additional_info, :steps)"
+            ), {**doc, 'rowid': rowid, 'owner': owner_token(doc['user_id'])})
+
+    def _delete(self, backend: str, sequence_id: str) -> None:
+        if backend == 'postgres':
+            db.session.execute(text("DELETE FROM sequence_search WHERE sequence_id = :id"), {'id': sequence_id})
+        else:
+            rowid = db.session.execute(
+                text("SELECT id FROM sequence_search_docs WHERE sequence_id = :id"), {'id': sequence_id}
+            ).scalar()
+            if rowid is not None:
+                db.session.execute(text("DELETE FROM sequence_search_fts WHERE rowid = :rowid"), {'rowid': rowid})
+                db.session.execute(text("DELETE FROM sequence_search_docs WHERE id = :rowid"), {'rowid': rowid})
+
+    def rebuild(self) -> int:
+        """Rebuild the whole index from the sequences and sequence_steps tables."""
+        backend = self.ensure_index()
+        start = time.perf_counter()
+        if backend == 'postgres':
+            db.session.execute(text("TRUNCATE sequence_search"))
+            db.session.execute(text("""
+                INSERT INTO sequence_search (sequence_id, user_id, title, position, additional_info, steps)
+                SELECT s.id, s.user_id, coalesce(s.title, ''), coalesce(s.position, ''),
+                       coalesce(s.additional_info, ''),
+                       coalesce(string_agg(st.content, E'\\n\\n' ORDER BY st."order"), '')
+                FROM sequences s LEFT JOIN sequence_steps st ON st.sequence_id = s.id
+                GROUP BY s.id
+            """))
+            count = db.session.execute(text("SELECT COUNT(*) FROM sequence_search")).scalar()
+        elif backend == 'fts5':
+            db.session.execute(text("DELETE FROM sequence_search_fts"))
+            db.session.execute(text("DELETE FROM sequence_search_docs"))
+            db.session.execute(text(
+                "INSERT INTO sequence_search_docs (sequence_id, user_id) SELECT id, user_id FROM sequences"
+            ))
+            db.session.execute(text("""
+                INSERT INTO sequence_search_fts (rowid, owner, title, position, additional_info, steps)
+                SELECT d.id, 'u' || lower(hex(s.user_id)), coalesce(s.title, ''), coalesce(s.position, ''),
+                       coalesce(s.additional_info, ''),
+                       coalesce((SELECT group_concat(content, char(10) || char(10)) FROM
+                                 (SELECT content FROM sequence_steps WHERE sequence_id = s.id ORDER BY "order")), '')
+                FROM sequence_search_docs d JOIN sequences s ON s.id = d.sequence_id
+            """))
+            db.session.execute(text("INSERT INTO sequence_search_fts (sequence_search_fts) VALUES ('optimize')"))
+            count = db.session.execute(text("SELECT COUNT(*) FROM sequence_search_docs")).scalar()
+        else:
+            return 0
+        db.session.commit()
+        with self._pending_lock:
+            self._pending.clear()
+        _reindex_pending.set(0)
+        current_app.logger.info(f"Rebuilt search index: {count} sequences in {time.perf_counter() - start:.2f}s")
+        return count
+
+    def search(self, user_id: str, query: str, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """Ranked search of a user's sequences; the last term is matched as a prefix.
+
+        Returns one page of results plus `hasMore`, computed by fetching one
+        extra row instead of counting every match.
+        """
+        terms = self._terms(query)
+        result = {'results': [], 'page': page, 'pageSize': page_size, 'hasMore': False}
+        if not terms:
+            return result
+
+        backend = self.ensure_index()
+        params = {'user_id': user_id, 'limit': page_size + 1, 'offset': (page - 1) * page_size}
+        start = time.perf_counter()
+
+        if backend == 'postgres':
+            rows = self._search_postgres(terms, query, params)
+        elif backend == 'fts5':
+            rows = self._search_fts5(terms, params)
+        else:
+            rows = self._search_like(terms, params)
+
+        SEARCH_DURATION.observe(time.perf_counter() - start, labels={'backend': backend})
+        result['hasMore'] = len(rows) > page_size
+        result['results'] = [{
+            'sequenceId': row.sequence_id,
+            'title': row.title,
+            'position': row.position,
+            'snippet': render_snippet(row.snippet),
+            'rank': round(float(row.rank), 6)
+        } for row in rows[:page_size]]
+        return result
+
+    def _search_postgres(self, terms: List[str], query: str, params: Dict[str, Any]):
+        # Terms are plain \w+ tokens, so they are safe to join into a tsquery
+        params = {**params, 'tsquery': ' & '.join(terms[:-1] + [f"{terms[-1]}:*"]),
+                  'raw': query.strip(), 'headline_opts': f"StartSel={_MATCH_START}, StopSel={_MATCH_END}, "
+                                                         f"MaxWords=20, MinWords=8, MaxFragments=1"}
+        # ts_headline is expensive, so it only runs for the rows on the page
+        rows = db.session.execute(text("""
+            SELECT p.sequence_id, p.title, p.position, p.rank,
+                   ts_headline('english', p.additional_info || ' ' || p.steps, p.q, :headline_opts) AS snippet
+            FROM (
+                SELECT ss.sequence_id, ss.title, ss.position, ss.additional_info, ss.steps, q,
+                       ts_rank_cd(ss.document, q) AS rank
+                FROM sequence_search ss, to_tsquery('english', :tsquery) q
+                WHERE ss.user_id = :user_id AND ss.document @@ q
+                ORDER BY rank DESC, ss.updated_at DESC
+                LIMIT :limit OFFSET :offset
+            ) p
+            ORDER BY p.rank DESC
+        """), params).all()
+
+        # Nothing matched lexically: fall back to trigram similarity on titles (typos)
+        if not rows and self._has_trgm and params['offset'] == 0:
+            rows = db.session.execute(text("""
+                SELECT sequence_id, title, position, similarity(title, :raw) AS rank,
+                       left(steps, 160) AS snippet
+                FROM sequence_search
+                WHERE user_id = :user_id AND title % :raw
+                ORDER BY rank DESC
+                LIMIT :limit
+            """), params).all()
+        return rows
+
+    def _search_fts5(self, terms: List[str], params: Dict[str, Any]):
+        # Every owner-filtered match is ranked with bm25() before paging. The last term
+        # is a prefix query whatever its length: up to 4 characters it reads the prefix
+        # index, longer ones a range of the term index
+        owner = f"owner:{owner_token(params['user_id'])}"
+        expression = ' AND '.join(f'"{term}"*' if i == len(terms) - 1 else f'"{term}"'
+                                  for i, term in enumerate(terms))
+        match = f"{owner} AND {expression}"
+        bm25 = f"bm25(sequence_search_fts, {', '.join(str(w) for w in SQLITE_BM25_WEIGHTS)})"
+        ranked = db.session.execute(text(f"""
+            SELECT rowid, -{bm25} AS rank FROM sequence_search_fts
+            WHERE sequence_search_fts MATCH :match
+            ORDER BY {bm25}, rowid DESC
+            LIMIT :limit OFFSET :offset
+        """), {**params, 'match': match}).all()
+        if not ranked:
+            return []
+
+        # Snippets only for the rows on the page
+        rows = db.session.execute(text(f"""
+            SELECT f.rowid AS rowid, d.sequence_id, f.title, f.position,
+                   snippet(sequence_search_fts, 4, :match_start, :match_end, '...', 16) AS snippet
+            FROM sequence_search_fts f JOIN sequence_search_docs d ON d.id = f.rowid
+            WHERE sequence_search_fts MATCH :match AND f.rowid IN :rowids
+        """).bindparams(bindparam('rowids', expanding=True)),
+            {'match': match, 'rowids': [row.rowid for row in ranked],
+             'match_start': _MATCH_START, 'match_end': _MATCH_END}).all()
+        by_rowid = {row.rowid: row for row in rows}
+        return [
+            SimpleNamespace(sequence_id=by_rowid[row.rowid].sequence_id, title=by_rowid[row.rowid].title,
+                            position=by_rowid[row.rowid].position, snippet=by_rowid[row.rowid].snippet,
+                            rank=row.rank)
+            for row in ranked if row.rowid in by_rowid
+        ]
+
+    def _search_like(self, terms: List[str], params: Dict[str, Any]):
+        # Unindexed fallback for databases without a supported full-text engine
+        conditions = []
+        for i, term in enumerate(terms):
+            params[f"term{i}"] = f"%{term}%"
+            conditions.append(
+                f"(lower(s.title) LIKE :term{i} OR lower(s.position) LIKE :term{i} "
+                f"OR lower(coalesce(s.additional_info, '')) LIKE :term{i} OR EXISTS "
+                f"(SELECT 1 FROM sequence_steps st WHERE st.sequence_id = s.id AND lower(st.content) LIKE :term{i}))"
+            )
+        return db.session.execute(text(f"""
+            SELECT s.id AS sequence_id, s.title, s.position, 0 AS rank, '' AS snippet
+            FROM sequences s
+            WHERE s.user_id = :user_id AND {' AND '.join(conditions)}
+            ORDER BY s.updated_at DESC
+            LIMIT :limit OFFSET :offset
+        """), params).all()
@@ -0,0 +1,430 @@
+"""
+Scheduled sending of sequence steps.
+
+Enrolling a candidate in a sequence schedules its first step. Send workers
+(run_send_worker.py) claim due sends in batches, deliver them through the
+configured transport (send_transports.py) and schedule each enrollment's
+next step once the current one is out. So scheduled_sends holds at most one
+pending row per active enrollment, and a tick costs the batch it claims
+however many sends are pending: the claim is an index range scan on
+(status, due_at) in due order.
+
+Claiming uses SELECT ... FOR UPDATE SKIP LOCKED on PostgreSQL, so workers
+never wait on each other's rows, then moves the claimed rows' due_at past a
+lease and tags them with a claim token. A worker that dies mid-batch loses
+its claim when the lease runs out; no sweeper is needed. Workers claim
+SEND_WINDOW_SECONDS ahead and hold those sends in a local heap, sending each
+on time between polls of the table.
+
+Delivery is at-least-once: a worker that crashes after a send but before
+its batch commits leaves it to be sent again once the lease expires.
+"""
+
+import re
+import time
+import json
+import heapq
+import uuid
+import logging
+from datetime import datetime, timedelta
+from email.utils import formataddr
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import selectinload
+
+from ..database.db import db
+from ..models import ScheduledSend, Sequence, SequenceEnrollment
+from ..utils.mail_merge import Binding, compile_template
+from ..utils.metrics import registry
+from .personalization_service import PersonalizationService
+from .send_transports import OutboundMessage, SendError, Transport, create_transport
+
+logger = logging.getLogger(__name__)
+
+_sends_total = registry.counter('helix_sends_total', 'Scheduled sends processed, by outcome')
+_sends_claimed_total = registry.counter('helix_sends_claimed_total', 'Scheduled sends claimed by workers')
+_send_lag_seconds = registry.histogram('helix_send_lag_seconds', 'Delay between a send being due and going out',
+                                       buckets=(1.0, 5.0, 15.0, 60.0, 300.0, 1800.0, 3600.0))
+_send_tick_seconds = registry.histogram('helix_send_tick_seconds', 'Wall time of one send worker tick',
+                                        buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0))
+
+# Rows per INSERT when enrolling
+_ENROLL_CHUNK = 500
+
+# Candidate keys that aren't merge fields
+_CONTACT_KEYS = ('email', 'name')
+
+# One address, no display name or header-breaking characters
+_EMAIL_PATTERN = re.compile(r'^[^@\s<>(),;:"\\]+@[^@\s<>(),;:"\\]+\.[^@\s<>(),;:"\\]+$')
+
+
+class SendScheduler:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Get or create a singleton instance of SendScheduler."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @staticmethod
+    def _templates(sequence: Sequence) -> Dict[str, Any]:
+        templates = {}
+        for step in sequence.steps:
+            templates[f"step {step.order} title"] = compile_template(step.title)
+            templates[f"step {step.order} content"] = compile_template(step.content)
+        return templates
+
+    @staticmethod
+    def _delay(delays: List[float], position: int) -> timedelta:
+        """Wait before the step at this position: the enrollment's own, else none for the first step."""
+        if position < len(delays):
+            return timedelta(hours=delays[position])
+        return timedelta(hours=current_app.config['SEND_STEP_INTERVAL_HOURS'] if position else 0)
+
+    def enroll(self, sequence: Sequence, candidates: List[Dict[str, Any]], start_at: Optional[datetime] = None,
+               delays: Optional[List[float]] = None) -> Dict[str, Any]:
+        """Enroll candidates ({'email', 'name', ...merge fields}) and schedule their first step.
+
+        Candidates already active in the sequence (by email) are skipped.
+        Raises ValueError for a candidate without a valid email or with a
+        multi-line name (neither can go in an email header), and
+        MissingFieldsError if a step has a placeholder a candidate's fields
+        and the sequence's defaults can't fill.
+        """
+        if not sequence.steps:
+            raise ValueError("Sequence has no steps to send")
+        templates = self._templates(sequence)
+        defaults = PersonalizationService.get_instance().sequence_defaults(sequence)
+        validated = set()
+        unique: Dict[str, Dict[str, Any]] = {}
+        for number, candidate in enumerate(candidates, start=1):
+            if not isinstance(candidate, dict) or not str(candidate.get('email') or '').strip():
+                raise ValueError(f"Candidate {number} has no email")
+            if not _EMAIL_PATTERN.match(str(candidate['email']).strip()):
+                raise ValueError(f"Candidate {number} has an invalid email")
+            name = str(candidate.get('name') or '')
+            if '\r' in name or '\n' in name:
+                raise ValueError(f"Candidate {number} has a multi-line name")
+            # Candidates with the same keys share a validation
+            keys = tuple(sorted(candidate))
+            if keys not in validated:
+                Binding(templates, [*_CONTACT_KEYS, *keys], defaults)
+                validated.add(keys)
+            unique.setdefault(str(candidate['email']).strip().lower(), candidate)
+
+        now = datetime.utcnow()
+        first_due = (start_at or now) + self._delay(delays or [], 0)
+        first_order = sequence.steps[0].order
+        enrollments = SequenceEnrollment.__table__
+        sends = ScheduledSend.__table__
+        emails = list(unique)
+        enrolled = 0
+        try:
+            for i in range(0, len(emails), _ENROLL_CHUNK):
+                chunk = emails[i:i + _ENROLL_CHUNK]
+                active = set(db.session.execute(
+                    select(func.lower(enrollments.c.email)).where(
+                        enrollments.c.sequence_id == sequence.id, enrollments.c.status == 'active',
+                        func.lower(enrollments.c.email).in_(chunk))).scalars())
+                enrollment_rows, send_rows = [], []
+                for email in chunk:
+                    if email in active:
+                        continue
+                    candidate = unique[email]
+                    enrollment_id = str(uuid.uuid4())
+                    enrollment_rows.append({
+                        'id': enrollment_id, 'sequence_id': sequence.id, 'user_id': sequence.user_id,
+                        'email': str(candidate['email']).strip(), 'name': candidate.get('name'),
+                        'fields': json.dumps({k: v for k, v in candidate.items() if k not in _CONTACT_KEYS}),
+                        'delays': json.dumps(delays) if delays else None, 'status': 'active', 'steps_sent': 0,
+                        'created_at': now, 'updated_at': now
+                    })
+                    send_rows.append({'id': str(uuid.uuid4()), 'enrollment_id': enrollment_id,
+                                      'step_order': first_order, 'status': 'pending', 'scheduled_at': first_due,
+                                      'due_at': first_due, 'attempts': 0})
+                if enrollment_rows:
+                    db.session.execute(insert(enrollments), enrollment_rows)
+                    db.session.execute(insert(sends), send_rows)
+                    enrolled += len(enrollment_rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return {'enrolled': enrolled, 'skipped': len(candidates) - enrolled, 'firstSendAt': first_due.isoformat()}
+
+    def stop(self, enrollment_id: str) -> Optional[SequenceEnrollment]:
+        """Stop an enrollment and cancel its pending send; None if there is no such enrollment."""
+        enrollment = db.session.get(SequenceEnrollment, enrollment_id)
+        if enrollment is None:
+            return None
+        if enrollment.status == 'active':
+            enrollment.status = 'stopped'
+            enrollment.finished_at = datetime.utcnow()
+            db.session.execute(update(ScheduledSend.__table__).where(
+                ScheduledSend.enrollment_id == enrollment_id, ScheduledSend.status == 'pending'
+            ).values(status='cancelled', claim_token=None))
+            db.session.commit()
+        return enrollment
+
+    def enrollments(self, sequence_id: str, status: Optional[str] = None, page: int = 1,
+                    page_size: int = 50) -> Dict[str, Any]:
+        """A page of a sequence's enrollments (newest first), with counts by status."""
+        counts = dict(db.session.execute(
+            select(SequenceEnrollment.status, func.count()).where(SequenceEnrollment.sequence_id == sequence_id)
+            .group_by(SequenceEnrollment.status)).all())
+        query = SequenceEnrollment.query.filter_by(sequence_id=sequence_id)
+        if status:
+            query = query.filter_by(status=status)
+        items = (query.order_by(SequenceEnrollment.created_at.desc(), SequenceEnrollment.id)
+                 .offset((page - 1) * page_size).limit(page_size).all())
+        return {'counts': counts, 'page': page, 'pageSize': page_size,
+                'items': [enrollment.to_dict() for enrollment in items]}
+
+    def claim(self, limit: int, window_seconds: float, lease_seconds: float,
+              now: Optional[datetime] = None) -> Tuple[str, List[Tuple[datetime, str]]]:
+        """Claim up to `limit` sends due within the window: (claim token, [(due_at, send id)] in due order)."""
+        now = now or datetime.utcnow()
+        horizon = now + timedelta(seconds=window_seconds)
+        table = ScheduledSend.__table__
+        token = str(uuid.uuid4())
+        try:
+            rows = db.session.execute(
+                select(table.c.id, table.c.due_at)
+                .where(table.c.status == 'pending', table.c.due_at <= horizon)
+                .order_by(table.c.due_at)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not rows:
+                db.session.rollback()
+                return token, []
+            ids = [row.id for row in rows]
+            result = db.session.execute(
+                update(table)
+                .where(table.c.id.in_(ids), table.c.status == 'pending', table.c.due_at <= horizon)
+                .values(due_at=horizon + timedelta(seconds=lease_seconds), claim_token=token)
+            )
+            if result.rowcount != len(ids):
+                # Without row locks (SQLite) another worker can claim some of them in between
+                ours = set(db.session.execute(
+                    select(table.c.id).where(table.c.id.in_(ids), table.c.claim_token == token)).scalars())
+                rows = [row for row in rows if row.id in ours]
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        _sends_claimed_total.inc(len(rows))
+        return token, [(row.due_at, row.id) for row in rows]
+
+    def _message(self, send: ScheduledSend, enrollment: SequenceEnrollment, sequence: Sequence,
+                 defaults: Dict[str, Any]) -> OutboundMessage:
+        step = next(step for step in sequence.steps if step.order == send.step_order)
+        fields = enrollment.get_fields()
+        columns = [*_CONTACT_KEYS, *fields]
+        row = [enrollment.email, enrollment.name or '', *('' if v is None else str(v) for v in fields.values())]
+        binding = Binding({'title': compile_template(step.title), 'content': compile_template(step.content)},
+                          columns, defaults)
+        (subject, body), _ = binding.render(row)
+        # A subject is one header line, whatever the step title or merge fields hold
+        subject = ' '.join(subject.split())
+        return OutboundMessage(
+            message_id=send.id,
+            sender=formataddr((defaults.get('RECRUITER_NAME') or '', current_app.config['SEND_FROM_ADDRESS'])),
+            recipient=formataddr((enrollment.name or '', enrollment.email)),
+            subject=subject,
+            body=body,
+            headers={'X-Helix-Sequence': sequence.id, 'X-Helix-Enrollment': enrollment.id,
+                     'X-Helix-Step': str(send.step_order)}
+        )
+
+    def _finish(self, enrollment: SequenceEnrollment, status: str, now: datetime) -> None:
+        enrollment.status = status
+        enrollment.finished_at = now
+
+    def _schedule_next(self, send: ScheduledSend, enrollment: SequenceEnrollment, sequence: Sequence,
+                       now: datetime) -> None:
+        orders = [step.order for step in sequence.steps]
+        later = [order for order in orders if order > send.step_order]
+        if not later:
+            self._finish(enrollment, 'completed', now)
+            return
+        due = now + self._delay(enrollment.get_delays(), orders.index(later[0]))
+        db.session.add(ScheduledSend(id=str(uuid.uuid4()), enrollment_id=enrollment.id, step_order=later[0],
+                                     status='pending', scheduled_at=due, due_at=due, attempts=0))
+
+    def _failed(self, send: ScheduledSend, enrollment: SequenceEnrollment, error: str, permanent: bool,
+                now: datetime) -> str:
+        config = current_app.config
+        send.attempts = (send.attempts or 0) + 1
+        send.last_error = error[:1000]
+        send.claim_token = None
+        if permanent or send.attempts >= config['SEND_MAX_ATTEMPTS']:
+            send.status = 'failed'
+            self._finish(enrollment, 'failed', now)
+            logger.warning(f"Send {send.id} to enrollment {enrollment.id} failed: {error}")
+            return 'failed'
+        send.due_at = now + timedelta(seconds=config['SEND_RETRY_SECONDS'] * 2 ** (send.attempts - 1))
+        return 'retry'
+
+    def dispatch(self, token: str, send_ids: List[str], transport: Transport) -> Dict[str, int]:
+        """Deliver claimed sends still held by this claim, in one transaction; counts by outcome.
+
+        Each send's outcome is recorded in its own savepoint, and an error
+        sending one (whatever it raises) fails only that send.
+        """
+        # Looked up by primary key alone: with a long IN list, SQLite's planner otherwise
+        # prefers the (status, due_at) index and scans every pending send
+        sends = [send for send in ScheduledSend.query.filter(ScheduledSend.id.in_(send_ids))
+                 if send.claim_token == token and send.status == 'pending']
+        if not sends:
+            return {}
+        enrollments = {enrollment.id: enrollment for enrollment in SequenceEnrollment.query.filter(
+            SequenceEnrollment.id.in_({send.enrollment_id for send in sends}))}
+        sequences = {sequence.id: sequence for sequence in Sequence.query.options(selectinload(Sequence.steps))
+                     .filter(Sequence.id.in_({e.sequence_id for e in enrollments.values()}))}
+        position = {send_id: i for i, send_id in enumerate(send_ids)}
+        defaults: Dict[str, Dict[str, Any]] = {}
+        outcomes: Dict[str, int] = {}
+        connection = db.session.connection()
+        if connection.dialect.name == 'sqlite' and not connection.connection.dbapi_connection.in_transaction:
+            # pysqlite opens its transaction at the first write, so each savepoint below would be a
+            # transaction of its own, committed (and synced to disk) on release; open it now
+            connection.exec_driver_sql('BEGIN')
+        for send in sorted(sends, key=lambda send: position[send.id]):
+            enrollment = enrollments.get(send.enrollment_id)
+            sequence = sequences.get(enrollment.sequence_id) if enrollment else None
+            try:
+                # A savepoint per send: if recording one send's outcome fails, the batch's others still commit
+                with db.session.begin_nested():
+                    outcome = self._dispatch_one(send, enrollment, sequence, transport, defaults)
+            except Exception as e:
+                # Left claimed, so it comes back (and may go out again) once the lease runs out
+                logger.error(f"Recording send {send.id} failed: {str(e)}")
+                outcome = 'error'
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        for outcome, count in outcomes.items():
+            _sends_total.inc(count, {'outcome': outcome})
+        return outcomes
+
+    def _dispatch_one(self, send: ScheduledSend, enrollment: Optional[SequenceEnrollment],
+                      sequence: Optional[Sequence], transport: Transport, defaults: Dict[str, Dict[str, Any]]) -> str:
+        now = datetime.utcnow()
+        if enrollment is None or enrollment.status != 'active' or sequence is None:
+            send.status = 'cancelled'
+            if enrollment is not None and enrollment.status == 'active':
+                self._finish(enrollment, 'stopped', now)  # The sequence was deleted
+            return 'cancelled'
+        if all(step.order != send.step_order for step in sequence.steps):
+            # The sequence was shortened since this step was scheduled
+            send.status = 'cancelled'
+            self._finish(enrollment, 'completed', now)
+            return 'cancelled'
+        try:
+            if sequence.id not in defaults:
+                defaults[sequence.id] = PersonalizationService.get_instance().sequence_defaults(sequence)
+            transport.send(self._message(send, enrollment, sequence, defaults[sequence.id]))
+        except SendError as e:
+            return self._failed(send, enrollment, str(e), e.permanent, now)
+        except ValueError as e:
+            # A placeholder without a value, or a message that can't be built (e.g. a bad header);
+            # sending it again won't help
+            return self._failed(send, enrollment, str(e), True, now)
+        except Exception as e:
+            # Anything else is this send's problem alone: retry it later
+            logger.exception(f"Send {send.id} raised")
+            return self._failed(send, enrollment, f"{type(e).__name__}: {str(e)}", False, now)
+        send.status = 'sent'
+        send.sent_at = now
+        send.claim_token = None
+        enrollment.steps_sent = (enrollment.steps_sent or 0) + 1
+        _send_lag_seconds.observe(max(0.0, (now - send.scheduled_at).total_seconds()))
+        self._schedule_next(send, enrollment, sequence, now)
+        return 'sent'
+
+
+class SendWorker:
+    """Claims due sends a window ahead into a local heap and sends each when it is due.
+
+    Several workers can run against the same database. Must be used inside
+    an app context; run() loops until stop() (or max_ticks).
+    """
+
+    def __init__(self, transport: Optional[Transport] = None, batch_size: Optional[int] = None,
+                 window_seconds: Optional[float] = None, poll_seconds: Optional[float] = None,
+                 lease_seconds: Optional[float] = None):
+        config = current_app.config
+        self.transport = transport or create_transport(config, current_app.instance_path)
+        self.batch_size = batch_size or config['SEND_BATCH_SIZE']
+        self.window_seconds = window_seconds if window_seconds is not None else config['SEND_WINDOW_SECONDS']
+        self.poll_seconds = poll_seconds if poll_seconds is not None else config['SEND_POLL_SECONDS']
+        self.lease_seconds = lease_seconds or config['SEND_LEASE_SECONDS']
+        if self.lease_seconds <= self.window_seconds + self.poll_seconds:
+            raise ValueError("SEND_LEASE_SECONDS must be longer than the claim window plus the poll interval")
+        self._heap: List[Tuple[datetime, str, str]] = []  # (due_at, send id, claim token)
+        self._next_poll = datetime.min
+        self._stopped = False
+        self.totals: Dict[str, int] = {}
+
+    def tick(self) -> Dict[str, int]:
+        """Claim ahead if the heap is running low, then send everything due; counts by outcome."""
+        start = time.perf_counter()
+        scheduler = SendScheduler.get_instance()
+        now = datetime.utcnow()
+        if len(self._heap) < self.batch_size and now >= self._next_poll:
+            limit = self.batch_size - len(self._heap)
+            token, claimed = scheduler.claim(limit, self.window_seconds, self.lease_seconds, now)
+            for due_at, send_id in claimed:
+                heapq.heappush(self._heap, (due_at, send_id, token))
+            # A full batch means more is due: claim again on the next tick
+            self._next_poll = now if len(claimed) == limit else now + timedelta(seconds=self.poll_seconds)
+
+        due: Dict[str, List[str]] = {}
+        for _ in range(self.batch_size):
+            if not self._heap or self._heap[0][0] > now:
+                break
+            _, send_id, token = heapq.heappop(self._heap)
+            due.setdefault(token, []).append(send_id)
+        outcomes: Dict[str, int] = {}
+        for token, send_ids in due.items():
+            for outcome, count in scheduler.dispatch(token, send_ids, self.transport).items():
+                outcomes[outcome] = outcomes.get(outcome, 0) + count
+                self.totals[outcome] = self.totals.get(outcome, 0) + count
+        _send_tick_seconds.observe(time.perf_counter() - start)
+        return outcomes
+
+    def _sleep_seconds(self) -> float:
+        now = datetime.utcnow()
+        wake = self._next_poll if len(self._heap) < self.batch_size else datetime.max
+        if self._heap:
+            wake = min(wake, self._heap[0][0])
+        return max(0.0, min((wake - now).total_seconds(), self.poll_seconds))
+
+    def stop(self) -> None:
+        self._stopped = True
+
+    def run(self, max_ticks: Optional[int] = None) -> Dict[str, int]:
+        ticks = 0
+        try:
+            while not self._stopped and (max_ticks is None or ticks < max_ticks):
+                try:
+                    self.tick()
+                except Exception as e:
+                    # e.g. the database is briefly unavailable; claimed sends come back after their lease
+                    logger.error(f"Send worker tick failed: {str(e)}")
+                    db.session.rollback()
+                    self._heap.clear()
+                    time.sleep(self.poll_seconds)
+                ticks += 1
+                time.sleep(self._sleep_seconds())
+        finally:
+            self.transport.close()
+        return self.totals
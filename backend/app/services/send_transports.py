@@ -0,0 +1,138 @@
+"""
+Transports the send scheduler delivers sequence emails through.
+
+SEND_TRANSPORT picks one: 'file' (default) writes each email as an .eml file
+under SEND_FILE_DIR, a stand-in for development and load tests; 'smtp'
+delivers through SMTP_HOST. Anything else is a 'module:Class' path to a
+Transport subclass, constructed with the app config.
+
+A transport raises SendError for a failed delivery, with permanent=True when
+retrying can't help (e.g. the recipient was rejected). Messages carry a
+Message-ID derived from the send's id, so a retried send is recognisable
+downstream (and the file transport simply overwrites it).
+"""
+
+import os
+import smtplib
+import importlib
+import threading
+from dataclasses import dataclass, field
+from email.message import EmailMessage
+from typing import Any, Dict, Mapping, Optional
+
+
+class SendError(Exception):
+    def __init__(self, message: str, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+@dataclass
+class OutboundMessage:
+    message_id: str
+    sender: str
+    recipient: str
+    subject: str
+    body: str
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    def to_email(self) -> EmailMessage:
+        email = EmailMessage()
+        email['Message-ID'] = f"<{self.message_id}@helix.local>"
+        email['From'] = self.sender
+        email['To'] = self.recipient
+        email['Subject'] = self.subject
+        for name, value in self.headers.items():
+            email[name] = value
+        email.set_content(self.body)
+        return email
+
+
+class Transport:
+    """Delivers one message; called from a single worker thread at a time."""
+
+    def send(self, message: OutboundMessage) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class FileTransport(Transport):
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, message: OutboundMessage) -> None:
+        path = os.path.join(self.directory, f"{message.message_id}.eml")
+        try:
+            with open(path + '.tmp', 'wb') as out:
+                out.write(bytes(message.to_email()))
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            raise SendError(f"Could not write {path}: {str(e)}")
+
+
+class SMTPTransport(Transport):
+    """One SMTP connection per worker, reopened after errors."""
+
+    def __init__(self, host: str, port: int = 587, username: Optional[str] = None,
+                 password: Optional[str] = None, use_tls: bool = True, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> smtplib.SMTP:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.use_tls:
+                connection.starttls()
+            if self.username:
+                connection.login(self.username, self.password or '')
+            self._local.connection = connection
+        return connection
+
+    def send(self, message: OutboundMessage) -> None:
+        try:
+            self._connection().send_message(message.to_email())
+        except smtplib.SMTPRecipientsRefused as e:
+            raise SendError(f"Recipient refused: {e.recipients}", permanent=True)
+        except smtplib.SMTPResponseException as e:
+            # 5xx replies won't succeed on a retry
+            self.close()
+            raise SendError(f"SMTP error {e.smtp_code}: {e.smtp_error!r}", permanent=500 <= e.smtp_code < 600)
+        except (smtplib.SMTPException, OSError) as e:
+            self.close()
+            raise SendError(f"SMTP delivery failed: {str(e)}")
+
+    def close(self) -> None:
+        connection = getattr(self._local, 'connection', None)
+        self._local.connection = None
+        if connection is not None:
+            try:
+                connection.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+
+
+def create_transport(config: Mapping[str, Any], instance_path: str) -> Transport:
+    name = config.get('SEND_TRANSPORT') or 'file'
+    if name == 'file':
+        return FileTransport(config.get('SEND_FILE_DIR') or os.path.join(instance_path, 'outbox'))
+    if name == 'smtp':
+        if not config.get('SMTP_HOST'):
+            raise ValueError("SEND_TRANSPORT=smtp requires SMTP_HOST")
+        return SMTPTransport(config['SMTP_HOST'], config.get('SMTP_PORT', 587), config.get('SMTP_USERNAME'),
+                             config.get('SMTP_PASSWORD'), config.get('SMTP_USE_TLS', True))
+    module_name, _, class_name = name.partition(':')
+    if not class_name:
+        raise ValueError(f"Unknown SEND_TRANSPORT {name!r}: use file, smtp or module:Class")
+    transport_class = getattr(importlib.import_module(module_name), class_name)
+    if not issubclass(transport_class, Transport):
+        raise ValueError(f"SEND_TRANSPORT {name!r} is not a Transport")
+    return transport_class(config)
@@ -0,0 +1,191 @@
+"""
+Read-through cache of sequence documents for GET /api/sequences/<id>.
+
+Entries hold the encoded sequence (Sequence.to_json()) and its ETag, a hash
+of those bytes, so a hit is served, or answered 304 Not Modified, without
+touching the database. SequenceService invalidates a sequence after every
+write to it (creation, each streamed step, update, refine, delete); entries
+are otherwise trusted until SEQUENCE_CACHE_TTL_SECONDS (0: no expiry), which
+bounds staleness from writes this process doesn't see (another worker, raw
+SQL).
+
+A read that started before an invalidation doesn't store what it loaded:
+backends keep a generation per sequence, bumped by invalidate(), and set()
+is skipped when it changed during the load. Misses that will be stored
+are loaded from the primary, also in @replica_reads views: a lagging replica
+could still return the version just invalidated, and the cache would keep
+serving it.
+
+SEQUENCE_CACHE_BACKEND picks where entries live: 'memory' (default) is an
+LRU of SEQUENCE_CACHE_MAX_ENTRIES per process, 'none' disables caching, and
+anything else is a 'module:Class' path to a SequenceCacheBackend subclass
+(e.g. one shared between workers), constructed with the app config.
+"""
+
+import time
+import hashlib
+import importlib
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional
+
+from flask import current_app
+
+from ..database.replicas import primary_reads
+from ..models import Sequence
+from ..utils.metrics import registry
+from ..utils.serialization import RawJSON
+
+_cache_total = registry.counter('helix_sequence_cache_total', 'Sequence document lookups by result (hit, miss)')
+
+
+@dataclass
+class CachedSequence:
+    payload: RawJSON
+    etag: str
+    stored_at: float
+
+
+class SequenceCacheBackend:
+    """Stores CachedSequence entries; called from many request threads at once."""
+
+    def get(self, sequence_id: str) -> Optional[CachedSequence]:
+        raise NotImplementedError
+
+    def generation(self, sequence_id: str) -> Hashable:
+        raise NotImplementedError
+
+    def set(self, sequence_id: str, entry: CachedSequence, generation: Hashable) -> None:
+        """Store entry unless sequence_id was invalidated since generation() returned generation."""
+        raise NotImplementedError
+
+    def invalidate(self, sequence_id: str) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def summary(self) -> Dict[str, Any]:
+        return {}
+
+
+class MemoryBackend(SequenceCacheBackend):
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, CachedSequence]' = OrderedDict()
+        # Generations of recently invalidated ids; forgetting them bumps the epoch instead
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def get(self, sequence_id: str) -> Optional[CachedSequence]:
+        with self._lock:
+            entry = self._entries.get(sequence_id)
+            if entry is not None:
+                self._entries.move_to_end(sequence_id)
+            return entry
+
+    def generation(self, sequence_id: str) -> Hashable:
+        with self._lock:
+            return self._epoch, self._generations.get(sequence_id, 0)
+
+    def set(self, sequence_id: str, entry: CachedSequence, generation: Hashable) -> None:
+        with self._lock:
+            if generation != (self._epoch, self._generations.get(sequence_id, 0)):
+                return
+            self._entries[sequence_id] = entry
+            self._entries.move_to_end(sequence_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, sequence_id: str) -> None:
+        with self._lock:
+            self._entries.pop(sequence_id, None)
+            if len(self._generations) >= self.max_entries:
+                self._generations.clear()
+                self._epoch += 1
+            self._generations[sequence_id] = self._generations.get(sequence_id, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._epoch += 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {'entries': len(self._entries), 'maxEntries': self.max_entries}
+
+
+class NullBackend(SequenceCacheBackend):
+    def get(self, sequence_id: str) -> Optional[CachedSequence]:
+        return None
+
+    def generation(self, sequence_id: str) -> Hashable:
+        return None
+
+    def set(self, sequence_id: str, entry: CachedSequence, generation: Hashable) -> None:
+        pass
+
+    def invalidate(self, sequence_id: str) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+
+def create_backend(config: Mapping[str, Any]) -> SequenceCacheBackend:
+    name = config.get('SEQUENCE_CACHE_BACKEND') or 'memory'
+    if name == 'memory':
+        return MemoryBackend(config.get('SEQUENCE_CACHE_MAX_ENTRIES', 10000))
+    if name == 'none':
+        return NullBackend()
+    module_name, _, class_name = name.partition(':')
+    if not class_name:
+        raise ValueError(f"Unknown SEQUENCE_CACHE_BACKEND {name!r}: use memory, none or module:Class")
+    backend_class = getattr(importlib.import_module(module_name), class_name)
+    if not issubclass(backend_class, SequenceCacheBackend):
+        raise ValueError(f"SEQUENCE_CACHE_BACKEND {name!r} is not a SequenceCacheBackend")
+    return backend_class(config)
+
+
+class SequenceCache:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Get or create a singleton instance of SequenceCache (backend from the app config)."""
+        if cls._instance is None:
+            cls._instance = cls(create_backend(current_app.config), current_app.config['SEQUENCE_CACHE_TTL_SECONDS'])
+        return cls._instance
+
+    def __init__(self, backend: SequenceCacheBackend, ttl_seconds: float = 0):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+
+    def fetch(self, sequence_id: str, load: Callable[[], Optional[Sequence]]) -> Optional[CachedSequence]:
+        """The cached document, or load() it from the database and cache it; None if there is no such sequence."""
+        entry = self.backend.get(sequence_id)
+        if entry is not None and (not self.ttl_seconds or time.time() - entry.stored_at < self.ttl_seconds):
+            _cache_total.inc(labels={'result': 'hit'})
+            return entry
+        _cache_total.inc(labels={'result': 'miss'})
+        generation = self.backend.generation(sequence_id)
+        # Steps are loaded by to_json(), so it runs on the primary too; nothing kept, nothing to protect
+        with nullcontext() if isinstance(self.backend, NullBackend) else primary_reads():
+            sequence = load()
+            if sequence is None:
+                return None
+            payload = sequence.to_json()
+        entry = CachedSequence(payload, hashlib.blake2b(payload.data, digest_size=12).hexdigest(), time.time())
+        self.backend.set(sequence_id, entry, generation)
+        return entry
+
+    def invalidate(self, sequence_id: str) -> None:
+        self.backend.invalidate(sequence_id)
+
+    def summary(self) -> Dict[str, Any]:
+        return {**self.backend.summary(), 'ttlSeconds': self.ttl_seconds,
+                'hits': int(_cache_total.get({'result': 'hit'})),
+                'misses': int(_cache_total.get({'result': 'miss'}))}
@@ -0,0 +1,120 @@
+import re
+from typing import Dict, Any, List, Optional
+
+from flask import current_app
+
+from ..database.db import db
+from ..models import Sequence
+from ..utils.metrics import registry
+from ..utils.minhash import MinHasher, MinHashLSH, normalize, shingles
+
+_reuse_lookups_total = registry.counter('helix_sequence_reuse_lookups_total',
+                                        'Near-duplicate sequence lookups by outcome (hit, miss)')
+_llm_calls_avoided_total = registry.counter('helix_llm_calls_avoided_total',
+                                            'LLM calls skipped because a local result was used, by reason')
+
+NUM_PERM = 128
+
+
+class SequenceReuseService:
+    """Finds an existing sequence that is a near-duplicate of a generation request.
+
+    Each sequence is fingerprinted from its position, additional info and the
+    owner's company as a MinHash signature of character shingles, and kept in
+    an in-process LSH index partitioned by user. A user's sequences are loaded
+    the first time that user generates a sequence; later creates and deletes
+    update the index incrementally.
+
+    Long additional info can outweigh the position in the fingerprint, so a
+    match also needs positions sharing the same words (Backend Engineer is no
+    match for Frontend Engineer, however alike the rest of the request).
+    """
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Get or create a singleton instance of SequenceReuseService."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self):
+        self._hasher = MinHasher(num_perm=NUM_PERM)
+        self._index = None
+        self._loaded_users = set()
+
+    def _get_index(self) -> MinHashLSH:
+        if self._index is None:
+            self._index = MinHashLSH(threshold=current_app.config['SEQUENCE_REUSE_THRESHOLD'], num_perm=NUM_PERM)
+        return self._index
+
+    def fingerprint(self, position: str, additional_info: Optional[str], company: Optional[str]):
+        # Field prefixes keep shingles from different fields from matching each other
+        features = (shingles(position, prefix='p:') | shingles(additional_info, prefix='i:')
+                    | shingles(company, prefix='c:'))
+        return self._hasher.signature(features)
+
+    @staticmethod
+    def position_similarity(a: Optional[str], b: Optional[str]) -> float:
+        """Jaccard similarity of the positions' word sets."""
+        words_a, words_b = set(normalize(a).split()), set(normalize(b).split())
+        if not words_a or not words_b:
+            return 0.0
+        return len(words_a & words_b) / len(words_a | words_b)
+
+    def _ensure_user_loaded(self, user_id: str, company: Optional[str]) -> None:
+        if user_id in self._loaded_users:
+            return
+        index = self._get_index()
+        rows = db.session.query(Sequence.id, Sequence.position, Sequence.additional_info).filter(
+            Sequence.user_id == user_id
+        ).all()
+        for row in rows:
+            index.insert(row.id, self.fingerprint(row.position, row.additional_info, company), namespace=user_id)
+        self._loaded_users.add(user_id)
+
+    def find_match(self, user_id: str, position: str, additional_info: Optional[str],
+                   company: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Return {'sequence': Sequence, 'similarity': float} for the closest reusable sequence, if any."""
+        self._ensure_user_loaded(user_id, company)
+        threshold = current_app.config['SEQUENCE_REUSE_THRESHOLD']
+        matches = self._get_index().query(self.fingerprint(position, additional_info, company),
+                                          namespace=user_id, threshold=threshold)
+        for sequence_id, similarity in matches:
+            sequence = db.session.get(Sequence, sequence_id)
+            if sequence is None:
+                self.remove(sequence_id)
+                continue
+            if self.position_similarity(position, sequence.position) < threshold:
+                continue
+            if sequence.steps:
+                _reuse_lookups_total.inc(labels={'outcome': 'hit'})
+                return {'sequence': sequence, 'similarity': similarity}
+        _reuse_lookups_total.inc(labels={'outcome': 'miss'})
+        return None
+
+    def add(self, sequence: Sequence, company: Optional[str]) -> None:
+        """Index a newly created sequence (only once its owner's sequences are loaded)."""
+        if sequence.user_id in self._loaded_users:
+            self._get_index().insert(sequence.id, self.fingerprint(sequence.position, sequence.additional_info, company),
+                                     namespace=sequence.user_id)
+
+    def remove(self, sequence_id: str) -> None:
+        if self._index is not None:
+            self._index.remove(sequence_id)
+
+    @staticmethod
+    def record_llm_call_avoided() -> None:
+        _llm_calls_avoided_total.inc(labels={'reason': 'sequence_reuse'})
+
+    @staticmethod
+    def adapt_steps(source: Sequence, position: str) -> List[Dict[str, str]]:
+        """Copy the source steps, swapping in the new position wording.
+
+        Matches are always within one user, so the company is already the same.
+        """
+        steps = [{'title': step.title, 'content': step.content} for step in source.steps]
+        if not source.position or source.position.strip().lower() == position.strip().lower():
+            return steps
+        pattern = re.compile(re.escape(source.position.strip()), re.IGNORECASE)
+        return [{key: pattern.sub(lambda _: position, value) for key, value in step.items()} for step in steps]
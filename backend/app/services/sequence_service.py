@@ -1,7 +1,14 @@
 from typing import List, Dict, Any, Optional
 from flask import current_app
+from sqlalchemy.orm import selectinload
 from ..database.db import db
 from ..models import Sequence, SequenceStep, User
+from ..utils.cancellation import RequestCancelled
+from ..utils.serialization import RawJSON, encode_array
+from .search_service import SearchService
+from .sequence_cache import CachedSequence, SequenceCache
+from .sequence_reuse_service import SequenceReuseService
+from .usage_service import usage_scope
 
 class SequenceService:
     _instance = None
@@ -17,8 +24,32 @@ class SequenceService:
         # Don't initialize AIService here, get it when needed
         pass
     
-    async def create_sequence(self, user_id: str, title: str, position: str, additional_info: Optional[str] = None) -> Sequence:
-        """Create a new recruiting sequence."""
+    def suggest_reuse(self, user_id: str, position: str, additional_info: Optional[str] = None,
+                      step_count: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """A near-duplicate of one of the user's sequences to offer instead of generating, or None.
+
+        Only a suggestion: the client reuses it by passing its id to
+        create_sequence() as reuse_from. A match is only offered if it has the
+        requested step_count (when one is given).
+        """
+        user = User.query.get(user_id)
+        if not user:
+            return None
+        match = SequenceReuseService.get_instance().find_match(user_id, position, additional_info, user.company)
+        if not match or (step_count and len(match['sequence'].steps) != step_count):
+            return None
+        source = match['sequence']
+        return {'sequenceId': source.id, 'title': source.title, 'position': source.position,
+                'similarity': round(match['similarity'], 3)}
+    
+    async def create_sequence(self, user_id: str, title: str, position: str, additional_info: Optional[str] = None,
+                              reuse_from: Optional[str] = None, step_count: Optional[int] = None) -> Sequence:
+        """Create a new recruiting sequence.
+        
+        With reuse_from (an accepted suggest_reuse() match), that sequence of the
+        user's is cloned and adapted to the position instead of calling the LLM;
+        the returned sequence then has a `reused_from` attribute.
+        """
         # Get user information for context
         user = User.query.get(user_id)
         if not user:
@@ -28,16 +59,12 @@ class SequenceService:
             "name": user.company if hasattr(user, 'company') and user.company else "your company"
         }
         
-        # Get AIService instance and generate sequence steps
-        # Import here to avoid circular imports
-        from .ai_service import AIService
-        
-        ai_service = AIService.get_instance()
-        steps = await ai_service.generate_sequence(
-            position=position,
-            company_context=company_context,
-            additional_info=additional_info
-        )
+        reuse_service = SequenceReuseService.get_instance()
+        source = None
+        if reuse_from:
+            source = Sequence.query.get(reuse_from)
+            if source is None or source.user_id != user_id or not source.steps:
+                raise ValueError(f"Sequence {reuse_from} can't be reused")
         
         # Create sequence in database
         sequence = Sequence(
@@ -50,21 +77,72 @@ class SequenceService:
         db.session.add(sequence)
         db.session.flush()  # Get the ID without committing
         
-        # Create steps
-        for i, step_data in enumerate(steps):
-            step = SequenceStep(
-                sequence_id=sequence.id,
-                title=step_data["title"],
-                content=step_data["content"],
-                order=i
-            )
-            db.session.add(step)
+        if source is not None:
+            steps = reuse_service.adapt_steps(source, position)
+            reuse_service.record_llm_call_avoided()
+            
+            # Create steps
+            for i, step_data in enumerate(steps):
+                step = SequenceStep(
+                    sequence_id=sequence.id,
+                    title=step_data["title"],
+                    content=step_data["content"],
+                    order=i
+                )
+                db.session.add(step)
+        else:
+            # Get AIService instance and generate sequence steps
+            # Import here to avoid circular imports
+            from .ai_service import AIService
+            from .. import socketio
+            
+            # Commit the empty sequence so each step can be persisted and shown as it streams in
+            db.session.commit()
+            
+            def on_step(index: int, step_data: Dict[str, str]) -> None:
+                db.session.add(SequenceStep(
+                    sequence_id=sequence.id,
+                    title=step_data["title"],
+                    content=step_data["content"],
+                    order=index
+                ))
+                db.session.commit()
+                SequenceCache.get_instance().invalidate(sequence.id)
+                socketio.emit('sequence_updated', {**sequence.to_dict(), 'generating': True})
+            
+            ai_service = AIService.get_instance()
+            try:
+                with usage_scope(sequence_id=sequence.id):
+                    await ai_service.generate_sequence(
+                        position=position,
+                        company_context=company_context,
+                        additional_info=additional_info,
+                        on_step=on_step,
+                        step_count=step_count
+                    )
+            except (Exception, RequestCancelled):
+                # Don't leave a half-generated sequence behind (also when the request was cancelled)
+                db.session.rollback()
+                SequenceStep.query.filter_by(sequence_id=sequence.id).delete()
+                db.session.delete(sequence)
+                db.session.commit()
+                SequenceCache.get_instance().invalidate(sequence.id)
+                socketio.emit('sequence_deleted', {'id': sequence.id})
+                raise
         
+        db.session.flush()
+        SearchService.get_instance().index_sequence(sequence.id)
         db.session.commit()
+        SequenceCache.get_instance().invalidate(sequence.id)
+        reuse_service.add(sequence, user.company)
+        
+        if source is not None:
+            sequence.reused_from = {'sequenceId': source.id}
+            current_app.logger.info(f"Reused sequence {source.id} for {sequence.id}; LLM call skipped")
         return sequence
     
-    async def update_sequence(self, sequence_id: str, updated_steps: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
-        """Update an existing sequence with new steps."""
+    async def update_sequence(self, sequence_id: str, updated_steps: List[Dict[str, Any]]) -> Optional[RawJSON]:
+        """Update an existing sequence with new steps; returns the encoded sequence."""
         sequence = Sequence.query.get(sequence_id)
         if not sequence:
             # If the sequence doesn't exist yet (first update), create a placeholder
@@ -90,14 +168,21 @@ class SequenceService:
             )
             db.session.add(step)
         
+        db.session.flush()
+        SearchService.get_instance().index_sequence(sequence_id)
         db.session.commit()
-        return sequence.to_dict()
+        SequenceCache.get_instance().invalidate(sequence_id)
+        return sequence.to_json()
     
     async def get_sequence(self, sequence_id: str) -> Optional[Sequence]:
         """Get a sequence by ID."""
         sequence = Sequence.query.get(sequence_id)
         return sequence
     
+    def get_sequence_document(self, sequence_id: str) -> Optional[CachedSequence]:
+        """The encoded sequence and its ETag, from the sequence cache when it's there."""
+        return SequenceCache.get_instance().fetch(sequence_id, lambda: Sequence.query.get(sequence_id))
+    
     async def refine_sequence_step(self, step_id: str, feedback: str, content: Optional[str] = None) -> Optional[SequenceStep]:
         """Refine a specific step in a sequence based on feedback."""
         step = SequenceStep.query.get(step_id)
@@ -113,16 +198,24 @@ class SequenceService:
             from .ai_service import AIService
             
             ai_service = AIService.get_instance()
-            refined_content = await ai_service.refine_sequence_step(step.content, feedback)
+            with usage_scope(sequence_id=step.sequence_id):
+                refined_content = await ai_service.refine_sequence_step(step.content, feedback)
             step.content = refined_content
         
+        db.session.flush()
+        SearchService.get_instance().index_sequence(step.sequence_id)
         db.session.commit()
+        SequenceCache.get_instance().invalidate(step.sequence_id)
         return step
     
-    def get_user_sequences(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get all sequences for a user."""
-        sequences = Sequence.query.filter_by(user_id=user_id).all()
-        return [seq.to_dict() for seq in sequences]
+    def search_sequences(self, user_id: str, query: str, page: int = 1, page_size: int = 20) -> Dict[str, Any]:
+        """Full-text search over a user's sequences and step content."""
+        return SearchService.get_instance().search(user_id, query, page=page, page_size=page_size)
+    
+    def get_user_sequences(self, user_id: str) -> RawJSON:
+        """Get all sequences for a user, encoded as a JSON array."""
+        sequences = Sequence.query.filter_by(user_id=user_id).options(selectinload(Sequence.steps)).all()
+        return encode_array(seq.to_json() for seq in sequences)
     
     async def delete_sequence(self, sequence_id: str) -> bool:
         """Delete a sequence and all its steps."""
@@ -136,7 +229,10 @@ class SequenceService:
             
             # Then delete the sequence itself
             db.session.delete(sequence)
+            SearchService.get_instance().remove_sequence(sequence_id)
             db.session.commit()
+            SequenceCache.get_instance().invalidate(sequence_id)
+            SequenceReuseService.get_instance().remove(sequence_id)
             
             current_app.logger.info(f"Sequence {sequence_id} deleted successfully")
             return True
@@ -145,8 +241,8 @@ class SequenceService:
             current_app.logger.error(f"Error deleting sequence {sequence_id}: {str(e)}")
             return False
     
-    async def refine_step(self, sequence_id: str, step_id: str, feedback: str) -> Optional[Dict[str, Any]]:
-        """Refine a specific step based on user feedback."""
+    async def refine_step(self, sequence_id: str, step_id: str, feedback: str) -> Optional[RawJSON]:
+        """Refine a specific step based on user feedback; returns the encoded step."""
         step = SequenceStep.query.filter_by(id=step_id, sequence_id=sequence_id).first()
         if not step:
             return None
@@ -156,10 +252,14 @@ class SequenceService:
         from .ai_service import AIService
         
         ai_service = AIService.get_instance()
-        refined_content = await ai_service.refine_sequence_step(step.content, feedback)
+        with usage_scope(sequence_id=sequence_id):
+            refined_content = await ai_service.refine_sequence_step(step.content, feedback)
         
         # Update the step
         step.content = refined_content
+        db.session.flush()
+        SearchService.get_instance().index_sequence(sequence_id)
         db.session.commit()
+        SequenceCache.get_instance().invalidate(sequence_id)
         
-        return step.to_dict() 
\ No newline at end of file
+        return step.to_json()
\ No newline at end of file
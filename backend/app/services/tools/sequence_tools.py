@@ -3,7 +3,8 @@ from flask import current_app
 import json
 
 # Tool implementation functions
-async def _generate_sequence(position: str, additional_info: str = None, user_id: str = None, title: str = None):
+async def _generate_sequence(position: str, additional_info: str = None, user_id: str = None, title: str = None,
+                             step_count: int = None):
     """Generate a new sequence for the specified position."""
     from ...database.db import db
     from ...models import User
@@ -41,7 +42,8 @@ async def _generate_sequence(position: str, additional_info: str = None, user_id
             user_id=user_id,
             title=sequence_title,
             position=position,
-            additional_info=additional_info
+            additional_info=additional_info,
+            step_count=step_count
         )
         
         # Properly await the coroutine
@@ -50,13 +52,16 @@ async def _generate_sequence(position: str, additional_info: str = None, user_id
         # Use to_dict method or extract steps manually if to_dict doesn't exist
         if hasattr(sequence, 'to_dict'):
             sequence_data = sequence.to_dict()
-            return {
+            result = {
                 "id": sequence.id,
                 "position": position,
                 "title": sequence_title,
                 "steps": sequence_data['steps'],
                 "additionalInfo": additional_info
             }
+            if getattr(sequence, 'reused_from', None):
+                result["reusedFrom"] = sequence.reused_from
+            return result
         else:
             # Fallback if to_dict doesn't exist
             return {
@@ -176,6 +181,10 @@ generate_sequence_tool = {
             "additional_info": {
                 "type": "string",
                 "description": "Additional information about the position or candidate profile"
+            },
+            "step_count": {
+                "type": "integer",
+                "description": "Number of emails in the sequence, 1-10 (optional, only if the user asks for a specific number)"
             }
         },
         "required": ["position"]
@@ -1,11 +1,21 @@
 from typing import Dict, Any, List, Callable, Optional
 from flask import current_app
 import json
+import time
 import traceback
 
+from ...utils.metrics import registry, SIZE_BUCKETS
+from ...utils.tracing import start_span
+from ...utils.cancellation import RequestCancelled, raise_if_cancelled
+
 # Dictionary to store all registered tools
 _tools: Dict[str, Dict[str, Any]] = {}
 
+# Tool instrumentation, exported from /metrics
+_tool_calls_total = registry.counter('helix_tool_calls_total', 'Tool executions by tool and status')
+_tool_duration_seconds = registry.histogram('helix_tool_duration_seconds', 'Tool execution latency in seconds')
+_tool_argument_bytes = registry.histogram('helix_tool_argument_bytes', 'Size of tool call arguments in bytes', buckets=SIZE_BUCKETS)
+
 def register_tool(tool_definition: Dict[str, Any]) -> None:
     """Register a tool so it can be used by the AI.
     
@@ -42,15 +52,28 @@ def get_tools() -> List[Dict[str, Any]]:
 async def execute_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any]:
     """Execute a tool call and return the result.
     
+    The call runs inside a 'tool.execute' span (nested under the active request
+    span) and records per-tool call counts, latency and argument size.
+    
     Args:
         tool_call: A dictionary containing the tool call details
         
     Returns:
         The result of the tool execution
     """
+    tool_name = tool_call.get('name')
+    with start_span('tool.execute', tool=tool_name or 'unknown') as span:
+        result = await _execute_tool_call(tool_call, span)
+        if 'error' in result:
+            span.status = 'error'
+            span.error = result['error']
+        return result
+
+async def _execute_tool_call(tool_call: Dict[str, Any], span) -> Dict[str, Any]:
     try:
         tool_name = tool_call.get('name')
         if not tool_name or tool_name not in _tools:
+            _tool_calls_total.inc(labels={'tool': str(tool_name), 'status': 'not_found'})
             return {
                 "error": f"Tool '{tool_name}' not found"
             }
@@ -61,12 +84,25 @@ async def execute_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any]:
         # Parse arguments from JSON string
         arguments = tool_call.get('arguments', "{}")
         if isinstance(arguments, str):
+            argument_bytes = len(arguments.encode('utf-8'))
             arguments = json.loads(arguments)
+        else:
+            argument_bytes = len(json.dumps(arguments, default=str).encode('utf-8'))
+        _tool_argument_bytes.observe(argument_bytes, {'tool': tool_name})
+        span.set_attribute('argument_bytes', argument_bytes)
         
         # Execute the function with the provided arguments
+        start = time.perf_counter()
         try:
+            raise_if_cancelled()
             result = await function(**arguments)
             
+            # Tool functions report handled failures as {"error": ...}
+            status = 'error' if isinstance(result, dict) and 'error' in result else 'success'
+            _tool_duration_seconds.observe(time.perf_counter() - start, {'tool': tool_name})
+            _tool_calls_total.inc(labels={'tool': tool_name, 'status': status})
+            span.set_attribute('tool_status', status)
+            
             # 记录成功并通过socketio发送通知
             try:
                 from .. import socketio
@@ -78,7 +114,16 @@ async def execute_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any]:
                 print(f"Error emitting tool execution event: {str(e)}")
                 
             return {"result": result}
+        except RequestCancelled:
+            # The request was superseded or abandoned; let it unwind the caller
+            _tool_calls_total.inc(labels={'tool': tool_name, 'status': 'cancelled'})
+            span.set_attribute('tool_status', 'cancelled')
+            raise
         except Exception as e:
+            _tool_duration_seconds.observe(time.perf_counter() - start, {'tool': tool_name})
+            _tool_calls_total.inc(labels={'tool': tool_name, 'status': 'exception'})
+            span.set_attribute('tool_status', 'exception')
+            
             error_message = f"Error executing tool '{tool_name}': {str(e)}"
             stack_trace = traceback.format_exc()
             try:
@@ -107,4 +152,4 @@ async def execute_tool_call(tool_call: Dict[str, Any]) -> Dict[str, Any]:
         except RuntimeError:
             print(f"{error_message}\n{stack_trace}")
         
-        return {"error": error_message} 
\ No newline at end of file
+        return {"error": error_message}
\ No newline at end of file
@@ -0,0 +1,210 @@
+"""
+Per-call LLM token usage and cost accounting.
+
+AIService reports every Messages API call with record_llm_usage(). During a
+request the rows are buffered on flask.g and written once the request is
+done (flush_llm_usage runs as a teardown handler), on their own connection:
+one INSERT for the calls plus one upsert per (day, user, call type, model)
+adding them to llm_usage_daily. The rollup is maintained incrementally and
+never recomputed from llm_usage, and usage survives the request's own
+transaction being rolled back (a cancelled or failed generation still cost
+tokens).
+
+Calls are linked to what they were made for: calls inside
+usage_scope(sequence_id=...) carry that sequence id, and
+link_llm_usage(chat_message_id=...) tags the request's calls that are not
+linked yet.
+"""
+
+import uuid
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from flask import g, has_app_context, has_request_context
+from sqlalchemy import func, insert, update
+
+from ..database.db import db
+from ..models import LLMUsage, LLMUsageDaily
+from ..utils.metrics import registry
+from .llm_scheduler import current_caller
+
+logger = logging.getLogger(__name__)
+
+_usage_rows_total = registry.counter('helix_llm_usage_rows_written_total', 'LLM usage rows written to llm_usage')
+_usage_write_failures_total = registry.counter('helix_llm_usage_write_failures_total',
+                                               'Failed llm_usage / llm_usage_daily writes (rows are dropped)')
+
+_usage_links: ContextVar[Dict[str, str]] = ContextVar('llm_usage_links', default={})
+
+_ROLLUP_KEY = ('day', 'user_id', 'call_type', 'model')
+_ROLLUP_SUMS = ('calls', 'errors', 'input_tokens', 'output_tokens', 'cache_read_tokens', 'cache_write_tokens',
+                'latency_ms', 'cost_usd')
+
+GROUP_BY_COLUMNS = {
+    'day': LLMUsageDaily.day,
+    'user': LLMUsageDaily.user_id,
+    'call_type': LLMUsageDaily.call_type,
+    'model': LLMUsageDaily.model,
+}
+
+
+def record_llm_usage(call_type: str, model: str, status: str, usage: Any, seconds: float, cost: float) -> None:
+    """Record one LLM call; buffered until the end of the request when there is one."""
+    links = _usage_links.get()
+    row = {
+        'id': str(uuid.uuid4()),
+        'created_at': datetime.utcnow(),
+        'user_id': current_caller().user_id,
+        'call_type': call_type,
+        'model': model,
+        'status': status,
+        'input_tokens': getattr(usage, 'input_tokens', 0) or 0,
+        'output_tokens': getattr(usage, 'output_tokens', 0) or 0,
+        'cache_read_tokens': getattr(usage, 'cache_read_input_tokens', 0) or 0,
+        'cache_write_tokens': getattr(usage, 'cache_creation_input_tokens', 0) or 0,
+        'latency_ms': seconds * 1000,
+        'cost_usd': cost,
+        'chat_message_id': links.get('chat_message_id'),
+        'sequence_id': links.get('sequence_id'),
+    }
+    if has_request_context():
+        g.setdefault('llm_usage', []).append(row)
+    elif has_app_context():
+        UsageService.get_instance().write([row])
+
+
+@contextmanager
+def usage_scope(**links: str):
+    """Link the LLM calls made inside the block to e.g. sequence_id."""
+    token = _usage_links.set({**_usage_links.get(), **links})
+    try:
+        yield
+    finally:
+        _usage_links.reset(token)
+
+
+def link_llm_usage(**links: str) -> None:
+    """Link this request's LLM calls so far to e.g. chat_message_id, where not already linked."""
+    if not has_request_context():
+        return
+    for row in g.get('llm_usage', ()):
+        for key, value in links.items():
+            if row.get(key) is None:
+                row[key] = value
+
+
+def flush_llm_usage(error: Optional[BaseException] = None) -> None:
+    """Teardown handler: write the request's buffered usage rows."""
+    rows = g.pop('llm_usage', None)
+    if rows:
+        UsageService.get_instance().write(rows)
+
+
+class UsageService:
+    _instance = None
+
+    @classmethod
+    def get_instance(cls):
+        """Get or create a singleton instance of UsageService."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        """Insert usage rows and add them to the daily rollup, in one transaction."""
+        rollups: Dict[tuple, Dict[str, Any]] = {}
+        for row in rows:
+            key = (row['created_at'].date(), row['user_id'], row['call_type'], row['model'])
+            totals = rollups.setdefault(key, dict.fromkeys(_ROLLUP_SUMS, 0))
+            totals['calls'] += 1
+            totals['errors'] += row['status'] == 'error'
+            for column in _ROLLUP_SUMS[2:]:
+                totals[column] += row[column]
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(insert(LLMUsage.__table__), rows)
+                # Sorted, so concurrent writers lock rollup rows in the same order
+                for key in sorted(rollups):
+                    self._add_to_rollup(conn, {**dict(zip(_ROLLUP_KEY, key)), **rollups[key]})
+        except Exception as e:
+            _usage_write_failures_total.inc()
+            logger.error(f"Failed to write {len(rows)} LLM usage rows: {e}")
+            return
+        _usage_rows_total.inc(len(rows))
+
+    @staticmethod
+    def _add_to_rollup(conn, values: Dict[str, Any]) -> None:
+        table = LLMUsageDaily.__table__
+        dialect = conn.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as upsert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as upsert
+            stmt = upsert(table).values(**values)
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=list(_ROLLUP_KEY),
+                set_={column: table.c[column] + stmt.excluded[column] for column in _ROLLUP_SUMS}
+            ))
+            return
+        # No portable upsert: update, and insert if the row didn't exist yet
+        matches = [table.c[column] == values[column] for column in _ROLLUP_KEY]
+        updated = conn.execute(update(table).where(*matches).values(
+            **{column: table.c[column] + values[column] for column in _ROLLUP_SUMS}
+        )).rowcount
+        if not updated:
+            conn.execute(insert(table).values(**values))
+
+    def summary(self, days: int = 30, user_id: Optional[str] = None, group_by: str = 'day') -> Dict[str, Any]:
+        """Usage totals over the last `days` days from the rollup, grouped by day, user, call_type or model."""
+        column = GROUP_BY_COLUMNS[group_by]
+        since = datetime.utcnow().date() - timedelta(days=max(days, 1) - 1)
+        sums = [func.sum(LLMUsageDaily.__table__.c[name]).label(name) for name in _ROLLUP_SUMS]
+        query = db.session.query(column.label('key'), *sums).filter(LLMUsageDaily.day >= since)
+        if user_id:
+            query = query.filter(LLMUsageDaily.user_id == user_id)
+        rows = query.group_by(column).order_by(column).all()
+
+        groups = [self._format(row, key=row.key.isoformat() if group_by == 'day' else row.key) for row in rows]
+        if group_by != 'day':
+            # Most expensive first
+            groups.sort(key=lambda item: -item['costUsd'])
+        totals = {name: sum(getattr(row, name) or 0 for row in rows) for name in _ROLLUP_SUMS}
+        return {
+            'since': since.isoformat(),
+            'groupBy': group_by,
+            'groups': groups,
+            'totals': self._format(totals)
+        }
+
+    def calls(self, user_id: Optional[str] = None, sequence_id: Optional[str] = None,
+              chat_message_id: Optional[str] = None, order: str = 'recent', limit: int = 50) -> List[Dict[str, Any]]:
+        """Individual calls, most recent or most expensive first."""
+        query = LLMUsage.query
+        if user_id:
+            query = query.filter(LLMUsage.user_id == user_id)
+        if sequence_id:
+            query = query.filter(LLMUsage.sequence_id == sequence_id)
+        if chat_message_id:
+            query = query.filter(LLMUsage.chat_message_id == chat_message_id)
+        ordering = LLMUsage.cost_usd.desc() if order == 'cost' else LLMUsage.created_at.desc()
+        return [row.to_dict() for row in query.order_by(ordering).limit(limit).all()]
+
+    @staticmethod
+    def _format(row: Any, **extra: Any) -> Dict[str, Any]:
+        value = (lambda name: row[name] or 0) if isinstance(row, dict) else (lambda name: getattr(row, name) or 0)
+        calls = int(value('calls'))
+        return {
+            **extra,
+            'calls': calls,
+            'errors': int(value('errors')),
+            'inputTokens': int(value('input_tokens')),
+            'outputTokens': int(value('output_tokens')),
+            'cacheReadTokens': int(value('cache_read_tokens')),
+            'cacheWriteTokens': int(value('cache_write_tokens')),
+            'avgLatencyMs': round(value('latency_ms') / calls, 1) if calls else None,
+            'costUsd': round(value('cost_usd'), 6)
+        }
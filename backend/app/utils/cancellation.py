@@ -0,0 +1,208 @@
+"""
+Cooperative cancellation of in-flight request work.
+
+A request that may be superseded (a newer chat message from the same user)
+or abandoned (the user's Socket.IO connection drops) registers a
+CancellationToken in `request_cancellations` and binds it to the current
+context. Code doing slow work checks the bound token: LLM calls register a
+callback that aborts their HTTP stream, so a blocked read returns at once,
+and the RequestCancelled raised from there unwinds the request, triggering
+the usual rollback paths.
+
+RequestCancelled derives from BaseException (like asyncio.CancelledError)
+so the many `except Exception` handlers that turn failures into error
+payloads don't swallow it.
+"""
+
+import socket
+import inspect
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Set
+
+from flask import request, jsonify
+
+from .metrics import registry
+
+_cancellations_total = registry.counter('helix_request_cancellations_total',
+                                        'Requests cancelled before completion, by reason (superseded, disconnect)')
+
+_current_token: ContextVar[Optional['CancellationToken']] = ContextVar('cancellation_token', default=None)
+
+
+class RequestCancelled(BaseException):
+    def __init__(self, reason: str = 'cancelled'):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancellationToken:
+    """One request's cancellation state; callbacks run once, on the cancelling thread."""
+
+    def __init__(self, user_id: Optional[str] = None, channel: str = 'default'):
+        self.user_id = user_id
+        self.channel = channel
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = 'cancelled') -> bool:
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+        return True
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Run callback when cancelled (immediately if already cancelled); returns an unregister function."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+
+                def unregister():
+                    with self._lock:
+                        if callback in self._callbacks:
+                            self._callbacks.remove(callback)
+                return unregister
+        callback()
+        return lambda: None
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise RequestCancelled(self.reason)
+
+
+class CancellationRegistry:
+    """In-flight tokens per user.
+
+    Starting a request on a superseding channel (e.g. 'chat') cancels the
+    user's earlier token on that channel; cancel_user() cancels all of them.
+    """
+
+    def __init__(self):
+        self._tokens: Dict[str, Set[CancellationToken]] = {}
+        self._lock = threading.Lock()
+
+    def begin(self, user_id: str, channel: str, supersede: bool = True) -> CancellationToken:
+        token = CancellationToken(user_id, channel)
+        with self._lock:
+            tokens = self._tokens.setdefault(user_id, set())
+            previous = [t for t in tokens if t.channel == channel] if supersede else []
+            tokens.add(token)
+        for old in previous:
+            if old.cancel('superseded'):
+                _cancellations_total.inc(labels={'reason': 'superseded'})
+        return token
+
+    def finish(self, token: CancellationToken) -> None:
+        with self._lock:
+            tokens = self._tokens.get(token.user_id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens[token.user_id]
+
+    def cancel_user(self, user_id: str, reason: str) -> int:
+        with self._lock:
+            tokens = list(self._tokens.get(user_id, ()))
+        cancelled = sum(1 for token in tokens if token.cancel(reason))
+        if cancelled:
+            _cancellations_total.inc(cancelled, labels={'reason': reason})
+        return cancelled
+
+
+request_cancellations = CancellationRegistry()
+
+
+def current_token() -> Optional[CancellationToken]:
+    return _current_token.get()
+
+
+def raise_if_cancelled() -> None:
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+@contextmanager
+def cancellable(user_id: str, channel: str, supersede: bool = True):
+    """Register and bind a token for the duration of a request."""
+    token = request_cancellations.begin(user_id, channel, supersede)
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
+        request_cancellations.finish(token)
+
+
+def _cancelled_response(error: RequestCancelled):
+    # Partial DB work of the cancelled request must not be committed later
+    from ..database.db import db
+    db.session.rollback()
+    # 499: client closed request (the client has moved on or gone away)
+    return jsonify({'success': False, 'error': 'Request cancelled', 'cancelled': True, 'reason': error.reason}), 499
+
+
+def cancellable_route(channel: str, supersede: bool = True):
+    """Decorator running a view under a cancellation token for the JSON body's userId.
+
+    A RequestCancelled escaping the view rolls back the session and returns 499.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                user_id = (request.get_json(silent=True) or {}).get('userId')
+                if not user_id:
+                    return await func(*args, **kwargs)
+                try:
+                    with cancellable(str(user_id), channel, supersede):
+                        return await func(*args, **kwargs)
+                except RequestCancelled as e:
+                    return _cancelled_response(e)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            user_id = (request.get_json(silent=True) or {}).get('userId')
+            if not user_id:
+                return func(*args, **kwargs)
+            try:
+                with cancellable(str(user_id), channel, supersede):
+                    return func(*args, **kwargs)
+            except RequestCancelled as e:
+                return _cancelled_response(e)
+        return wrapper
+    return decorator
+
+
+def abort_stream(stream) -> None:
+    """Abort a streaming API response from another thread.
+
+    Closing the response alone doesn't wake a thread blocked reading it, so
+    the underlying socket is shut down first.
+    """
+    response = getattr(stream, 'response', None)
+    network_stream = response.extensions.get('network_stream') if response is not None else None
+    sock = network_stream.get_extra_info('socket') if network_stream is not None else None
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    stream.close()
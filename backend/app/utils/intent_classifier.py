@@ -0,0 +1,103 @@
+"""
+Deterministic pre-classification of chat turns.
+
+Greetings, thanks, goodbyes and similar turns don't need the model: a
+whole-message pattern match plus a few cheap features (length, action words,
+whether the assistant just offered to do something) decides whether a canned
+reply is safe. Anything ambiguous goes to the model. Every decision carries a
+human-readable reason so the fast path can be audited.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from .response_processor import generate_fallback_response
+
+# Words that usually mean the user wants something done (generate / refine a sequence)
+ACTION_RE = re.compile(
+    r'\b(create|generate|write|draft|make|build|sequence|outreach|emails?|steps?|change|edit|update|refine|'
+    r'rewrite|shorten|shorter|longer|tone|recruit\w*|hiring|position|role|candidates?)\b', re.IGNORECASE)
+
+# An assistant turn offering to do something, which a bare "ok" / "sg" then accepts
+OFFER_RE = re.compile(r'\b(shall i|should i|would you like|want me to|do you want|i can)\b|\?\s*$', re.IGNORECASE)
+
+_TRAILING = r'[\s!.,:;)(\-~]*'
+_NAME = r'(?:\s+(?:there|helix|team|again|all|everyone|so much|a lot|a bunch|very much))*'
+
+
+@dataclass(frozen=True)
+class IntentRule:
+    name: str
+    pattern: re.Pattern
+    reply: str
+    # Acknowledgements can accept a pending offer, so they need a quiet context
+    needs_idle_context: bool = False
+
+
+@dataclass(frozen=True)
+class IntentDecision:
+    intent: Optional[str]        # None: send the turn to the model
+    reply: Optional[str]
+    reason: str
+
+    @property
+    def local(self) -> bool:
+        return self.intent is not None
+
+
+def _whole(alternatives: str) -> re.Pattern:
+    return re.compile(rf'^\s*(?:{alternatives}){_NAME}{_TRAILING}$', re.IGNORECASE)
+
+
+RULES = (
+    IntentRule('greeting',
+               _whole(r'hi+|hello+|hey+|hiya|howdy|yo|good (?:morning|afternoon|evening)|greetings'),
+               generate_fallback_response('hi')),
+    IntentRule('thanks',
+               _whole(r'thanks?|thank you|thx|ty|cheers|much appreciated|appreciate it|perfect,? thanks?'),
+               "You're welcome! Let me know if you'd like to refine a step or start a sequence for another role."),
+    IntentRule('farewell',
+               _whole(r'bye|goodbye|see (?:you|ya)(?: later)?|later|that\'?s all|all done|done for (?:now|today)'),
+               "Sounds good. Your sequences are saved in the workspace whenever you want to pick this back up."),
+    IntentRule('help',
+               _whole(r'help|what can you do\??|how does this work\??|what do you do\??|who are you\??'),
+               "I'm Helix, your recruiting assistant. Tell me the role you're hiring for and I'll draft a "
+               "personalized multi-step outreach sequence. You can then ask me to refine any step, e.g. "
+               "\"make step 2 shorter\" or \"add a line about remote work\"."),
+    IntentRule('acknowledgement',
+               _whole(r'ok(?:ay)?|k|kk|cool|great|nice|got it|sounds good|sg|alright|noted|awesome'),
+               "Great. What position would you like to create an outreach sequence for?",
+               needs_idle_context=True),
+)
+
+
+class IntentClassifier:
+    """Answers trivially classifiable chat turns locally; see module docstring."""
+
+    def __init__(self, enabled_intents: Optional[Iterable[str]] = None, max_chars: int = 60):
+        enabled = set(enabled_intents) if enabled_intents is not None else None
+        self.rules = [rule for rule in RULES if enabled is None or rule.name in enabled]
+        self.max_chars = max_chars
+
+    def classify(self, message: str, previous_assistant: Optional[str] = None,
+                 has_active_sequence: bool = False) -> IntentDecision:
+        text = (message or '').strip()
+        if not text:
+            return IntentDecision(None, None, 'empty message')
+        if len(text) > self.max_chars:
+            return IntentDecision(None, None, f'longer than {self.max_chars} characters')
+        action = ACTION_RE.search(text)
+        if action:
+            return IntentDecision(None, None, f'mentions an action ("{action.group(0)}")')
+
+        for rule in self.rules:
+            if not rule.pattern.match(text):
+                continue
+            if rule.needs_idle_context:
+                if has_active_sequence:
+                    return IntentDecision(None, None, f'{rule.name} while a sequence is active')
+                if previous_assistant and OFFER_RE.search(previous_assistant.strip()):
+                    return IntentDecision(None, None, f'{rule.name} answering an assistant offer or question')
+            return IntentDecision(rule.name, rule.reply, f'whole message matches {rule.name}')
+        return IntentDecision(None, None, 'no intent pattern matched')
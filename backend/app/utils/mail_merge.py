@@ -0,0 +1,146 @@
+"""
+Mail-merge rendering of [PLACEHOLDER] tokens in sequence steps.
+
+A step's text is compiled once into a Template: placeholders are found with
+one regex pass and the literal text between them becomes a %-format string.
+A Binding then maps every placeholder of a set of templates to a column of
+one candidate upload, so rendering a candidate is an itemgetter over the row
+plus one C-level string format per template - no regex or dict building per
+candidate. For JSON output the literals are escaped at bind time too, so a
+long step body is never re-scanned per candidate.
+
+Placeholder names match columns after normalization ('Candidate Name',
+'candidate-name' and CANDIDATE_NAME are the same field), and [CANDIDATE_X]
+also matches a plain X column, so a `name` column fills [CANDIDATE_NAME].
+"""
+
+import re
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+PLACEHOLDER_RE = re.compile(r'\[([A-Z][A-Z0-9_]*)\]')
+
+_NON_FIELD_CHARS = re.compile(r'[^A-Z0-9]+')
+
+
+def normalize_field(name: str) -> str:
+    return _NON_FIELD_CHARS.sub('_', str(name).strip().upper()).strip('_')
+
+
+class MissingFieldsError(ValueError):
+    """Placeholders that neither the candidate data nor the defaults can fill."""
+
+    def __init__(self, missing: Dict[str, List[str]]):
+        self.missing = missing  # Field -> where it is used
+        super().__init__(f"Candidate data has no column for: {', '.join(sorted(missing))}")
+
+
+class Template:
+    """Step text compiled for repeated rendering; `fields` are its placeholders in order of appearance."""
+    __slots__ = ('source', 'fields', '_literals', '_format', '_escaped')
+
+    def __init__(self, source: str):
+        parts = PLACEHOLDER_RE.split(source or '')
+        self.source = source or ''
+        self.fields: Tuple[str, ...] = tuple(parts[1::2])
+        # Literals alternate with placeholders; each placeholder becomes a %s slot
+        self._literals = parts[0::2]
+        self._format = self._join(self._literals)
+        self._escaped: Dict[Callable[[str], str], str] = {}
+
+    @staticmethod
+    def _join(literals: Iterable[str]) -> str:
+        return '%s'.join(literal.replace('%', '%%') for literal in literals)
+
+    def format_string(self, escape: Optional[Callable[[str], str]] = None) -> str:
+        """The %-format string, with the literals passed through escape (e.g. for JSON output) once."""
+        if escape is None:
+            return self._format
+        if escape not in self._escaped:
+            self._escaped[escape] = self._join(escape(literal) for literal in self._literals)
+        return self._escaped[escape]
+
+    def render(self, values: Sequence[Any]) -> str:
+        """Render with one value per entry of `fields` (repeats included)."""
+        return self._format % tuple(values)
+
+
+@lru_cache(maxsize=4096)
+def compile_template(source: str) -> Template:
+    """Compiled template for this text; shared across requests that merge the same step."""
+    return Template(source)
+
+
+def _resolve(field: str, columns: Dict[str, int]) -> Optional[int]:
+    if field in columns:
+        return columns[field]
+    if field.startswith('CANDIDATE_'):
+        return columns.get(field[len('CANDIDATE_'):])
+    return None
+
+
+class Binding:
+    """A set of named templates bound to the columns of one candidate upload.
+
+    Rows are lists in `columns` order; defaults (e.g. RECRUITER_NAME) fill
+    placeholders that no column provides. Raises MissingFieldsError when a
+    placeholder can be filled by neither. With `escape`, output is rendered
+    already escaped (e.g. as JSON string contents): literals are escaped once
+    here, and only the row's values on each render.
+    """
+
+    def __init__(self, templates: Dict[str, Template], columns: Iterable[str],
+                 defaults: Optional[Dict[str, Any]] = None, escape: Optional[Callable[[str], str]] = None):
+        self.templates = templates
+        self.columns = list(columns)
+        self.escape = escape
+        index = {}
+        for position, column in enumerate(self.columns):
+            index.setdefault(normalize_field(column), position)
+        # Defaults are appended to every row, so they resolve like extra columns
+        defaults = {normalize_field(key): '' if value is None else str(value) for key, value in (defaults or {}).items()}
+        self._default_values = [escape(value) if escape else value for value in defaults.values()]
+        for offset, key in enumerate(defaults):
+            index.setdefault(key, len(self.columns) + offset)
+
+        missing: Dict[str, List[str]] = {}
+        slots: Dict[str, int] = {}
+        for name, template in templates.items():
+            for field in template.fields:
+                position = _resolve(field, index)
+                if position is None:
+                    missing.setdefault(field, []).append(name)
+                else:
+                    slots[field] = position
+        if missing:
+            raise MissingFieldsError({field: sorted(set(where)) for field, where in missing.items()})
+
+        self.fields = sorted(slots)
+        self._renderers = [(template.format_string(escape), self._getter([slots[f] for f in template.fields]))
+                           for template in templates.values()]
+        self._required = self._getter([slots[f] for f in self.fields])
+
+    @staticmethod
+    def _getter(positions: List[int]) -> Callable[[Sequence[Any]], Tuple[Any, ...]]:
+        if not positions:
+            return lambda row: ()
+        if len(positions) == 1:
+            position = positions[0]
+            return lambda row: (row[position],)
+        return itemgetter(*positions)
+
+    def render(self, row: List[Any]) -> Tuple[List[str], List[str]]:
+        """Rendered text for each template (in `templates` order), and the placeholders this row left blank."""
+        width = len(self.columns)
+        if len(row) != width:
+            row = (row + [''] * width)[:width]
+        if self.escape is not None:
+            escape = self.escape
+            row = [escape(value if isinstance(value, str) else str(value)) for value in row]
+        if self._default_values:
+            row = row + self._default_values
+        blank = []
+        if not all(self._required(row)):
+            blank = [field for field, value in zip(self.fields, self._required(row)) if not value]
+        return [format_string % getter(row) for format_string, getter in self._renderers], blank
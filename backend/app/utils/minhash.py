@@ -0,0 +1,146 @@
+"""
+MinHash signatures and an LSH index for near-duplicate text detection.
+
+Pure Python, no external services: text is reduced to a set of character
+shingles, the set is summarised by `num_perm` min-hash values, and
+signatures are bucketed by bands so that a query only compares against
+candidates that share at least one band (locality-sensitive hashing).
+The fraction of equal signature positions estimates Jaccard similarity.
+"""
+
+import re
+import zlib
+import random
+import threading
+from array import array
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WHITESPACE_RE = re.compile(r'\s+')
+_NON_WORD_RE = re.compile(r'[^\w\s]')
+
+# Stored as a compact array of unsigned 32-bit ints (4 bytes per permutation)
+Signature = array
+
+
+def normalize(text: Optional[str]) -> str:
+    """Lower-case, drop punctuation and collapse whitespace."""
+    text = _NON_WORD_RE.sub(' ', (text or '').lower())
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def shingles(text: Optional[str], k: int = 4, prefix: str = '') -> Set[str]:
+    """Character k-shingles of normalized text (the whole text if shorter than k)."""
+    text = normalize(text)
+    if not text:
+        return set()
+    if len(text) <= k:
+        return {prefix + text}
+    return {prefix + text[i:i + k] for i in range(len(text) - k + 1)}
+
+
+def optimal_bands(threshold: float, num_perm: int, recall: float = 0.99) -> Tuple[int, int]:
+    """Choose (bands, rows) for the LSH index.
+
+    Picks the most selective split (most rows per band, so fewest candidate
+    comparisons) that still surfaces a pair at exactly `threshold` similarity
+    with probability >= recall. Candidates are then checked against the
+    threshold exactly, so extra candidates cost time but not accuracy.
+    """
+    best = (num_perm, 1)
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        if 1.0 - (1.0 - threshold ** rows) ** bands >= recall:
+            best = (bands, rows)
+    return best
+
+
+class MinHasher:
+    """Computes fixed-length MinHash signatures with seeded universal hashing."""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._params = [(rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+                        for _ in range(num_perm)]
+
+    def signature(self, features: Iterable[str]) -> Signature:
+        hashes = [zlib.crc32(feature.encode('utf-8')) for feature in set(features)]
+        if not hashes:
+            return array('I', [_MAX_HASH] * self.num_perm)
+        return array('I', (
+            min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+            for a, b in self._params
+        ))
+
+    @staticmethod
+    def similarity(left: Signature, right: Signature) -> float:
+        """Estimated Jaccard similarity of the two shingle sets."""
+        if not left or len(left) != len(right):
+            return 0.0
+        return sum(1 for x, y in zip(left, right) if x == y) / len(left)
+
+
+class MinHashLSH:
+    """Banded LSH index over MinHash signatures, partitioned by a namespace.
+
+    Entries only ever match other entries in the same namespace (e.g. a user
+    id), so one index can serve many tenants without cross-matching.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 128):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+        self._buckets: Dict[Tuple[Hashable, int, bytes], Set[Hashable]] = {}
+        self._signatures: Dict[Hashable, Tuple[Hashable, Signature]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._signatures
+
+    def _band_keys(self, namespace: Hashable, signature: Signature):
+        for band in range(self.bands):
+            start = band * self.rows
+            yield (namespace, band, signature[start:start + self.rows].tobytes())
+
+    def insert(self, key: Hashable, signature: Signature, namespace: Hashable = None) -> None:
+        with self._lock:
+            if key in self._signatures:
+                self._remove(key)
+            self._signatures[key] = (namespace, signature)
+            for band_key in self._band_keys(namespace, signature):
+                self._buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key: Hashable) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._signatures.pop(key, None)
+        if entry is None:
+            return
+        namespace, signature = entry
+        for band_key in self._band_keys(namespace, signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def query(self, signature: Signature, namespace: Hashable = None,
+              threshold: Optional[float] = None) -> List[Tuple[Hashable, float]]:
+        """Return (key, estimated similarity) at or above threshold, most similar first."""
+        threshold = self.threshold if threshold is None else threshold
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(namespace, signature):
+                candidates.update(self._buckets.get(band_key, ()))
+            scored = [(key, MinHasher.similarity(signature, self._signatures[key][1])) for key in candidates]
+        return sorted([item for item in scored if item[1] >= threshold], key=lambda item: -item[1])
@@ -0,0 +1,108 @@
+"""
+Local clustering of candidate profiles, so one LLM call can personalize a
+message for a whole group of similar candidates.
+
+Each profile is reduced to a set of field-prefixed words ('title:senior',
+'skills:kubernetes', ...) and clustered greedily: the first profile of a
+cluster is its leader, and a later profile joins the leader with the highest
+Jaccard similarity at or above the threshold, or starts a new cluster. The
+number of clusters is capped, so rather than MinHash/LSH (built for large
+indexes, see minhash.py) similarities are computed exactly: every distinct
+word gets a bit, and the overlap with each leader is an AND and a popcount
+on two ints.
+Once the cap is reached, profiles that match no leader go to OVERFLOW.
+Identical feature sets are assigned from a cache, and clustering is
+deterministic for a given input order.
+"""
+
+from collections import Counter
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from .minhash import normalize
+
+OVERFLOW = -1
+
+# Only words that occur in at least this share of a cluster describe it
+COMMON_FEATURE_SHARE = 0.5
+
+
+def profile_features(profile: Dict[str, Any]) -> FrozenSet[str]:
+    return frozenset(f"{field.lower()}:{word}" for field, value in profile.items() if value not in (None, '')
+                     for word in normalize(str(value)).split())
+
+
+class ProfileClusterer:
+    def __init__(self, threshold: float = 0.5, max_clusters: int = 200, cache_size: int = 100000):
+        self.threshold = threshold
+        self.max_clusters = max_clusters
+        self._bits: Dict[str, int] = {}
+        self._leader_masks: List[Tuple[int, int]] = []  # (mask, popcount)
+        self._cache: Dict[FrozenSet[str], int] = {}
+        self._cache_size = cache_size
+        self.sizes: List[int] = []
+        self.leaders: List[Dict[str, Any]] = []
+        self._features: List[Counter] = []
+        self.overflow = 0
+
+    def _mask(self, features: FrozenSet[str]) -> int:
+        mask = 0
+        for feature in features:
+            bit = self._bits.get(feature)
+            if bit is None:
+                bit = self._bits[feature] = 1 << len(self._bits)
+            mask |= bit
+        return mask
+
+    def _closest(self, mask: int) -> Optional[int]:
+        size = mask.bit_count()
+        best, best_similarity = None, self.threshold
+        for cluster, (leader, leader_size) in enumerate(self._leader_masks):
+            shared = (mask & leader).bit_count()
+            if shared:
+                similarity = shared / (size + leader_size - shared)
+                if similarity > best_similarity or (best is None and similarity == best_similarity):
+                    best, best_similarity = cluster, similarity
+        return best
+
+    def assign(self, profile: Dict[str, Any]) -> int:
+        """Cluster index for this profile (OVERFLOW if it matches nothing and the cap is reached)."""
+        features = profile_features(profile)
+        cluster = self._cache.get(features)
+        if cluster is None:
+            mask = self._mask(features)
+            cluster = self._closest(mask)
+            if cluster is None:
+                if len(self.sizes) < self.max_clusters:
+                    cluster = len(self.sizes)
+                    self._leader_masks.append((mask, mask.bit_count()))
+                    self.sizes.append(0)
+                    self.leaders.append(dict(profile))
+                    self._features.append(Counter())
+                else:
+                    cluster = OVERFLOW
+            if len(self._cache) >= self._cache_size:
+                self._cache.clear()
+            self._cache[features] = cluster
+        if cluster == OVERFLOW:
+            self.overflow += 1
+        else:
+            self.sizes[cluster] += 1
+            self._features[cluster].update(features)
+        return cluster
+
+    def common_features(self, cluster: int) -> Dict[str, List[str]]:
+        """Words shared by most of the cluster's members, by field."""
+        size = self.sizes[cluster]
+        common: Dict[str, List[str]] = {}
+        for feature, count in self._features[cluster].most_common():
+            if count < size * COMMON_FEATURE_SHARE:
+                break
+            field, word = feature.split(':', 1)
+            common.setdefault(field, []).append(word)
+        return common
+
+    def describe(self, cluster: int) -> Optional[Dict[str, Any]]:
+        if cluster == OVERFLOW or cluster >= len(self.sizes):
+            return None
+        return {'size': self.sizes[cluster], 'leader': self.leaders[cluster],
+                'common': self.common_features(cluster)}
@@ -0,0 +1,207 @@
+"""
+Prompt anatomy profiling.
+
+With PROMPT_PROFILING_ENABLED, each profiled LLM call's prompt is split into
+tagged sections - tool definitions, the base system prompt, each headed block
+appended to it (ACTIVE SEQUENCE, COMPANY CONTEXT, CURRENT CONTEXT, ...), the
+conversation history and the latest user message - and each section's size
+is estimated locally (about 4 characters per token; no API call). Sections
+are compared with the same user's previous call of the same type, so the
+report shows both which sections dominate the prompt and how much of each is
+re-sent unchanged turn after turn: a stable prefix is a prompt-caching
+candidate, a large section that repeats but sits behind changing content is
+a trimming candidate.
+"""
+
+import json
+import random
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .metrics import registry
+from .timing import RollingPercentiles
+
+_section_tokens = registry.histogram('helix_prompt_section_tokens',
+                                     'Estimated tokens per prompt section, by call type and section',
+                                     buckets=(25, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000))
+_section_repeated_tokens_total = registry.counter('helix_prompt_section_repeated_tokens_total',
+                                                  'Estimated prompt tokens re-sent unchanged from the previous turn')
+
+CHARS_PER_TOKEN = 4
+
+# Headed blocks appended to the base system prompt, in the order they are added
+SYSTEM_SECTION_MARKERS = (
+    ('active_sequence', '\nACTIVE SEQUENCE:'),
+    ('company_context', '\nCOMPANY CONTEXT:'),
+    ('current_context', '\nCURRENT CONTEXT:'),
+)
+
+# Order sections are sent in (tools, system, messages)
+SECTION_ORDER = ('tool_definitions', 'base_system') + tuple(name for name, _ in SYSTEM_SECTION_MARKERS) + (
+    'history', 'user_message')
+
+# Minimum prefix the API will cache (tokens)
+MIN_CACHEABLE_TOKENS = 1024
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def _block_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return '\n'.join(block.get('text', '') if isinstance(block, dict) else str(block) for block in content)
+    return str(content or '')
+
+
+def split_prompt(system: Any, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None
+                 ) -> List[Tuple[str, List[str]]]:
+    """Tagged (section, parts) pairs in the order the API reads them: tools, system, messages.
+
+    Every section is one part except history, which has one part per message.
+    """
+    sections = []
+    if tools:
+        sections.append(('tool_definitions', [json.dumps(tools, sort_keys=True)]))
+
+    system_text = _block_text(system)
+    cuts = sorted((system_text.find(marker), name) for name, marker in SYSTEM_SECTION_MARKERS
+                  if marker in system_text)
+    # Blank lines that precede a block belong to it
+    starts = [(len(system_text[:index].rstrip('\n')), name) for index, name in cuts]
+    bounds = [(0, 'base_system')] + starts + [(len(system_text), None)]
+    for (start, name), (end, _) in zip(bounds, bounds[1:]):
+        if end > start:
+            sections.append((name, [system_text[start:end]]))
+
+    last_user = max((i for i, m in enumerate(messages) if m.get('role') == 'user'), default=None)
+    history = [f"{m.get('role')}: {_block_text(m.get('content'))}" for i, m in enumerate(messages) if i != last_user]
+    if history:
+        sections.append(('history', history))
+    if last_user is not None:
+        sections.append(('user_message', [f"user: {_block_text(messages[last_user].get('content'))}"]))
+    return sections
+
+
+class _SectionStats:
+    def __init__(self):
+        self.tokens = RollingPercentiles(window=500)
+        self.calls = 0
+        self.total_tokens = 0
+        self.compared_tokens = 0     # Tokens of calls that had a previous turn to compare with
+        self.repeated_tokens = 0
+        self.identical = 0
+        self.compared = 0
+
+
+class PromptProfiler:
+    """Per call type and section token distributions and turn-to-turn repetition; see module docstring."""
+
+    def __init__(self, max_users: int = 1000):
+        self._stats: Dict[str, Dict[str, _SectionStats]] = {}
+        self._totals: Dict[str, RollingPercentiles] = {}
+        self._previous: 'OrderedDict[Tuple[str, str], Dict[str, List[str]]]' = OrderedDict()
+        self._max_users = max_users
+        self._lock = threading.Lock()
+
+    def profile(self, call_type: str, user_id: Optional[str], system: Any, messages: List[Dict[str, Any]],
+                tools: Optional[List[Dict[str, Any]]] = None, config: Optional[Dict[str, Any]] = None) -> None:
+        """Record one call's prompt anatomy if profiling is enabled (and the call is sampled)."""
+        config = config or {}
+        if not config.get('PROMPT_PROFILING_ENABLED'):
+            return
+        if random.random() >= config.get('PROMPT_PROFILING_SAMPLE_RATE', 1.0):
+            return
+        sections = split_prompt(system, messages, tools)
+        key = (call_type, user_id or 'anonymous')
+        current = dict(sections)
+        with self._lock:
+            previous = self._previous.pop(key, None)
+            self._previous[key] = current
+            if len(self._previous) > self._max_users:
+                self._previous.popitem(last=False)
+            stats = self._stats.setdefault(call_type, {})
+            total = 0
+            # Last turn's user message is part of this turn's history
+            seen = set(part for parts in previous.values() for part in parts) if previous is not None else set()
+            for name, parts in sections:
+                tokens = sum(estimate_tokens(part) for part in parts)
+                total += tokens
+                section = stats.setdefault(name, _SectionStats())
+                section.tokens.add(tokens)
+                section.calls += 1
+                section.total_tokens += tokens
+                _section_tokens.observe(tokens, {'call_type': call_type, 'section': name})
+                if previous is None:
+                    continue
+                repeated = sum(estimate_tokens(part) for part in parts if part in seen)
+                section.compared += 1
+                section.compared_tokens += tokens
+                section.repeated_tokens += repeated
+                section.identical += previous.get(name) == parts
+                if repeated:
+                    _section_repeated_tokens_total.inc(repeated, {'call_type': call_type, 'section': name})
+            self._totals.setdefault(call_type, RollingPercentiles(window=500)).add(total)
+
+    def report(self, call_type: Optional[str] = None, repeat_threshold: float = 0.9) -> Dict[str, Any]:
+        """Per-section token distributions, share of the prompt, repetition and a cache/trim suggestion.
+
+        'cache': the section and every section before it were identical to the
+        previous turn in >= repeat_threshold of calls, so a cache breakpoint after
+        it would be served from the prompt cache; 'trim': a large section (>= 20%
+        of the prompt) that is mostly re-sent content (e.g. a history window) but
+        is not a stable prefix.
+        """
+        with self._lock:
+            call_types = [call_type] if call_type else sorted(self._stats)
+            report = {}
+            for name in call_types:
+                stats = self._stats.get(name)
+                if not stats:
+                    continue
+                total_tokens = sum(section.total_tokens for section in stats.values())
+                sections = []
+                stable_prefix = True
+                prefix_tokens = 0
+                cacheable_tokens = 0
+                for section_name in sorted(stats, key=SECTION_ORDER.index):
+                    section = stats[section_name]
+                    summary = section.tokens.summary()
+                    mean = section.total_tokens / section.calls
+                    repeated_share = (section.repeated_tokens / section.compared_tokens
+                                      if section.compared_tokens else None)
+                    share = section.total_tokens / total_tokens if total_tokens else 0.0
+                    identical_rate = section.identical / section.compared if section.compared else None
+                    stable_prefix = stable_prefix and identical_rate is not None and identical_rate >= repeat_threshold
+                    prefix_tokens += mean
+                    suggestion = None
+                    if stable_prefix:
+                        cacheable_tokens = prefix_tokens
+                        suggestion = 'cache'
+                    elif repeated_share is not None and repeated_share >= 0.5 and share >= 0.2:
+                        suggestion = 'trim'
+                    sections.append({
+                        'section': section_name,
+                        'calls': section.calls,
+                        'tokens': {k: summary[k] for k in ('p50', 'p95', 'max') if k in summary},
+                        'meanTokens': round(mean, 1),
+                        'share': round(share, 3),
+                        'repeatedShare': round(repeated_share, 3) if repeated_share is not None else None,
+                        'identicalRate': round(identical_rate, 3) if identical_rate is not None else None,
+                        'suggestion': suggestion
+                    })
+                total = self._totals[name].summary()
+                report[name] = {
+                    'promptTokens': {k: total[k] for k in ('count', 'p50', 'p95', 'max') if k in total},
+                    'sections': sections,
+                    # Stable prefix a cache breakpoint could cover (only worth it above the API minimum)
+                    'cacheablePrefixTokens': round(cacheable_tokens, 1),
+                    'cacheablePrefixWorthIt': cacheable_tokens >= MIN_CACHEABLE_TOKENS
+                }
+            return report
+
+
+prompt_profiler = PromptProfiler()
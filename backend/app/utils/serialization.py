@@ -0,0 +1,145 @@
+"""
+JSON serialization for API payloads.
+
+Rows are encoded once per version: to_json() on Sequence, SequenceStep and
+SessionState memoizes the encoded bytes keyed by (table, id, updated_at),
+so an unchanged row is served without rebuilding its dict, formatting its
+timestamps or encoding it again. A sequence's key also carries its steps'
+(id, updated_at), since replacing or refining steps leaves the sequence row
+as it was. Rows changed without bumping updated_at (raw SQL) keep serving
+the old bytes until they fall out of the memo.
+
+Encoded payloads are RawJSON. json_response() writes one into the
+{'success': true, 'data': ...} body as-is, and Socket.IO, which uses this
+module as its json (see create_app), emits the same bytes without encoding
+them again, so a route that both emits and returns a sequence encodes it
+once.
+
+orjson is used when it is installed; otherwise the standard library
+encoder, with compact separators.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable
+
+from flask import Response
+
+from .metrics import registry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_memo_total = registry.counter('helix_serialization_memo_total', 'Row encodings served from the memo (hit) or built (miss)')
+
+# Encoded rows kept, least recently used first out
+_MAX_MEMO_ENTRIES = 20000
+
+
+class RawJSON:
+    """Already-encoded JSON, written into enclosing payloads verbatim.
+
+    Not a bytes subclass: Socket.IO would send bytes as a binary attachment.
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+_encoder = json.JSONEncoder(separators=(',', ':'))
+
+
+def encode(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return _encoder.encode(obj).encode('utf-8')
+
+
+def encode_raw(obj: Any) -> RawJSON:
+    return RawJSON(encode(obj))
+
+
+def extend_object(payload: RawJSON, fields: Dict[str, Any]) -> RawJSON:
+    """An encoded, non-empty JSON object with fields added to it."""
+    if not fields:
+        return payload
+    return RawJSON(payload.data[:-1] + b',' + encode(fields)[1:])
+
+
+def encode_array(items: Iterable[RawJSON]) -> RawJSON:
+    return RawJSON(b'[' + b','.join(item.data for item in items) + b']')
+
+
+class _Memo:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, RawJSON]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, build: Callable[[], RawJSON]) -> RawJSON:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+        if value is not None:
+            _memo_total.inc(labels={'result': 'hit'})
+            return value
+        _memo_total.inc(labels={'result': 'miss'})
+        value = build()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_memo = _Memo(_MAX_MEMO_ENTRIES)
+
+
+def memoized(key: Hashable, build: Callable[[], RawJSON], version: Any) -> RawJSON:
+    """build()'s payload for this row version; rows without a version yet (unflushed) are not memoized."""
+    if version is None:
+        return build()
+    return _memo.get((key, version), build)
+
+
+def clear_memo() -> None:
+    _memo.clear()
+
+
+def json_response(payload: RawJSON, status: int = 200) -> Response:
+    """The {'success': true, 'data': ...} response for an encoded payload."""
+    return Response(b'{"success":true,"data":' + payload.data + b'}', status=status, mimetype='application/json')
+
+
+# Socket.IO's json module interface: packets are encoded with dumps(), so
+# RawJSON arguments and dict values go out as they are
+
+def dumps(obj: Any, **kwargs) -> str:
+    if isinstance(obj, RawJSON):
+        return obj.data.decode('utf-8')
+    item_separator, key_separator = kwargs.get('separators') or (', ', ': ')
+    if isinstance(obj, (list, tuple)) and any(isinstance(item, RawJSON) for item in obj):
+        return '[' + item_separator.join(dumps(item, **kwargs) for item in obj) + ']'
+    if isinstance(obj, dict) and any(isinstance(value, RawJSON) for value in obj.values()):
+        return '{' + item_separator.join(json.dumps(str(name)) + key_separator + dumps(value, **kwargs)
+                                         for name, value in obj.items()) + '}'
+    return json.dumps(obj, **kwargs)
+
+
+def loads(s, **kwargs) -> Any:
+    return json.loads(s, **kwargs)
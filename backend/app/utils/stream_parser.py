@@ -0,0 +1,90 @@
+"""
+Incremental parsing of streamed JSON.
+
+Structured output arrives from the Messages API as `input_json_delta`
+fragments of a tool call's input. JSONArrayStreamParser scans those
+fragments as they arrive and hands back each element of the first JSON
+array in the document (e.g. the "steps" list of {"steps": [...]}) as soon as
+that element's closing bracket is seen, without waiting for the rest.
+"""
+
+import json
+from typing import Any, List, Optional, Tuple
+
+
+class JSONArrayStreamParser:
+    """Yields completed elements of the first array in a streamed JSON document.
+
+    feed() returns (index, element) pairs; element is None when that element
+    was complete but not valid JSON, so callers can retry just that one.
+    Only the text of the element currently being read is kept in memory.
+    """
+
+    def __init__(self):
+        self._text = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._array_depth: Optional[int] = None
+        self._element_start: Optional[int] = None
+        self._next_index = 0
+        self.closed = False
+
+    @property
+    def elements_seen(self) -> int:
+        return self._next_index
+
+    def feed(self, chunk: str) -> List[Tuple[int, Any]]:
+        if self.closed or not chunk:
+            return []
+        self._text += chunk
+        completed = []
+        text = self._text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._depth += 1
+                if self._array_depth is None:
+                    if ch == '[':
+                        self._array_depth = self._depth
+                elif self._depth == self._array_depth + 1 and self._element_start is None:
+                    self._element_start = i
+            elif ch in '}]':
+                if (self._array_depth is not None and self._depth == self._array_depth + 1
+                        and self._element_start is not None):
+                    completed.append((self._next_index, self._decode(text[self._element_start:i + 1])))
+                    self._next_index += 1
+                    self._element_start = None
+                elif ch == ']' and self._depth == self._array_depth:
+                    self.closed = True
+                    break
+                self._depth -= 1
+
+        # Drop text that can no longer be part of an element
+        if self._element_start is None:
+            self._text = ''
+            self._pos = 0
+        else:
+            self._text = text[self._element_start:]
+            self._pos = len(self._text)
+            self._element_start = 0
+        return completed
+
+    @staticmethod
+    def _decode(raw: str) -> Any:
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
@@ -0,0 +1,150 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from flask import g, has_app_context
+
+# Number of recent samples kept per stage for percentile queries
+DEFAULT_WINDOW = 1000
+
+
+class RollingPercentiles:
+    """Fixed-size window of recent samples with percentile queries."""
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.total_count = 0
+
+    def add(self, value: float) -> None:
+        with self._lock:
+            self._samples.append(value)
+            self.total_count += 1
+
+    def summary(self) -> Dict[str, float]:
+        with self._lock:
+            samples = sorted(self._samples)
+            total_count = self.total_count
+        if not samples:
+            return {'count': total_count, 'window': 0}
+
+        def pct(p):
+            index = min(len(samples) - 1, max(0, int(round(p / 100.0 * len(samples))) - 1))
+            return round(samples[index], 3)
+
+        return {
+            'count': total_count,
+            'window': len(samples),
+            'p50': pct(50),
+            'p95': pct(95),
+            'p99': pct(99),
+            'max': round(samples[-1], 3),
+            'mean': round(sum(samples) / len(samples), 3)
+        }
+
+
+class StageStats:
+    """Rolling per-stage latency (ms) for each instrumented route."""
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self.window = window
+        self._stats: Dict[str, Dict[str, RollingPercentiles]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, stages: Dict[str, float]) -> None:
+        with self._lock:
+            route_stats = self._stats.setdefault(route, {})
+            for stage in stages:
+                if stage not in route_stats:
+                    route_stats[stage] = RollingPercentiles(self.window)
+        for stage, duration_ms in stages.items():
+            route_stats[stage].add(duration_ms)
+
+    def summary(self, route: Optional[str] = None) -> Dict[str, Dict[str, Dict[str, float]]]:
+        with self._lock:
+            routes = {name: dict(stats) for name, stats in self._stats.items() if route is None or name == route}
+        return {
+            name: {stage: stats.summary() for stage, stats in stages.items()}
+            for name, stages in routes.items()
+        }
+
+
+class RequestTimer:
+    """Collects stage durations for a single request."""
+
+    def __init__(self, route: str):
+        self.route = route
+        self.stages: Dict[str, float] = {}
+        self._order: List[str] = []
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name: str, duration_ms: float) -> None:
+        # Repeated stages (e.g. several commits) are summed
+        if name not in self.stages:
+            self._order.append(name)
+            self.stages[name] = 0.0
+        self.stages[name] += duration_ms
+
+    def finish(self) -> Dict[str, float]:
+        self.add('total', (time.perf_counter() - self._start) * 1000)
+        return self.stages
+
+    def server_timing_header(self) -> str:
+        return ', '.join(f"{name};dur={self.stages[name]:.2f}" for name in self._order)
+
+
+# Shared stats used by the admin timings endpoint
+stage_stats = StageStats()
+
+
+def start_request_timer(route: str) -> RequestTimer:
+    """Start timing the current request; the after_request hook reports it."""
+    timer = RequestTimer(route)
+    g.request_timer = timer
+    return timer
+
+
+def get_request_timer() -> Optional[RequestTimer]:
+    if not has_app_context():
+        return None
+    return g.get('request_timer')
+
+
+@contextmanager
+def stage(name: str):
+    """Time a stage of the current request; a no-op outside timed requests."""
+    timer = get_request_timer()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+
+def record_stage(name: str, start: float) -> None:
+    """Record a stage that started at perf_counter() value `start`."""
+    timer = get_request_timer()
+    if timer is not None:
+        timer.add(name, (time.perf_counter() - start) * 1000)
+
+
+def finish_request_timer(response):
+    """after_request hook: attach Server-Timing and feed the rolling stats."""
+    timer = get_request_timer()
+    if timer is None:
+        return response
+    g.request_timer = None
+    timer.finish()
+    response.headers['Server-Timing'] = timer.server_timing_header()
+    stage_stats.record(timer.route, timer.stages)
+    return response
@@ -0,0 +1,118 @@
+import time
+import uuid
+import logging
+import functools
+import inspect
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Number of finished spans kept in memory for inspection
+MAX_FINISHED_SPANS = 1000
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+_finished_spans = deque(maxlen=MAX_FINISHED_SPANS)
+_finished_lock = threading.Lock()
+
+
+class Span:
+    """A timed unit of work, modelled on OpenTelemetry spans.
+
+    Spans opened while another span is active become its children and share
+    its trace_id, so a tool call nests under the chat request that caused it.
+    """
+
+    def __init__(self, name: str, parent: Optional['Span'] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.status = 'ok'
+        self.error: Optional[str] = None
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration: Optional[float] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: Exception) -> None:
+        self.status = 'error'
+        self.error = str(error)
+
+    def end(self) -> None:
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'parentId': self.parent_id,
+            'startTime': self.start_time,
+            'durationMs': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'status': self.status,
+            'error': self.error,
+            'attributes': self.attributes
+        }
+
+
+def get_current_span() -> Optional[Span]:
+    """Return the innermost active span, if any."""
+    return _current_span.get()
+
+
+@contextmanager
+def start_span(name: str, **attributes):
+    """Open a span as a child of the current span.
+
+    Usage:
+        with start_span('tool.generate_sequence', tool='generate_sequence') as span:
+            ...
+    """
+    span = Span(name, parent=_current_span.get(), attributes=attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except Exception as e:
+        span.record_error(e)
+        raise
+    finally:
+        span.end()
+        _current_span.reset(token)
+        with _finished_lock:
+            _finished_spans.append(span)
+        logger.debug(f"span {span.name} trace={span.trace_id} duration={span.duration:.4f}s status={span.status}")
+
+
+def traced(name: str):
+    """Decorator that runs a sync or async function inside a span."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with start_span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_finished_spans(trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Return recently finished spans, optionally filtered by trace."""
+    with _finished_lock:
+        spans = list(_finished_spans)
+    if trace_id:
+        spans = [s for s in spans if s.trace_id == trace_id]
+    return [s.to_dict() for s in spans]
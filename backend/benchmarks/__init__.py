@@ -0,0 +1,4 @@
+"""
+Offline benchmark and load-test tooling.
+Everything here runs against local stand-ins (SQLite, fake Anthropic server).
+"""
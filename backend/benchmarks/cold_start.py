@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Measure worker cold-start time: a fresh interpreter importing the WSGI entry
+point, through to the first successful /api/health request.
+
+Each run is a separate subprocess, so import caches and pooled connections
+start cold every time. Compare the development path (app.py with create_all)
+against the production path (wsgi.py):
+
+    python benchmarks/cold_start.py --runs 10
+"""
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Runs inside the child interpreter; prints timings as JSON
+CHILD_SCRIPT = r"""
+import sys, time, json, importlib.util
+start = time.perf_counter()
+entry = sys.argv[1]
+spec = importlib.util.spec_from_file_location('entry_module', entry)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+loaded = time.perf_counter()
+response = module.app.test_client().get('/api/health')
+assert response.status_code == 200
+first = time.perf_counter()
+print(json.dumps({
+    'import_ms': (loaded - start) * 1000,
+    'first_request_ms': (first - loaded) * 1000,
+    'total_ms': (first - start) * 1000,
+    'anthropic_imported': 'anthropic' in sys.modules
+}))
+"""
+
+
+def measure(entry: str, env: dict, runs: int):
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-c', CHILD_SCRIPT, os.path.join(BACKEND_DIR, entry)],
+                                cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    totals = [s['total_ms'] for s in samples]
+    return {
+        'entry': entry,
+        'runs': runs,
+        'total_ms_median': round(statistics.median(totals), 1),
+        'total_ms_min': round(min(totals), 1),
+        'import_ms_median': round(statistics.median(s['import_ms'] for s in samples), 1),
+        'first_request_ms_median': round(statistics.median(s['first_request_ms'] for s in samples), 1),
+        'anthropic_imported_at_startup': samples[-1]['anthropic_imported']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure worker cold-start time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--database-uri", default=None, help="Defaults to a temporary SQLite file")
+    parser.add_argument("--prewarm", type=int, default=0, help="DB_POOL_PREWARM for the wsgi.py path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_uri = args.database_uri or f"sqlite:///{os.path.join(tmp, 'cold_start.db')}"
+        base_env = dict(os.environ, SQLALCHEMY_DATABASE_URI=database_uri)
+        report = [
+            measure('app.py', dict(base_env, DB_CREATE_ALL='true'), args.runs),
+            measure('wsgi.py', dict(base_env, DB_POOL_PREWARM=str(args.prewarm)), args.runs)
+        ]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
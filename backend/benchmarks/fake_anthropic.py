@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Anthropic Messages API used by the benchmarks.
+
+Requests with "stream": true are answered as server-sent events, with
+deltas paced at tokens_per_sec. Forced emit_sequence / emit_step /
+emit_outline tool calls (structured sequence generation) return tool_use
+blocks sized to the "N-step" count in the prompt.
+
+Responses are deterministic for a given seed: latency, token counts,
+tool_use decisions and injected errors all come from an RNG seeded with the
+seed and a hash of the request body, so concurrent runs with the same
+settings see the same behaviour regardless of arrival order.
+
+Run standalone:
+    python benchmarks/fake_anthropic.py --port 8089 --latency-ms 300 --tokens-per-sec 80
+and point the backend at it with ANTHROPIC_BASE_URL=http://127.0.0.1:8089
+"""
+
+import re
+import json
+import time
+import hashlib
+import random
+import argparse
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class FakeAnthropicConfig:
+    latency_ms: float = 200.0        # Time to first token
+    jitter_ms: float = 50.0          # +/- uniform jitter on latency
+    tokens_per_sec: float = 0.0      # Output token rate; 0 disables generation delay
+    output_tokens: int = 120         # Output tokens reported for chat replies
+    tool_use_rate: float = 0.0       # Share of tool-enabled chat turns answered with tool_use
+    error_rate: float = 0.0          # Share of requests answered with an injected error
+    error_status: int = 529          # 529 overloaded_error by default
+    steps: int = 3                   # Steps returned when the prompt doesn't ask for a count
+    malformed_step_rate: float = 0.0 # Share of streamed sequence steps sent as invalid JSON
+    chunk_chars: int = 24            # Characters per streamed delta
+    seed: int = 42
+
+
+class FakeAnthropicServer:
+    """Threaded HTTP server implementing POST /v1/messages."""
+
+    def __init__(self, config: Optional[FakeAnthropicConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.config = config or FakeAnthropicConfig()
+        self._lock = threading.Lock()
+        self.request_count = 0
+        self.error_count = 0
+        self.tool_use_count = 0
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeAnthropicServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _rng_for(self, raw_body: bytes) -> random.Random:
+        # One RNG per request, derived from the seed and the request content
+        with self._lock:
+            self.request_count += 1
+        digest = hashlib.sha256(raw_body).digest()
+        return random.Random(self.config.seed * 1_000_003 + int.from_bytes(digest[:8], 'big'))
+
+    def build_response(self, body: Dict[str, Any], rng: random.Random):
+        """Return (status, payload, output_tokens) for a Messages API request body."""
+        config = self.config
+        if config.error_rate and rng.random() < config.error_rate:
+            with self._lock:
+                self.error_count += 1
+            error_type = 'overloaded_error' if config.error_status == 529 else 'api_error'
+            return config.error_status, {
+                'type': 'error',
+                'error': {'type': error_type, 'message': 'Injected error from fake Anthropic server'}
+            }, 0
+
+        messages = body.get('messages', [])
+        last = messages[-1]['content'] if messages else ''
+        if isinstance(last, list):
+            last = ' '.join(block.get('text', '') for block in last if isinstance(block, dict))
+        input_tokens = _estimate_tokens(json.dumps(body.get('system', ''))) + _estimate_tokens(json.dumps(messages))
+
+        content: List[Dict[str, Any]]
+        stop_reason = 'end_turn'
+        forced_tool = (body.get('tool_choice') or {}).get('name')
+        match = _STEP_COUNT_RE.search(json.dumps(messages))
+        step_count = int(match.group(1)) if match else config.steps
+        if forced_tool == 'emit_sequence':
+            steps = [_fake_step(i) for i in range(step_count)]
+            content = [{'type': 'tool_use', 'id': f"toolu_{rng.getrandbits(48):012x}", 'name': forced_tool,
+                        'input': {'steps': steps}}]
+            stop_reason = 'tool_use'
+            output_tokens = config.output_tokens * step_count
+        elif forced_tool == 'emit_outline':
+            outline = [{'title': f"Step {i + 1}", 'brief': f"Angle {i + 1} for the role, with a clear ask."}
+                       for i in range(step_count)]
+            content = [{'type': 'tool_use', 'id': f"toolu_{rng.getrandbits(48):012x}", 'name': forced_tool,
+                        'input': {'steps': outline}}]
+            stop_reason = 'tool_use'
+            output_tokens = 25 * step_count
+        elif forced_tool == 'emit_step':
+            content = [{'type': 'tool_use', 'id': f"toolu_{rng.getrandbits(48):012x}", 'name': forced_tool,
+                        'input': _fake_step(rng.randint(0, 9))}]
+            stop_reason = 'tool_use'
+            output_tokens = config.output_tokens
+        elif 'recruiting outreach sequence' in last:
+            content = [{'type': 'text', 'text': json.dumps([_fake_step(i) for i in range(step_count)])}]
+            output_tokens = config.output_tokens * step_count
+        elif body.get('tools') and config.tool_use_rate and rng.random() < config.tool_use_rate:
+            with self._lock:
+                self.tool_use_count += 1
+            content = [
+                {'type': 'text', 'text': "I'll create that sequence for you now."},
+                {'type': 'tool_use', 'id': f"toolu_{rng.getrandbits(48):012x}", 'name': 'generate_sequence',
+                 'input': {'position': 'Software Engineer', 'additional_info': 'Benchmark run'}}
+            ]
+            stop_reason = 'tool_use'
+            output_tokens = 40
+        else:
+            content = [{'type': 'text', 'text': "Happy to help with your recruiting. " * 4}]
+            output_tokens = config.output_tokens
+
+        return 200, {
+            'id': f"msg_{rng.getrandbits(64):016x}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': body.get('model', 'fake-model'),
+            'content': content,
+            'stop_reason': stop_reason,
+            'stop_sequence': None,
+            'usage': {'input_tokens': input_tokens, 'output_tokens': output_tokens}
+        }, output_tokens
+
+    def stream_tool_input(self, tool_input: Dict[str, Any], rng: random.Random) -> str:
+        """Serialize tool input for streaming, corrupting some steps when malformed_step_rate is set."""
+        if 'steps' not in tool_input or not self.config.malformed_step_rate:
+            return json.dumps(tool_input)
+        parts = []
+        for step in tool_input['steps']:
+            encoded = json.dumps(step)
+            if rng.random() < self.config.malformed_step_rate:
+                # Unquoted key: still bracket-balanced, but not valid JSON
+                encoded = encoded.replace('"title"', 'title', 1)
+            parts.append(encoded)
+        return '{"steps": [' + ', '.join(parts) + ']}'
+
+    def _delay(self, rng: random.Random, output_tokens: int) -> float:
+        config = self.config
+        delay = config.latency_ms + rng.uniform(-config.jitter_ms, config.jitter_ms)
+        if config.tokens_per_sec > 0:
+            delay += output_tokens / config.tokens_per_sec * 1000
+        return max(0.0, delay) / 1000
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                if not self.path.rstrip('/').endswith('/v1/messages'):
+                    self._send(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': self.path}})
+                    return
+                length = int(self.headers.get('Content-Length', 0))
+                raw_body = self.rfile.read(length) or b'{}'
+                body = json.loads(raw_body)
+                rng = server._rng_for(raw_body)
+                status, payload, output_tokens = server.build_response(body, rng)
+                if body.get('stream') and status == 200:
+                    self._send_stream(payload, rng)
+                    return
+                time.sleep(server._delay(rng, output_tokens))
+                self._send(status, payload)
+
+            def _send_stream(self, payload, rng):
+                """Send the message as server-sent events, pacing deltas at tokens_per_sec."""
+                config = server.config
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                time.sleep(server._delay(rng, 0))
+
+                usage = payload['usage']
+                self._event('message_start', {'type': 'message_start', 'message': {
+                    **payload, 'content': [], 'stop_reason': None,
+                    'usage': {'input_tokens': usage['input_tokens'], 'output_tokens': 1}}})
+                for index, block in enumerate(payload['content']):
+                    if block['type'] == 'tool_use':
+                        text = server.stream_tool_input(block['input'], rng)
+                        start_block = {**block, 'input': {}}
+                        delta_type, delta_key = 'input_json_delta', 'partial_json'
+                    else:
+                        text = block['text']
+                        start_block = {'type': 'text', 'text': ''}
+                        delta_type, delta_key = 'text_delta', 'text'
+                    self._event('content_block_start', {'type': 'content_block_start', 'index': index,
+                                                        'content_block': start_block})
+                    for offset in range(0, len(text), config.chunk_chars):
+                        chunk = text[offset:offset + config.chunk_chars]
+                        if config.tokens_per_sec > 0:
+                            time.sleep(_estimate_tokens(chunk) / config.tokens_per_sec)
+                        self._event('content_block_delta', {'type': 'content_block_delta', 'index': index,
+                                                            'delta': {'type': delta_type, delta_key: chunk}})
+                    self._event('content_block_stop', {'type': 'content_block_stop', 'index': index})
+                self._event('message_delta', {'type': 'message_delta',
+                                              'delta': {'stop_reason': payload['stop_reason'], 'stop_sequence': None},
+                                              'usage': {'output_tokens': usage['output_tokens']}})
+                self._event('message_stop', {'type': 'message_stop'})
+
+            def _event(self, name, data):
+                self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+_STEP_COUNT_RE = re.compile(r'Create a (\d+)-step')
+
+
+def _fake_step(i: int) -> Dict[str, str]:
+    return {'title': f"Step {i + 1}", 'content': f"Hi [CANDIDATE_NAME], message {i + 1} for the role. " * 8}
+
+
+def _estimate_tokens(text: str) -> int:
+    # Rough 4-characters-per-token estimate; good enough for a stand-in
+    return max(1, len(text) // 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake Anthropic Messages API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0)
+    parser.add_argument("--tool-use-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=529)
+    parser.add_argument("--malformed-step-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    config = FakeAnthropicConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, tokens_per_sec=args.tokens_per_sec,
+        tool_use_rate=args.tool_use_rate, error_rate=args.error_rate, error_status=args.error_status,
+        malformed_step_rate=args.malformed_step_rate, seed=args.seed
+    )
+    server = FakeAnthropicServer(config, host=args.host, port=args.port)
+    print(f"Fake Anthropic API listening on {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Offline load test for the chat, sequence and history endpoints.
+
+Runs the Flask app in-process against a throwaway SQLite database and a
+local fake Anthropic server, so no network access or API key is needed.
+Each virtual user is driven by exactly one worker thread and the fake server
+seeds its RNG from the request body, so repeated runs with the same options
+issue the same requests and get the same responses.
+
+Usage:
+    python benchmarks/load_test.py --users 8 --requests 20 --latency-ms 150
+    python benchmarks/load_test.py --scenario chat --tool-use-rate 0.2 --output bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import threading
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fake_anthropic import FakeAnthropicConfig, FakeAnthropicServer
+
+SCENARIOS = ('chat', 'sequence', 'history')
+
+POSITIONS = ['Backend Engineer', 'Product Designer', 'Data Scientist', 'Engineering Manager', 'SRE']
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class QueryCounter:
+    """Counts SQL statements executed on an engine."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        with self._lock:
+            self.count += 1
+
+    def reset(self) -> int:
+        with self._lock:
+            count, self.count = self.count, 0
+        return count
+
+
+def build_app(database_uri: str, fake_base_url: str, config: Dict[str, Any] = None):
+    import anthropic
+    from app import create_app
+    from app.database.db import db
+    from app.services.ai_service import AIService
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_uri,
+        'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 30}} if database_uri.startswith('sqlite') else {},
+        'ANTHROPIC_API_KEY': 'benchmark-key',
+        'TESTING': True,
+        **(config or {})
+    })
+    with app.app_context():
+        from app import models  # noqa: F401 - register models
+        db.create_all()
+        engine = db.engine
+
+    # Point the shared AIService at the fake server; retries would blur the numbers
+    ai_service = AIService.get_instance(api_key='benchmark-key')
+    ai_service.client = anthropic.Anthropic(api_key='benchmark-key', base_url=fake_base_url, max_retries=0)
+    return app, engine
+
+
+def build_plan(scenario: str, users: int, requests_per_user: int, seed: int,
+               step_count: int = None) -> Dict[str, List[Dict[str, Any]]]:
+    """Build the deterministic request list for each virtual user."""
+    rng = random.Random(seed)
+    plan = {}
+    for u in range(users):
+        user_id = f"bench-user-{u}"
+        calls = []
+        for i in range(requests_per_user):
+            if scenario == 'chat':
+                calls.append({'method': 'POST', 'path': '/api/chat/message',
+                              'json': {'userId': user_id, 'message': f"Turn {i}: help me recruit a {rng.choice(POSITIONS)}"}})
+            elif scenario == 'sequence':
+                position = rng.choice(POSITIONS)
+                calls.append({'method': 'POST', 'path': '/api/sequences/generate',
+                              'json': {'userId': user_id, 'title': f"{position} outreach {i}", 'position': position,
+                                       'additionalInfo': f"Benchmark variant {rng.randint(0, 999)}",
+                                       'stepCount': step_count}})
+            else:
+                calls.append({'method': 'GET', 'path': f"/api/chat/history/{user_id}?limit=20"})
+        plan[user_id] = calls
+    return plan
+
+
+def seed_history(app, users: int, messages_per_user: int) -> None:
+    """Insert chat history so the history scenario has rows to read."""
+    from app.database.db import db
+    from app.models import User, ChatMessage
+    with app.app_context():
+        for u in range(users):
+            user_id = f"bench-user-{u}"
+            if not db.session.get(User, user_id):
+                db.session.add(User(id=user_id, email=f"{user_id}@example.com", name="Bench User"))
+            for i in range(messages_per_user):
+                db.session.add(ChatMessage(user_id=user_id, role='user' if i % 2 == 0 else 'assistant',
+                                           content=f"Seeded message {i}"))
+        db.session.commit()
+
+
+def run_scenario(app, query_counter: QueryCounter, scenario: str, users: int, requests_per_user: int,
+                 concurrency: int, seed: int, step_count: int = None) -> Dict[str, Any]:
+    plan = build_plan(scenario, users, requests_per_user, seed, step_count)
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    lock = threading.Lock()
+
+    def drive_user(calls):
+        client = app.test_client()
+        for call in calls:
+            start = time.perf_counter()
+            if call['method'] == 'POST':
+                response = client.post(call['path'], json=call['json'])
+            else:
+                response = client.get(call['path'])
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    query_counter.reset()
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(drive_user, plan.values()))
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    queries = query_counter.reset()
+
+    total = len(latencies)
+    return {
+        'scenario': scenario,
+        'requests': total,
+        'concurrency': concurrency,
+        'wall_seconds': round(wall, 3),
+        'throughput_rps': round(total / wall, 2) if wall else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'max': round(max(latencies), 2) if latencies else 0.0
+        },
+        'status_codes': {str(k): v for k, v in sorted(statuses.items())},
+        'db_queries': queries,
+        'db_queries_per_request': round(queries / total, 2) if total else 0.0,
+        'python_alloc_peak_kb': round(peak / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test with a fake Anthropic server")
+    parser.add_argument("--scenario", choices=SCENARIOS + ('all',), default='all')
+    parser.add_argument("--users", type=int, default=8, help="Virtual users (one worker thread each)")
+    parser.add_argument("--requests", type=int, default=10, help="Requests per virtual user")
+    parser.add_argument("--concurrency", type=int, default=None, help="Worker threads (default: --users)")
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=0.0)
+    parser.add_argument("--tool-use-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-step-rate", type=float, default=0.0,
+                        help="Share of streamed sequence steps the fake server corrupts")
+    parser.add_argument("--step-count", type=int, default=None, help="Steps per generated sequence")
+    parser.add_argument("--generation-mode", choices=('auto', 'stream', 'outline'), default=None,
+                        help="Override SEQUENCE_GENERATION_MODE")
+    parser.add_argument("--history-rows", type=int, default=200, help="Seeded messages per user for 'history'")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-uri", default=None, help="Defaults to a temporary SQLite file")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    fake_config = FakeAnthropicConfig(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, tokens_per_sec=args.tokens_per_sec,
+        tool_use_rate=args.tool_use_rate, error_rate=args.error_rate,
+        malformed_step_rate=args.malformed_step_rate, seed=args.seed
+    )
+    scenarios = SCENARIOS if args.scenario == 'all' else (args.scenario,)
+    concurrency = args.concurrency or args.users
+
+    with tempfile.TemporaryDirectory() as tmp, FakeAnthropicServer(fake_config) as fake:
+        database_uri = args.database_uri or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        app_config = {'SEQUENCE_GENERATION_MODE': args.generation_mode} if args.generation_mode else {}
+        app, engine = build_app(database_uri, fake.base_url, app_config)
+        query_counter = QueryCounter(engine)
+        if 'history' in scenarios:
+            seed_history(app, args.users, args.history_rows)
+
+        results = [
+            run_scenario(app, query_counter, scenario, args.users, args.requests, concurrency, args.seed,
+                         args.step_count)
+            for scenario in scenarios
+        ]
+        from app.utils.metrics import registry
+        first_step = registry.histogram('helix_sequence_first_step_seconds', '')
+        step_retries = registry.counter('helix_sequence_step_retries_total', '')
+        first_step_count = sum(first_step.get_count({'mode': mode}) for mode in ('stream', 'outline'))
+        first_step_sum = sum(first_step.get_sum({'mode': mode}) for mode in ('stream', 'outline'))
+        report = {
+            'config': {**vars(args), 'concurrency': concurrency},
+            'fake_anthropic': {
+                'requests': fake.request_count,
+                'injected_errors': fake.error_count,
+                'tool_use_responses': fake.tool_use_count
+            },
+            'sequence_generation': {
+                'first_step_avg_ms': round(first_step_sum / first_step_count * 1000, 2)
+                if first_step_count else None,
+                'step_retries': step_retries.get({'outcome': 'success'}) + step_retries.get({'outcome': 'failure'})
+            },
+            'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'results': results
+        }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Mail-merge benchmark.
+
+Writes a synthetic candidate list (CSV or JSONL) to a temporary file and
+personalizes a 3-step sequence for every candidate through MergeJob, the
+same path /api/sequences/<id>/personalize streams. Reports candidates per
+second and peak RSS, and the same run with a per-candidate regex
+substitution for comparison:
+
+    python benchmarks/merge_bench.py --candidates 100000
+    python benchmarks/merge_bench.py --candidates 100000 --input-format jsonl --output-format csv
+"""
+
+import os
+import re
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+from typing import Any, Dict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services.personalization_service import MergeJob, read_candidates
+
+FIRST_NAMES = ['Ana', 'Ben', 'Chen', 'Dara', 'Eli', 'Farah', 'Gus', 'Hana', 'Ivan', 'Jo']
+COMPANIES = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Vandelay', 'Stark', 'Wayne']
+SKILLS = ['Go', 'Python', 'Kubernetes', 'React', 'Postgres', 'Rust', 'Terraform', 'Kafka']
+
+STEPS = [
+    {'order': 0, 'title': 'Quick question, [CANDIDATE_NAME]',
+     'content': "Hi [CANDIDATE_NAME],\n\nI came across your work at [CURRENT_COMPANY] and your experience with "
+                "[TOP_SKILL] stood out. We're hiring a [POSITION] at [COMPANY_NAME] and the team leans heavily on "
+                "[TOP_SKILL] for our platform work. " + "Filler sentence about the role and the team. " * 8 +
+                "\n\nWould you be open to a 15 minute chat?\n\nBest,\n[RECRUITER_NAME]"},
+    {'order': 1, 'title': 'Re: Quick question, [CANDIDATE_NAME]',
+     'content': "Hi [CANDIDATE_NAME], following up on my note about the [POSITION] role. "
+                + "A different angle on why the role is interesting. " * 6 + "\n\n[RECRUITER_NAME]"},
+    {'order': 2, 'title': 'Last note',
+     'content': "[CANDIDATE_NAME], I'll close the loop here - if [CURRENT_COMPANY] ever feels too small, "
+                "my door is open. " + "Closing remarks. " * 5 + "\n\n[RECRUITER_NAME], [COMPANY_NAME]"},
+]
+
+DEFAULTS = {'POSITION': 'Staff Engineer', 'COMPANY_NAME': 'Helix', 'RECRUITER_NAME': 'Sam'}
+
+
+def write_candidates(path: str, count: int, input_format: str, seed: int) -> None:
+    rng = random.Random(seed)
+    columns = ['email', 'name', 'current_company', 'top_skill', 'location']
+    with open(path, 'w', encoding='utf-8', newline='') as out:
+        writer = csv.writer(out) if input_format == 'csv' else None
+        if writer:
+            writer.writerow(columns)
+        for i in range(count):
+            # About 1% of candidates have no skill listed
+            row = [f'candidate{i}@example.com', f'{rng.choice(FIRST_NAMES)} {i}', rng.choice(COMPANIES),
+                   '' if rng.random() < 0.01 else rng.choice(SKILLS), 'Remote']
+            if writer:
+                writer.writerow(row)
+            else:
+                out.write(json.dumps(dict(zip(columns, row))) + '\n')
+
+
+def run_compiled(path: str, args) -> Dict[str, Any]:
+    start = time.perf_counter()
+    with open(path, 'rb') as stream:
+        columns, rows = read_candidates(stream, args.input_format)
+        job = MergeJob(STEPS, columns, rows, DEFAULTS, skip_incomplete=args.skip_incomplete)
+        written = sum(len(chunk) for chunk in job.render(args.output_format))
+    seconds = time.perf_counter() - start
+    return {
+        'seconds': round(seconds, 3),
+        'candidates_per_second': round((job.rendered + job.skipped) / seconds),
+        'rendered': job.rendered,
+        'skipped': job.skipped,
+        'output_mb': round(written / 1e6, 1)
+    }
+
+
+def run_naive(path: str, args) -> Dict[str, Any]:
+    """Regex substitution per step and candidate, as a baseline."""
+    pattern = re.compile(r'\[([A-Z][A-Z0-9_]*)\]')
+    start = time.perf_counter()
+    count = 0
+    written = 0
+    with open(path, encoding='utf-8', newline='') as text:
+        if args.input_format == 'csv':
+            reader = csv.DictReader(text)
+        else:
+            reader = (json.loads(line) for line in text)
+        for record in reader:
+            values = dict(DEFAULTS)
+            values.update((key.upper(), value) for key, value in record.items())
+            values['CANDIDATE_NAME'] = record['name']
+            lookup = lambda match: str(values.get(match.group(1), ''))
+            steps = [{'order': step['order'], 'title': pattern.sub(lookup, step['title']),
+                      'content': pattern.sub(lookup, step['content'])} for step in STEPS]
+            written += len(json.dumps({'candidate': record, 'steps': steps}))
+            count += 1
+    seconds = time.perf_counter() - start
+    return {'seconds': round(seconds, 3), 'candidates_per_second': round(count / seconds),
+            'output_mb': round(written / 1e6, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mail-merge personalization")
+    parser.add_argument("--candidates", type=int, default=100000)
+    parser.add_argument("--input-format", choices=('csv', 'jsonl'), default='csv')
+    parser.add_argument("--output-format", choices=('jsonl', 'csv'), default='jsonl')
+    parser.add_argument("--skip-incomplete", action='store_true')
+    parser.add_argument("--no-baseline", action='store_true', help="Skip the regex baseline run")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f'candidates.{args.input_format}')
+        write_candidates(path, args.candidates, args.input_format, args.seed)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        compiled = run_compiled(path, args)
+        # ru_maxrss is in KB on Linux
+        compiled['peak_rss_growth_mb'] = round(
+            (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024, 1)
+        result = {'config': vars(args), 'compiled': compiled}
+        if not args.no_baseline:
+            result['regex_baseline'] = run_naive(path, args)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Read-replica routing check.
+
+Runs the app in-process against a primary and two replicas, all local
+SQLite files. Replication is simulated: the script copies the primary
+into replica0 when it wants the replica to catch up, so data written after
+a copy is visible on the primary only, which shows where each read went.
+replica1's URI can't be opened, standing in for a replica that is down, and
+replica0 reports its lag through REPLICA_LAG_QUERY from a heartbeat-style
+table the script controls. Checks:
+
+- a GET of a sequence is served by the replica
+- right after a client updates that sequence, reads of it come from the
+  primary (read-your-writes): all of that client's reads, through its
+  last-write cookie, also on a second app instance standing in for another
+  worker; other clients' reads of that sequence in the same process; while
+  other clients' reads of other sequences still use the replica
+- once the sticky window has passed, reads go back to the replica
+- a replica lagging more than REPLICA_MAX_LAG_SECONDS is skipped
+- the unreachable replica is never used
+
+    python benchmarks/replica_check.py
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+STICKY_SECONDS = 0.5
+
+
+def replicate(primary_path: str, replica_path: str, lag_seconds: float = 0.0) -> None:
+    """Bring the replica up to date with the primary and set the lag it reports."""
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path)
+    source.backup(target)
+    source.close()
+    set_lag(replica_path, lag_seconds)
+    target.close()
+
+
+def set_lag(replica_path: str, lag_seconds: float) -> None:
+    conn = sqlite3.connect(replica_path)
+    conn.execute("CREATE TABLE IF NOT EXISTS replica_status (lag_seconds FLOAT)")
+    conn.execute("DELETE FROM replica_status")
+    conn.execute("INSERT INTO replica_status VALUES (?)", (lag_seconds,))
+    conn.commit()
+    conn.close()
+
+
+def main():
+    from app import create_app
+    from app.database.db import db
+    from app.models import Sequence, SequenceStep, User
+
+    failures = []
+
+    def check(name: str, condition: bool, detail: str = '') -> None:
+        print(f"{'PASS' if condition else 'FAIL'}  {name}{f' ({detail})' if detail else ''}")
+        if not condition:
+            failures.append(name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        primary = os.path.join(tmp, 'primary.db')
+        replica = os.path.join(tmp, 'replica0.db')
+        config = {
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{primary}",
+            'SQLALCHEMY_REPLICA_URIS': [f"sqlite:///{replica}", f"sqlite:///{tmp}/missing/replica1.db"],
+            'REPLICA_LAG_QUERY': 'SELECT lag_seconds FROM replica_status',
+            'REPLICA_LAG_CHECK_SECONDS': 0,
+            'REPLICA_STICKY_SECONDS': STICKY_SECONDS,
+            'REPLICA_MAX_LAG_SECONDS': 5,
+            'SEQUENCE_REUSE_ENABLED': False,
+            # Reads must reach the database to show where they went
+            'SEQUENCE_CACHE_BACKEND': 'none',
+            'TESTING': True,
+        }
+        app = create_app(config)
+        client = app.test_client()
+        other_client = app.test_client()
+        # Another worker: its own router, so it knows only what the cookie tells it
+        other_worker = create_app(config)
+        with app.app_context():
+            from app import models  # noqa: F401 - register models
+            db.create_all()
+            db.session.add(User(id='u1', name='Sam', email='sam@example.com', company='Helix'))
+            for sequence_id in ('s1', 's2'):
+                db.session.add(Sequence(id=sequence_id, user_id='u1', title='Original', position='Engineer'))
+                db.session.add(SequenceStep(sequence_id=sequence_id, title='Hello', content='v1', order=0))
+            db.session.commit()
+        replicate(primary, replica)
+
+        def step_content(sequence_id: str, reader=None, headers=None) -> str:
+            response = (reader or client).get(f'/api/sequences/{sequence_id}', headers=headers)
+            return response.json['data']['steps'][0]['content']
+
+        # A write outside the API (no stickiness), not yet replicated: reads show the replica's v1
+        with app.app_context():
+            SequenceStep.query.filter_by(sequence_id='s2').update({'content': 'v2'})
+            db.session.commit()
+        check("sequence read is served by the replica", step_content('s2') == 'v1')
+
+        response = client.put('/api/sequences/update', json={
+            'sequenceId': 's1', 'userId': 'u1', 'steps': [{'title': 'Hello', 'content': 'v2'}]})
+        check("update succeeds", response.status_code == 200, str(response.status_code))
+        cookie = response.headers.get('Set-Cookie', '').split(';')[0]
+        check("the update sets the last-write cookie", cookie.startswith('helix_wrote_at='), cookie)
+        check("read-your-writes: the writer's sequence comes from the primary", step_content('s1') == 'v2')
+        check("the writer's other reads come from the primary", step_content('s2') == 'v2')
+        check("another worker sends the writer's reads to the primary",
+              step_content('s1', other_worker.test_client(use_cookies=False), {'Cookie': cookie}) == 'v2')
+        check("other clients read the written sequence from the primary", step_content('s1', other_client) == 'v2')
+        check("other clients' reads of other sequences still use the replica", step_content('s2', other_client) == 'v1')
+
+        time.sleep(STICKY_SECONDS + 0.1)
+        check("after the sticky window, reads use the replica again", step_content('s1') == 'v1')
+
+        set_lag(replica, 30)
+        check("a replica lagging past REPLICA_MAX_LAG_SECONDS is skipped", step_content('s2') == 'v2')
+
+        replicate(primary, replica)
+        with app.app_context():
+            SequenceStep.query.filter_by(sequence_id='s2').update({'content': 'v3'})
+            db.session.commit()
+        check("a caught-up replica is used again", step_content('s2') == 'v2')
+
+        summary = client.get('/api/admin/replicas').json['data']
+        states = {item['name']: item['healthy'] for item in summary['replicas']}
+        check("the unreachable replica is marked down", states == {'replica0': True, 'replica1': False},
+              str(states))
+        print(f"Routing: {summary['reads']}")
+
+    print(f"{len(failures)} check(s) failed" if failures else "All checks passed")
+    return not failures
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
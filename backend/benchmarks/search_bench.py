@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Sequence search benchmark.
+
+Fills a database with synthetic sequences and steps, builds the search index
+through SearchService.rebuild() and times SearchService.search() for a mix of
+single-term, multi-term and short-prefix queries against random users.
+
+    python benchmarks/search_bench.py --steps 1000000
+    python benchmarks/search_bench.py --steps 100000 --database-uri postgresql://...
+
+With --database-uri the target database must be empty (it is filled with
+benchmark rows); by default a temporary SQLite file is used.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.load_test import percentile
+
+POSITIONS = ['Backend Engineer', 'Product Designer', 'Data Scientist', 'Engineering Manager', 'SRE',
+             'Frontend Engineer', 'Recruiter', 'Sales Engineer', 'Security Engineer', 'Mobile Developer']
+
+VOCABULARY = (
+    "equity salary remote hybrid onboarding mentorship growth platform scale distributed python golang "
+    "kubernetes latency reliability roadmap customers funding series startup mission culture benefits "
+    "interview coffee chat follow reminder opportunity team leadership ownership impact product design "
+    "research analytics pipeline machine learning infrastructure security compliance mobile frontend "
+    "backend database migration observability oncall relocation visa bonus vacation flexible hours"
+).split()
+
+QUERIES = ['equity', 'backend equity', 'remote salary', 'kubernetes reliability', 'mentor', 'eq', 'onboard growth',
+           'series funding startup', 'rel', 'coffee chat']
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(VOCABULARY) for _ in range(words)).capitalize() + '.'
+
+
+def build_app(database_uri: str):
+    from app import create_app
+    from app.database.db import db
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_uri, 'TESTING': True})
+    with app.app_context():
+        from app import models  # noqa: F401 - register models
+        db.create_all()
+    return app
+
+
+def populate(app, users: int, steps: int, steps_per_sequence: int, words_per_step: int, seed: int) -> List[str]:
+    """Bulk-insert users, sequences and steps; returns the user ids."""
+    from app.database.db import db
+    from app.models import User, Sequence, SequenceStep
+
+    rng = random.Random(seed)
+    user_ids = [f"search-user-{u}" for u in range(users)]
+    sequences = steps // steps_per_sequence
+    now = datetime.utcnow()
+    batch = 5000
+
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            {'id': user_id, 'email': f"{user_id}@example.com", 'name': 'Search Bench', 'created_at': now}
+            for user_id in user_ids
+        ])
+        for start in range(0, sequences, batch):
+            sequence_rows, step_rows = [], []
+            for _ in range(min(batch, sequences - start)):
+                sequence_id = str(uuid.uuid4())
+                position = rng.choice(POSITIONS)
+                sequence_rows.append({
+                    'id': sequence_id, 'user_id': rng.choice(user_ids), 'title': f"{position} outreach",
+                    'position': position, 'additional_info': _sentence(rng, 8), 'created_at': now, 'updated_at': now
+                })
+                for order in range(steps_per_sequence):
+                    step_rows.append({
+                        'id': str(uuid.uuid4()), 'sequence_id': sequence_id, 'title': f"Step {order + 1}",
+                        'content': _sentence(rng, words_per_step), 'order': order, 'created_at': now, 'updated_at': now
+                    })
+            db.session.execute(Sequence.__table__.insert(), sequence_rows)
+            db.session.execute(SequenceStep.__table__.insert(), step_rows)
+            db.session.commit()
+    return user_ids
+
+
+def run(args) -> Dict[str, Any]:
+    from app.services.search_service import SearchService
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_uri = args.database_uri or f"sqlite:///{os.path.join(tmp, 'search_bench.db')}"
+        app = build_app(database_uri)
+
+        start = time.perf_counter()
+        user_ids = populate(app, args.users, args.steps, args.steps_per_sequence, args.words_per_step, args.seed)
+        populate_seconds = time.perf_counter() - start
+
+        with app.app_context():
+            search = SearchService.get_instance()
+            start = time.perf_counter()
+            backend = search.ensure_index()
+            indexed = search.rebuild()
+            index_seconds = time.perf_counter() - start
+
+            rng = random.Random(args.seed)
+            for _ in range(args.warmup):
+                search.search(rng.choice(user_ids), rng.choice(QUERIES))
+
+            latencies: Dict[str, List[float]] = {q: [] for q in QUERIES}
+            hits = 0
+            for _ in range(args.queries):
+                query = rng.choice(QUERIES)
+                page = 1 if rng.random() < 0.8 else 2
+                start = time.perf_counter()
+                result = search.search(rng.choice(user_ids), query, page=page, page_size=args.page_size)
+                latencies[query].append((time.perf_counter() - start) * 1000)
+                hits += len(result['results'])
+
+    all_samples = [ms for samples in latencies.values() for ms in samples]
+    return {
+        'config': vars(args),
+        'backend': backend,
+        'sequences_indexed': indexed,
+        'populate_seconds': round(populate_seconds, 2),
+        'index_build_seconds': round(index_seconds, 2),
+        'avg_results_per_query': round(hits / args.queries, 2) if args.queries else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(all_samples, 50), 3),
+            'p95': round(percentile(all_samples, 95), 3),
+            'p99': round(percentile(all_samples, 99), 3),
+            'max': round(max(all_samples), 3) if all_samples else 0.0
+        },
+        'p95_ms_by_query': {q: round(percentile(samples, 95), 3) for q, samples in latencies.items() if samples}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sequence full-text search")
+    parser.add_argument("--steps", type=int, default=1000000, help="Total sequence steps to index")
+    parser.add_argument("--steps-per-sequence", type=int, default=5)
+    parser.add_argument("--words-per-step", type=int, default=30)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-uri", default=None, help="Defaults to a temporary SQLite file")
+    args = parser.parse_args()
+    print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Send scheduler benchmark.
+
+Fills scheduled_sends with --pending sends due over the next --spread-days
+(plus --due sends due now), then runs a SendWorker with a transport that
+only counts messages until everything due has gone out. Reports tick times,
+which should stay flat as --pending grows, and sends per second:
+
+    python benchmarks/send_bench.py --pending 100000 --due 5000
+    python benchmarks/send_bench.py --pending 1000000 --due 5000
+    python benchmarks/send_bench.py --database postgresql://localhost/helix_bench --workers 4
+
+With --workers, that many workers share the table from separate threads.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import insert
+
+from app.services.send_transports import Transport
+
+STEPS = [
+    ('Quick question, [CANDIDATE_NAME]', "Hi [CANDIDATE_NAME], we're hiring a [POSITION] at [COMPANY_NAME]."),
+    ('Following up', "Hi [CANDIDATE_NAME], any thoughts on the [POSITION] role?"),
+]
+
+
+class CountingTransport(Transport):
+    def __init__(self):
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def send(self, message) -> None:
+        with self._lock:
+            self.sent += 1
+
+
+def fill(db, count: int, due_now: int, spread_days: float, seed: int) -> None:
+    from app.models import ScheduledSend, Sequence, SequenceEnrollment, SequenceStep, User
+    db.session.add(User(id='bench-user', name='Sam', email='sam@example.com', company='Helix'))
+    db.session.add(Sequence(id='bench-sequence', user_id='bench-user', title='Bench', position='Staff Engineer'))
+    for order, (title, content) in enumerate(STEPS):
+        db.session.add(SequenceStep(sequence_id='bench-sequence', title=title, content=content, order=order))
+    db.session.commit()
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    total = count + due_now
+    for start in range(0, total, 5000):
+        enrollments, sends = [], []
+        for i in range(start, min(total, start + 5000)):
+            enrollment_id = str(uuid.uuid4())
+            due = now - timedelta(seconds=1) if i < due_now else now + timedelta(days=rng.uniform(0.01, spread_days))
+            enrollments.append({'id': enrollment_id, 'sequence_id': 'bench-sequence', 'user_id': 'bench-user',
+                                'email': f'candidate{i}@example.com', 'name': f'Candidate {i}', 'fields': '{}',
+                                'status': 'active', 'steps_sent': 0, 'created_at': now, 'updated_at': now})
+            sends.append({'id': str(uuid.uuid4()), 'enrollment_id': enrollment_id, 'step_order': 0,
+                          'status': 'pending', 'scheduled_at': due, 'due_at': due, 'attempts': 0})
+        db.session.execute(insert(SequenceEnrollment.__table__), enrollments)
+        db.session.execute(insert(ScheduledSend.__table__), sends)
+        db.session.commit()
+
+
+def run_worker(app, transport: Transport, batch_size: int, due_now: int, ticks: List[float]) -> None:
+    from app.services.send_scheduler import SendWorker
+    with app.app_context():
+        worker = SendWorker(transport=transport, batch_size=batch_size, window_seconds=0, poll_seconds=0)
+        idle = 0
+        while transport.sent < due_now and idle < 20:
+            start = time.perf_counter()
+            outcomes = worker.tick()
+            ticks.append(time.perf_counter() - start)
+            idle = 0 if outcomes else idle + 1
+
+
+def percentile(values: List[float], share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scheduled send workers")
+    parser.add_argument("--pending", type=int, default=100000, help="Sends due later (not sent by the run)")
+    parser.add_argument("--due", type=int, default=5000, help="Sends due now")
+    parser.add_argument("--spread-days", type=float, default=14.0)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--database", default=None, help="Database URI (default: a temporary SQLite file)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from app import create_app
+    from app.database.db import db
+
+    with tempfile.TemporaryDirectory() as tmp:
+        uri = args.database or f"sqlite:///{os.path.join(tmp, 'send_bench.db')}"
+        app = create_app({'SQLALCHEMY_DATABASE_URI': uri, 'TESTING': True,
+                          'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': 30}} if uri.startswith('sqlite') else {}})
+        with app.app_context():
+            from app import models  # noqa: F401 - register models
+            db.create_all()
+            fill_start = time.perf_counter()
+            fill(db, args.pending, args.due, args.spread_days, args.seed)
+            fill_seconds = time.perf_counter() - fill_start
+
+        transport = CountingTransport()
+        ticks: List[float] = []
+        start = time.perf_counter()
+        threads = [threading.Thread(target=run_worker, args=(app, transport, args.batch_size, args.due, ticks))
+                   for _ in range(args.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        seconds = time.perf_counter() - start
+
+        result: Dict[str, Any] = {
+            'config': vars(args),
+            'fill_seconds': round(fill_seconds, 1),
+            'sent': transport.sent,
+            'seconds': round(seconds, 3),
+            'sends_per_second': round(transport.sent / seconds) if seconds else None,
+            'ticks': len(ticks),
+            'tick_ms_p50': round(percentile(ticks, 0.5) * 1000, 1),
+            'tick_ms_p95': round(percentile(ticks, 0.95) * 1000, 1),
+        }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark.
+
+Loads --sequences sequences of --steps steps each (steps of --content-chars
+characters) and encodes every one of them --rounds times the way the
+sequence routes do, reporting payload bytes per second for:
+
+- jsonify:      jsonify({'success': True, 'data': sequence.to_dict()})
+- cold:         json_response(sequence.to_json()) with an empty memo
+- memoized:     the same, with every row already in the memo
+- emit+respond: the update route's work, a Socket.IO packet plus the HTTP
+                body, for to_dict() + jsonify against one shared (cold) to_json()
+
+Rows are loaded before timing starts, so database time is not included.
+
+    python benchmarks/serialize_bench.py
+    python benchmarks/serialize_bench.py --sequences 5000 --steps 8 --content-chars 1500
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import string
+import argparse
+import tempfile
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def fill(db, sequences: int, steps: int, content_chars: int, seed: int) -> None:
+    from app.models import Sequence, SequenceStep, User
+    rng = random.Random(seed)
+    words = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) for _ in range(500)]
+
+    def text(chars: int) -> str:
+        out: List[str] = []
+        length = 0
+        while length < chars:
+            word = rng.choice(words)
+            out.append(word)
+            length += len(word) + 1
+        return ' '.join(out)
+
+    db.session.add(User(id='bench-user', name='Sam', email='sam@example.com', company='Helix'))
+    for number in range(sequences):
+        sequence_id = f'bench-{number}'
+        db.session.add(Sequence(id=sequence_id, user_id='bench-user', title=text(30), position=text(20),
+                                additional_info=text(120)))
+        for order in range(steps):
+            db.session.add(SequenceStep(sequence_id=sequence_id, title=text(40), content=text(content_chars),
+                                        order=order))
+    db.session.commit()
+
+
+def measure(sequences, rounds: int, encode_one: Callable[[Any], int]) -> Dict[str, float]:
+    total_bytes = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for sequence in sequences:
+            total_bytes += encode_one(sequence)
+    seconds = time.perf_counter() - start
+    payloads = rounds * len(sequences)
+    return {'mb_per_second': round(total_bytes / seconds / 1e6, 1) if seconds else None,
+            'payloads_per_second': round(payloads / seconds) if seconds else None,
+            'us_per_payload': round(seconds / payloads * 1e6, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sequence serialization")
+    parser.add_argument("--sequences", type=int, default=2000)
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--content-chars", type=int, default=800)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from flask import jsonify
+    from sqlalchemy.orm import selectinload
+    from app import create_app
+    from app.database.db import db
+    from app.utils import serialization
+    from app.utils.serialization import clear_memo, json_response
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'serialize_bench.db')}",
+                          'TESTING': True})
+        with app.app_context():
+            from app import models  # noqa: F401 - register models
+            from app.models import Sequence
+            db.create_all()
+            fill(db, args.sequences, args.steps, args.content_chars, args.seed)
+            db.session.expunge_all()
+            sequences = Sequence.query.options(selectinload(Sequence.steps)).all()
+
+            with app.test_request_context():
+                def baseline(sequence) -> int:
+                    return len(jsonify({'success': True, 'data': sequence.to_dict()}).get_data())
+
+                def cold(sequence) -> int:
+                    clear_memo()
+                    return len(json_response(sequence.to_json()).get_data())
+
+                def memoized(sequence) -> int:
+                    return len(json_response(sequence.to_json()).get_data())
+
+                def emit_respond_baseline(sequence) -> int:
+                    data = sequence.to_dict()
+                    packet = json.dumps(['sequence_updated', data], separators=(',', ':'))
+                    return len(packet) + len(jsonify({'success': True, 'data': data}).get_data())
+
+                def emit_respond(sequence) -> int:
+                    # An update changed the sequence, so its payload is not memoized yet
+                    clear_memo()
+                    payload = sequence.to_json()
+                    packet = serialization.dumps(['sequence_updated', payload], separators=(',', ':'))
+                    return len(packet) + len(json_response(payload).get_data())
+
+                # Same content either way
+                sample = sequences[0]
+                assert json.loads(json_response(sample.to_json()).get_data()) == \
+                    json.loads(jsonify({'success': True, 'data': sample.to_dict()}).get_data())
+
+                result: Dict[str, Any] = {
+                    'config': vars(args),
+                    'encoder': 'orjson' if serialization.orjson is not None else 'json',
+                    'payload_bytes': len(sample.to_json()),
+                    'jsonify': measure(sequences, args.rounds, baseline),
+                    'cold': measure(sequences, args.rounds, cold),
+                }
+                clear_memo()
+                for sequence in sequences:
+                    sequence.to_json()
+                result['memoized'] = measure(sequences, args.rounds, memoized)
+                result['emit_respond_jsonify'] = measure(sequences, args.rounds, emit_respond_baseline)
+                result['emit_respond_shared'] = measure(sequences, args.rounds, emit_respond)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Socket.IO capacity benchmark for a single server worker.
+
+Starts `app.py` in a subprocess with the requested SOCKETIO_ASYNC_MODE, then
+ramps up client connections in steps:
+  - idle clients: websocket connections that only exchange heartbeats
+  - active clients: long-polling connections, each keeping a request open on
+    the server the way older browsers and proxies do
+
+After each step it records connect failures, connect latency and the server
+process' RSS and thread count, and stops at the first step where connections
+start failing. Run once per mode to compare:
+
+    python benchmarks/socket_bench.py --mode threading --engine-logging --max-clients 1000
+    python benchmarks/socket_bench.py --mode threading --max-clients 1000
+    python benchmarks/socket_bench.py --mode gevent --max-clients 1000
+
+Requires the Socket.IO client extras: pip install "python-socketio[client]"
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import socketio
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _proc_status(pid: int) -> Dict[str, int]:
+    """Read RSS (KB) and thread count from /proc (Linux only)."""
+    stats = {'rss_kb': -1, 'threads': -1}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    stats['rss_kb'] = int(line.split()[1])
+                elif line.startswith('Threads:'):
+                    stats['threads'] = int(line.split()[1])
+    except OSError:
+        pass
+    return stats
+
+
+def start_server(mode: str, port: int, database_uri: str, engine_logging: bool = False) -> subprocess.Popen:
+    logging_flag = 'true' if engine_logging else 'false'
+    env = dict(os.environ, PORT=str(port), SOCKETIO_ASYNC_MODE=mode, SQLALCHEMY_DATABASE_URI=database_uri,
+               SOCKETIO_LOGGER=logging_flag, ENGINEIO_LOGGER=logging_flag)
+    process = subprocess.Popen([sys.executable, 'app.py'], cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Server did not start within 30 seconds")
+
+
+def connect_client(url: str, transport: str, timeout: float):
+    client = socketio.Client(reconnection=False)
+    start = time.perf_counter()
+    try:
+        client.connect(url, transports=[transport], wait_timeout=timeout)
+        return client, (time.perf_counter() - start) * 1000
+    except Exception:
+        return None, None
+
+
+def _disconnect(client: socketio.Client) -> None:
+    try:
+        client.disconnect()
+    except Exception:
+        pass
+
+
+def run_mode(args) -> Dict[str, Any]:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_server(args.mode, port, f"sqlite:///{os.path.join(tmp, 'socket_bench.db')}",
+                              engine_logging=args.engine_logging)
+        clients: List[socketio.Client] = []
+        steps = []
+        try:
+            baseline = _proc_status(server.pid)
+            total = 0
+            with ThreadPoolExecutor(max_workers=args.connect_parallelism) as pool:
+                while total < args.max_clients:
+                    batch = min(args.step, args.max_clients - total)
+                    active = int(round(batch * args.active_share))
+                    transports = ['polling'] * active + ['websocket'] * (batch - active)
+                    results = list(pool.map(lambda t: connect_client(url, t, args.timeout), transports))
+                    connected = [(c, ms) for c, ms in results if c is not None]
+                    clients.extend(c for c, _ in connected)
+                    total += batch
+                    latencies = sorted(ms for _, ms in connected)
+                    time.sleep(args.settle)
+                    status = _proc_status(server.pid)
+                    step = {
+                        'attempted': total,
+                        'connected': sum(1 for c in clients if c.connected),
+                        'failed_in_step': batch - len(connected),
+                        'connect_p50_ms': round(latencies[len(latencies) // 2], 2) if latencies else None,
+                        'connect_max_ms': round(latencies[-1], 2) if latencies else None,
+                        'server_rss_mb': round(status['rss_kb'] / 1024, 1),
+                        'server_threads': status['threads']
+                    }
+                    steps.append(step)
+                    print(json.dumps(step), file=sys.stderr)
+                    if step['failed_in_step']:
+                        break
+        finally:
+            with ThreadPoolExecutor(max_workers=args.connect_parallelism) as pool:
+                list(pool.map(_disconnect, clients))
+            server.terminate()
+            server.wait(timeout=10)
+
+    sustained = max((s['connected'] for s in steps if not s['failed_in_step']), default=0)
+    return {
+        'mode': args.mode,
+        'engine_logging': args.engine_logging,
+        'active_share': args.active_share,
+        'baseline_rss_mb': round(baseline['rss_kb'] / 1024, 1),
+        'baseline_threads': baseline['threads'],
+        'max_sustained_clients': sustained,
+        'steps': steps
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure concurrent Socket.IO clients per worker")
+    parser.add_argument("--mode", choices=['threading', 'gevent'], default='threading')
+    parser.add_argument("--max-clients", type=int, default=500)
+    parser.add_argument("--step", type=int, default=100, help="Clients added per step")
+    parser.add_argument("--active-share", type=float, default=0.2, help="Share of long-polling clients")
+    parser.add_argument("--connect-parallelism", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=10.0, help="Per-connection timeout in seconds")
+    parser.add_argument("--engine-logging", action="store_true",
+                        help="Enable per-packet Socket.IO/Engine.IO logging (the old default)")
+    parser.add_argument("--settle", type=float, default=1.0, help="Seconds to wait before sampling each step")
+    args = parser.parse_args()
+    print(json.dumps(run_mode(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
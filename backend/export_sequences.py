@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Bulk export of sequences and their steps.
+
+Streams rows from the database with a server-side cursor and writes them as
+they arrive, so memory use stays flat however many sequences match.
+
+Usage:
+    python export_sequences.py --output sequences.jsonl
+    python export_sequences.py --format csv --user <user_id> --output steps.csv
+    python export_sequences.py --position engineer --since 2025-01-01 --until 2025-03-31 > q1.jsonl
+"""
+
+import sys
+import time
+import argparse
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def main():
+    parser = argparse.ArgumentParser(description="Export sequences as JSONL or CSV")
+    parser.add_argument("--format", choices=('jsonl', 'csv'), default='jsonl',
+                        help="jsonl: one sequence per line; csv: one step per row")
+    parser.add_argument("--user", default=None, help="Only this user's sequences")
+    parser.add_argument("--position", default=None, help="Case-insensitive substring of the position")
+    parser.add_argument("--since", default=None, help="Created on or after this ISO date/datetime")
+    parser.add_argument("--until", default=None, help="Created on or before this ISO date (inclusive)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows fetched per round trip")
+    parser.add_argument("--output", default=None, help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    from app import create_app
+    from app.services.export_service import ExportService, parse_date_bound
+    app = create_app()
+
+    try:
+        since = parse_date_bound(args.since)
+        until = parse_date_bound(args.until, end=True)
+    except ValueError:
+        print("--since and --until must be ISO dates", file=sys.stderr)
+        return False
+
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    start = time.perf_counter()
+    written = 0
+    try:
+        with app.app_context():
+            for chunk in ExportService.get_instance().export(args.format, user_id=args.user, position=args.position,
+                                                             since=since, until=until, batch_size=args.batch_size):
+                out.write(chunk)
+                written += len(chunk)
+    except Exception as e:
+        print(f"Export failed: {str(e)}", file=sys.stderr)
+        return False
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Exported {written / 1e6:.1f} MB in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
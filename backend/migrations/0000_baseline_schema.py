@@ -0,0 +1,52 @@
+"""
+Baseline schema: the tables that predate migrations (users, sequences,
+sequence_steps, chat_messages), so a fresh database can be built with
+run_migrations.py alone.
+
+Databases created with db.create_all() already have them; every statement
+is IF NOT EXISTS, so recording this migration there changes nothing. Their
+indexes come from 0002 and 0003.
+"""
+
+def upgrade(ctx):
+    ctx.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id VARCHAR(36) PRIMARY KEY,
+        email VARCHAR(255) NOT NULL UNIQUE,
+        name VARCHAR(255) NOT NULL,
+        company VARCHAR(255),
+        created_at TIMESTAMP
+    )
+    """)
+    ctx.execute("""
+    CREATE TABLE IF NOT EXISTS sequences (
+        id VARCHAR(36) PRIMARY KEY,
+        user_id VARCHAR(36) NOT NULL REFERENCES users(id),
+        title VARCHAR(255) NOT NULL,
+        position VARCHAR(255) NOT NULL,
+        additional_info TEXT,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    """)
+    ctx.execute("""
+    CREATE TABLE IF NOT EXISTS sequence_steps (
+        id VARCHAR(36) PRIMARY KEY,
+        sequence_id VARCHAR(36) NOT NULL REFERENCES sequences(id),
+        title VARCHAR(255) NOT NULL,
+        content TEXT NOT NULL,
+        "order" INTEGER NOT NULL,
+        created_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )
+    """)
+    ctx.execute("""
+    CREATE TABLE IF NOT EXISTS chat_messages (
+        id VARCHAR(36) PRIMARY KEY,
+        user_id VARCHAR(36) NOT NULL REFERENCES users(id),
+        sequence_id VARCHAR(36) REFERENCES sequences(id),
+        role VARCHAR(50) NOT NULL,
+        content TEXT NOT NULL,
+        created_at TIMESTAMP
+    )
+    """)
@@ -0,0 +1,28 @@
+"""
+Migration script to create session_states table for context tracking.
+Run this script after adding the SessionState model to create the table in the database.
+"""
+
+# SQL to create session_states table
+create_table_sql = """
+CREATE TABLE IF NOT EXISTS session_states (
+    id VARCHAR(36) PRIMARY KEY,
+    user_id VARCHAR(36) NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    active_sequence_id VARCHAR(36) REFERENCES sequences(id) ON DELETE SET NULL,
+    last_action VARCHAR(100),
+    last_action_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    context_data TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    CONSTRAINT fk_sequence FOREIGN KEY (active_sequence_id) REFERENCES sequences(id) ON DELETE SET NULL
+)
+"""
+
+def upgrade(ctx):
+    print("Running migration to create session_states table...")
+    ctx.execute(create_table_sql)
+    
+    # Create index for faster user lookups
+    ctx.create_index('idx_session_states_user_id', 'session_states', ['user_id'])
+    ctx.create_index('idx_session_states_sequence_id', 'session_states', ['active_sequence_id'])
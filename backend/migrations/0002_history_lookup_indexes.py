@@ -0,0 +1,14 @@
+"""
+Indexes for the hot per-user read paths:
+- chat history (user_id, created_at) used by get_conversation_history / get_chat_history
+- sequences by user_id used by get_user_sequences
+- steps by (sequence_id, order) used when loading a sequence's steps
+
+Built with CREATE INDEX CONCURRENTLY on PostgreSQL so writes to large tables
+are not blocked while the index builds.
+"""
+
+def upgrade(ctx):
+    ctx.create_index('ix_chat_messages_user_created', 'chat_messages', ['user_id', 'created_at'])
+    ctx.create_index('ix_sequences_user_id', 'sequences', ['user_id'])
+    ctx.create_index('ix_sequence_steps_sequence_order', 'sequence_steps', ['sequence_id', '"order"'])
@@ -0,0 +1,48 @@
+"""
+Create chat_messages_archive, the cold table the retention job moves old
+chat_messages rows into.
+
+PostgreSQL: native range partitioning by created_at. The retention job
+creates monthly partitions (chat_messages_archive_YYYY_MM) before moving
+rows, and purging old history drops whole partitions instead of deleting
+rows. A DEFAULT partition catches anything outside the created ranges.
+
+Other databases (SQLite): a plain table with the same columns.
+"""
+
+def upgrade(ctx):
+    if ctx.is_postgres:
+        ctx.execute("""
+        CREATE TABLE IF NOT EXISTS chat_messages_archive (
+            id VARCHAR(36) NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            user_id VARCHAR(36) NOT NULL,
+            sequence_id VARCHAR(36),
+            role VARCHAR(50) NOT NULL,
+            content TEXT NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """)
+        ctx.execute("CREATE TABLE IF NOT EXISTS chat_messages_archive_default "
+                    "PARTITION OF chat_messages_archive DEFAULT")
+        # Created on the (empty) partitioned parent, so a plain CREATE INDEX is fine
+        ctx.execute("CREATE INDEX IF NOT EXISTS ix_chat_messages_archive_user_created "
+                    "ON chat_messages_archive (user_id, created_at)")
+    else:
+        ctx.execute("""
+        CREATE TABLE IF NOT EXISTS chat_messages_archive (
+            id VARCHAR(36) NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            user_id VARCHAR(36) NOT NULL,
+            sequence_id VARCHAR(36),
+            role VARCHAR(50) NOT NULL,
+            content TEXT NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, created_at)
+        )
+        """)
+        ctx.create_index('ix_chat_messages_archive_user_created', 'chat_messages_archive', ['user_id', 'created_at'])
+
+    # Lets the retention job find the oldest hot rows without scanning the table
+    ctx.create_index('ix_chat_messages_created_at', 'chat_messages', ['created_at'])
@@ -0,0 +1,76 @@
+"""
+Create the full-text search index over sequences and their steps and fill it
+from existing rows. SequenceService keeps it up to date afterwards.
+
+PostgreSQL: sequence_search, one row per sequence with a generated weighted
+tsvector behind a GIN index. pg_trgm is enabled when the role is allowed to,
+adding a trigram index on titles for typo-tolerant matches.
+
+SQLite: an FTS5 virtual table (porter stemming, prefix indexes) plus
+sequence_search_docs mapping FTS rowids to sequence ids.
+"""
+
+def upgrade(ctx):
+    if ctx.is_postgres:
+        ctx.execute("""
+        CREATE TABLE IF NOT EXISTS sequence_search (
+            sequence_id VARCHAR(36) PRIMARY KEY,
+            user_id VARCHAR(36) NOT NULL,
+            title TEXT NOT NULL DEFAULT '',
+            position TEXT NOT NULL DEFAULT '',
+            additional_info TEXT NOT NULL DEFAULT '',
+            steps TEXT NOT NULL DEFAULT '',
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            document TSVECTOR GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', title), 'A') ||
+                setweight(to_tsvector('english', position), 'A') ||
+                setweight(to_tsvector('english', additional_info), 'B') ||
+                setweight(to_tsvector('english', steps), 'C')
+            ) STORED
+        )
+        """)
+        ctx.execute("""
+        INSERT INTO sequence_search (sequence_id, user_id, title, position, additional_info, steps)
+        SELECT s.id, s.user_id, coalesce(s.title, ''), coalesce(s.position, ''), coalesce(s.additional_info, ''),
+               coalesce(string_agg(st.content, E'\\n\\n' ORDER BY st."order"), '')
+        FROM sequences s LEFT JOIN sequence_steps st ON st.sequence_id = s.id
+        GROUP BY s.id
+        ON CONFLICT (sequence_id) DO NOTHING
+        """)
+        # Built after the backfill: one bulk GIN build is much faster than incremental inserts
+        ctx.create_index('ix_sequence_search_document', 'sequence_search', ['document'], using='GIN')
+        ctx.create_index('ix_sequence_search_user_id', 'sequence_search', ['user_id'])
+
+        try:
+            ctx.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except Exception as e:
+            print(f"  Skipping trigram index (pg_trgm unavailable: {str(e).splitlines()[0]})")
+            return
+        ctx.create_index('ix_sequence_search_title_trgm', 'sequence_search', ['title gin_trgm_ops'], using='GIN')
+    else:
+        ctx.execute("""
+        CREATE TABLE IF NOT EXISTS sequence_search_docs (
+            id INTEGER PRIMARY KEY,
+            sequence_id VARCHAR(36) NOT NULL UNIQUE,
+            user_id VARCHAR(36) NOT NULL
+        )
+        """)
+        ctx.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS sequence_search_fts USING fts5(
+            owner, title, position, additional_info, steps,
+            tokenize = 'porter unicode61', prefix = '2 3 4'
+        )
+        """)
+        ctx.execute("""
+        INSERT OR IGNORE INTO sequence_search_docs (sequence_id, user_id)
+        SELECT id, user_id FROM sequences
+        """)
+        ctx.execute("""
+        INSERT INTO sequence_search_fts (rowid, owner, title, position, additional_info, steps)
+        SELECT d.id, 'u' || lower(hex(s.user_id)), coalesce(s.title, ''), coalesce(s.position, ''),
+               coalesce(s.additional_info, ''),
+               coalesce((SELECT group_concat(content, char(10) || char(10)) FROM
+                         (SELECT content FROM sequence_steps WHERE sequence_id = s.id ORDER BY "order")), '')
+        FROM sequence_search_docs d JOIN sequences s ON s.id = d.sequence_id
+        WHERE d.id NOT IN (SELECT rowid FROM sequence_search_fts)
+        """)
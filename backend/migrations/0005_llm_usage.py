@@ -0,0 +1,47 @@
+"""
+Create llm_usage (one row per Messages API call: tokens, latency, estimated
+cost, and the chat message / sequence it was made for) and llm_usage_daily,
+the per-day, per-user rollup UsageService upserts on every write.
+"""
+
+def upgrade(ctx):
+    ctx.execute("""
+    CREATE TABLE IF NOT EXISTS llm_usage (
+        id VARCHAR(36) PRIMARY KEY,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        user_id VARCHAR(36) NOT NULL,
+        call_type VARCHAR(50) NOT NULL,
+        model VARCHAR(100) NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        input_tokens INTEGER DEFAULT 0,
+        output_tokens INTEGER DEFAULT 0,
+        cache_read_tokens INTEGER DEFAULT 0,
+        cache_write_tokens INTEGER DEFAULT 0,
+        latency_ms FLOAT DEFAULT 0,
+        cost_usd FLOAT DEFAULT 0,
+        chat_message_id VARCHAR(36),
+        sequence_id VARCHAR(36)
+    )
+    """)
+    ctx.create_index('ix_llm_usage_user_created', 'llm_usage', ['user_id', 'created_at'])
+    ctx.create_index('ix_llm_usage_sequence_id', 'llm_usage', ['sequence_id'])
+    ctx.create_index('ix_llm_usage_chat_message_id', 'llm_usage', ['chat_message_id'])
+
+    ctx.execute("""
+    CREATE TABLE IF NOT EXISTS llm_usage_daily (
+        day DATE NOT NULL,
+        user_id VARCHAR(36) NOT NULL,
+        call_type VARCHAR(50) NOT NULL,
+        model VARCHAR(100) NOT NULL,
+        calls INTEGER DEFAULT 0,
+        errors INTEGER DEFAULT 0,
+        input_tokens INTEGER DEFAULT 0,
+        output_tokens INTEGER DEFAULT 0,
+        cache_read_tokens INTEGER DEFAULT 0,
+        cache_write_tokens INTEGER DEFAULT 0,
+        latency_ms FLOAT DEFAULT 0,
+        cost_usd FLOAT DEFAULT 0,
+        PRIMARY KEY (day, user_id, call_type, model)
+    )
+    """)
+    ctx.create_index('ix_llm_usage_daily_user_day', 'llm_usage_daily', ['user_id', 'day'])
@@ -0,0 +1,43 @@
+"""
+Create personalization_jobs (one row per clustered personalization run, also
+its resume checkpoint) and personalization_variants (the opening step
+written for each cluster of a job).
+"""
+
+def upgrade(ctx):
+    ctx.execute("""
+    CREATE TABLE IF NOT EXISTS personalization_jobs (
+        id VARCHAR(36) PRIMARY KEY,
+        user_id VARCHAR(36) NOT NULL,
+        sequence_id VARCHAR(36) NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        phase VARCHAR(20),
+        input_format VARCHAR(10) NOT NULL DEFAULT 'csv',
+        profile_columns TEXT,
+        defaults TEXT,
+        candidates INTEGER DEFAULT 0,
+        clusters INTEGER DEFAULT 0,
+        overflow INTEGER DEFAULT 0,
+        variants_done INTEGER DEFAULT 0,
+        rendered INTEGER DEFAULT 0,
+        llm_calls INTEGER DEFAULT 0,
+        error TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP
+    )
+    """)
+    ctx.create_index('ix_personalization_jobs_user_created', 'personalization_jobs', ['user_id', 'created_at'])
+
+    ctx.execute("""
+    CREATE TABLE IF NOT EXISTS personalization_variants (
+        job_id VARCHAR(36) NOT NULL,
+        cluster INTEGER NOT NULL,
+        size INTEGER DEFAULT 0,
+        profile TEXT,
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        title VARCHAR(255),
+        content TEXT,
+        PRIMARY KEY (job_id, cluster)
+    )
+    """)
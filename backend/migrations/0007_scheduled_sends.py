@@ -0,0 +1,42 @@
+"""
+Create sequence_enrollments (a candidate going through a sequence) and
+scheduled_sends (each enrollment's next email and its due time). The send
+workers only read scheduled_sends through ix_scheduled_sends_status_due.
+"""
+
+def upgrade(ctx):
+    ctx.execute("""
+    CREATE TABLE IF NOT EXISTS sequence_enrollments (
+        id VARCHAR(36) PRIMARY KEY,
+        sequence_id VARCHAR(36) NOT NULL,
+        user_id VARCHAR(36) NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        name VARCHAR(255),
+        fields TEXT,
+        delays TEXT,
+        status VARCHAR(20) NOT NULL DEFAULT 'active',
+        steps_sent INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP
+    )
+    """)
+    ctx.create_index('ix_sequence_enrollments_sequence_status', 'sequence_enrollments', ['sequence_id', 'status'])
+    ctx.create_index('ix_sequence_enrollments_sequence_email', 'sequence_enrollments', ['sequence_id', 'email'])
+
+    ctx.execute("""
+    CREATE TABLE IF NOT EXISTS scheduled_sends (
+        id VARCHAR(36) PRIMARY KEY,
+        enrollment_id VARCHAR(36) NOT NULL,
+        step_order INTEGER NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        scheduled_at TIMESTAMP NOT NULL,
+        due_at TIMESTAMP NOT NULL,
+        claim_token VARCHAR(36),
+        attempts INTEGER DEFAULT 0,
+        last_error TEXT,
+        sent_at TIMESTAMP
+    )
+    """)
+    ctx.create_index('ix_scheduled_sends_status_due', 'scheduled_sends', ['status', 'due_at'])
+    ctx.create_index('ix_scheduled_sends_enrollment', 'scheduled_sends', ['enrollment_id'])
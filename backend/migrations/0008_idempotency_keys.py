@@ -0,0 +1,24 @@
+"""
+Create idempotency_keys: each Idempotency-Key clients sent with a chat
+message or sequence generation, and the response it produced. Expired rows
+are pruned through ix_idempotency_keys_expires.
+"""
+
+def upgrade(ctx):
+    ctx.execute("""
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        id VARCHAR(64) PRIMARY KEY,
+        scope VARCHAR(50) NOT NULL,
+        key VARCHAR(255) NOT NULL,
+        user_id VARCHAR(36),
+        request_hash VARCHAR(64) NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'in_progress',
+        response_status INTEGER,
+        response_body TEXT,
+        response_mimetype VARCHAR(100),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        completed_at TIMESTAMP,
+        expires_at TIMESTAMP NOT NULL
+    )
+    """)
+    ctx.create_index('ix_idempotency_keys_expires', 'idempotency_keys', ['expires_at'])
@@ -1,4 +1,7 @@
 """
 Migrations package for database schema updates.
-Each migration script should define a run_migration() function.
-""" 
\ No newline at end of file
+Files are named <version>_<name>.py and applied in version order by run_migrations.py,
+which records each one in the schema_migrations table.
+Each migration script should define upgrade(ctx) (see app/database/migration_ops.py);
+the legacy run_migration() function is still supported.
+"""
\ No newline at end of file
@@ -1,17 +1,64 @@
 #!/usr/bin/env python3
 """
-Script to run all migrations in sequence.
+Script to run pending migrations in order.
 Run this script to ensure the database schema is up to date.
+
+Applied migrations are recorded in the schema_migrations table together with
+a checksum of the file, so each migration runs exactly once. Migration files
+live in migrations/ and are named <version>_<name>.py; they define either
+`upgrade(ctx)` (receives an app.database.migration_ops.MigrationContext) or
+the legacy `run_migration()` function.
+
+Usage:
+    python run_migrations.py            # apply pending migrations
+    python run_migrations.py --plan     # show applied / pending / changed migrations
+    python run_migrations.py --dry-run  # print the SQL pending migrations would run
 """
 
 import os
-import importlib.util
 import sys
+import time
+import hashlib
+import argparse
+import importlib.util
 from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
 
 # Load environment variables
 load_dotenv()
 
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+from app.database.migration_ops import MigrationContext
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+
+# Arbitrary key for the PostgreSQL advisory lock that serialises runners
+ADVISORY_LOCK_KEY = 727348291
+
+CREATE_TRACKING_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version VARCHAR(64) PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    checksum VARCHAR(64) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    duration_ms INTEGER
+)
+"""
+
+def discover_migrations():
+    """Return migration files sorted by version as (version, name, path, checksum) tuples"""
+    migrations = []
+    for file_name in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not file_name.endswith('.py') or file_name.startswith('__'):
+            continue
+        stem = file_name[:-3]
+        version, _, name = stem.partition('_')
+        path = os.path.join(MIGRATIONS_DIR, file_name)
+        with open(path, 'rb') as f:
+            checksum = hashlib.sha256(f.read()).hexdigest()
+        migrations.append((version, name or stem, path, checksum))
+    return migrations
+
 def import_migration(file_path):
     """Import a migration module from file path"""
     module_name = os.path.basename(file_path).replace('.py', '')
@@ -20,53 +67,127 @@ def import_migration(file_path):
     spec.loader.exec_module(module)
     return module
 
-def run_migrations():
-    """Run all migrations in the migrations directory"""
-    migrations_dir = os.path.join(os.path.dirname(__file__), 'migrations')
-    
-    if not os.path.exists(migrations_dir):
-        print(f"Error: Migrations directory not found: {migrations_dir}")
+def get_applied(engine):
+    """Return {version: checksum} for migrations recorded as applied"""
+    with engine.begin() as conn:
+        conn.execute(text(CREATE_TRACKING_TABLE_SQL))
+        rows = conn.execute(text("SELECT version, checksum FROM schema_migrations")).fetchall()
+    return {row[0]: row[1] for row in rows}
+
+def build_plan(engine):
+    """Classify each migration as applied, pending or changed (applied, but the file was edited since)"""
+    applied = get_applied(engine)
+    plan = []
+    for version, name, path, checksum in discover_migrations():
+        if version not in applied:
+            status = 'pending'
+        elif applied[version] != checksum:
+            status = 'changed'
+        else:
+            status = 'applied'
+        plan.append((status, version, name, path, checksum))
+    return plan
+
+def print_plan(plan):
+    for status, version, name, _, checksum in plan:
+        print(f"  [{status:>7}] {version} {name} ({checksum[:12]})")
+
+def run_one(engine, version, name, path, checksum, dry_run=False):
+    """Run a single migration and record it; returns True on success"""
+    print(f"Running migration: {version} {name}{' (dry run)' if dry_run else ''}")
+    module = import_migration(path)
+    start = time.perf_counter()
+
+    if hasattr(module, 'upgrade'):
+        module.upgrade(MigrationContext(engine, dry_run=dry_run))
+    elif hasattr(module, 'run_migration'):
+        if dry_run:
+            print("  [dry-run] legacy migration; SQL not available for preview")
+            return True
+        if not module.run_migration():
+            return False
+    else:
+        print(f"Warning: No upgrade() or run_migration() function in {os.path.basename(path)}")
+        return False
+
+    if dry_run:
+        return True
+
+    duration_ms = int((time.perf_counter() - start) * 1000)
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO schema_migrations (version, name, checksum, duration_ms) "
+                 "VALUES (:version, :name, :checksum, :duration_ms)"),
+            {'version': version, 'name': name, 'checksum': checksum, 'duration_ms': duration_ms}
+        )
+    print(f"  Applied {version} in {duration_ms} ms")
+    return True
+
+def run_migrations(database_uri=None, dry_run=False, plan_only=False, allow_changed=False):
+    """Run all pending migrations in the migrations directory"""
+    if not os.path.exists(MIGRATIONS_DIR):
+        print(f"Error: Migrations directory not found: {MIGRATIONS_DIR}")
+        return False
+
+    database_uri = database_uri or os.environ.get('SQLALCHEMY_DATABASE_URI')
+    if not database_uri:
+        print("Error: SQLALCHEMY_DATABASE_URI environment variable not set")
         return False
-    
-    # Get all Python files in the migrations directory
-    migration_files = [
-        os.path.join(migrations_dir, f) 
-        for f in os.listdir(migrations_dir) 
-        if f.endswith('.py') and not f.startswith('__')
-    ]
-    
-    # Sort files to ensure consistent order
-    migration_files.sort()
-    
-    if not migration_files:
-        print("No migration files found.")
+    # Legacy migrations build their own engine from the environment
+    os.environ['SQLALCHEMY_DATABASE_URI'] = database_uri
+    engine = create_engine(database_uri)
+
+    lock_conn = None
+    if engine.dialect.name == 'postgresql' and not plan_only:
+        # Only one runner at a time; a second one waits here
+        lock_conn = engine.connect()
+        lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': ADVISORY_LOCK_KEY})
+
+    try:
+        plan = build_plan(engine)
+        print("Migration plan:")
+        print_plan(plan)
+
+        changed = [p for p in plan if p[0] == 'changed']
+        if changed and not allow_changed:
+            print("Error: applied migrations have been modified since they ran "
+                  "(use --allow-changed to proceed anyway)")
+            return False
+        if plan_only:
+            return True
+
+        pending = [p for p in plan if p[0] == 'pending']
+        if not pending:
+            print("Database is up to date.")
+            return True
+
+        for _, version, name, path, checksum in pending:
+            try:
+                if not run_one(engine, version, name, path, checksum, dry_run=dry_run):
+                    print(f"Migration failed: {version} {name}")
+                    print("Migration process failed.")
+                    return False
+            except Exception as e:
+                print(f"Error running migration {version} {name}: {str(e)}")
+                print("Migration process failed.")
+                return False
+
+        print("All migrations completed successfully!" if not dry_run else "Dry run complete; nothing was applied.")
         return True
-    
-    # Run each migration
-    success = True
-    for file_path in migration_files:
-        try:
-            print(f"Running migration: {os.path.basename(file_path)}")
-            module = import_migration(file_path)
-            if hasattr(module, 'run_migration'):
-                if not module.run_migration():
-                    success = False
-                    print(f"Migration failed: {os.path.basename(file_path)}")
-                    break
-            else:
-                print(f"Warning: No run_migration function in {os.path.basename(file_path)}")
-        except Exception as e:
-            success = False
-            print(f"Error running migration {os.path.basename(file_path)}: {str(e)}")
-            break
-    
-    if success:
-        print("All migrations completed successfully!")
-    else:
-        print("Migration process failed.")
-    
-    return success
+    finally:
+        if lock_conn is not None:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': ADVISORY_LOCK_KEY})
+            lock_conn.close()
+        engine.dispose()
 
 if __name__ == "__main__":
-    success = run_migrations()
-    sys.exit(0 if success else 1) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run pending database migrations")
+    parser.add_argument("--database-uri", help="Defaults to SQLALCHEMY_DATABASE_URI")
+    parser.add_argument("--plan", action="store_true", help="Show migration status and exit")
+    parser.add_argument("--dry-run", action="store_true", help="Print SQL for pending migrations without applying")
+    parser.add_argument("--allow-changed", action="store_true", help="Run even if applied migrations were edited")
+    args = parser.parse_args()
+
+    success = run_migrations(args.database_uri, dry_run=args.dry_run, plan_only=args.plan,
+                             allow_changed=args.allow_changed)
+    sys.exit(0 if success else 1)
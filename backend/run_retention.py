@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Chat history retention job.
+
+Moves chat messages older than CHAT_RETENTION_DAYS from chat_messages into
+chat_messages_archive in bounded batches, then purges archived messages older
+than CHAT_ARCHIVE_PURGE_DAYS (if set). Run it from cron, or keep it running
+with --loop.
+
+Usage:
+    python run_retention.py
+    python run_retention.py --days 30 --batch-size 500 --sleep 0.1
+    python run_retention.py --loop --interval 3600
+"""
+
+import sys
+import time
+import argparse
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def run_once(app, args):
+    from app.services.retention_service import ChatRetentionService
+
+    with app.app_context():
+        service = ChatRetentionService.get_instance()
+        result = service.archive_old_messages(
+            older_than_days=args.days,
+            batch_size=args.batch_size,
+            max_batches=args.max_batches,
+            sleep_seconds=args.sleep
+        )
+        print(f"Archived {result['archived']} messages in {result['batches']} batches "
+              f"(cutoff {result['cutoff']}, {result['seconds']}s)")
+
+        purge = service.purge_archive(older_than_days=args.purge_days, batch_size=args.batch_size,
+                                      sleep_seconds=args.sleep)
+        if purge['purged'] or purge['dropped_partitions']:
+            print(f"Purged {purge['purged']} archived messages, dropped partitions: "
+                  f"{', '.join(purge['dropped_partitions']) or 'none'}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive and purge old chat messages")
+    parser.add_argument("--days", type=int, default=None, help="Override CHAT_RETENTION_DAYS")
+    parser.add_argument("--purge-days", type=int, default=None, help="Override CHAT_ARCHIVE_PURGE_DAYS")
+    parser.add_argument("--batch-size", type=int, default=None, help="Override CHAT_RETENTION_BATCH_SIZE")
+    parser.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches per run")
+    parser.add_argument("--sleep", type=float, default=0.05, help="Seconds to pause between batches")
+    parser.add_argument("--loop", action="store_true", help="Keep running every --interval seconds")
+    parser.add_argument("--interval", type=int, default=3600)
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+
+    while True:
+        try:
+            run_once(app, args)
+        except Exception as e:
+            print(f"Retention run failed: {str(e)}")
+            if not args.loop:
+                return False
+        if not args.loop:
+            return True
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Send worker for scheduled sequence emails.
+
+Claims due sends from scheduled_sends in batches, delivers them through
+SEND_TRANSPORT and schedules each enrollment's next step. Run as many
+workers as the send volume needs; they share the table without waiting on
+each other.
+
+Usage:
+    python run_send_worker.py
+    python run_send_worker.py --batch-size 500 --window 60 --poll 2
+    python run_send_worker.py --once          # send what is due now, then exit
+"""
+
+import sys
+import signal
+import argparse
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver scheduled sequence emails")
+    parser.add_argument("--batch-size", type=int, default=None, help="Override SEND_BATCH_SIZE")
+    parser.add_argument("--window", type=float, default=None, help="Override SEND_WINDOW_SECONDS")
+    parser.add_argument("--poll", type=float, default=None, help="Override SEND_POLL_SECONDS")
+    parser.add_argument("--once", action="store_true", help="Send everything due now, then exit")
+    parser.add_argument("--max-ticks", type=int, default=None, help="Exit after this many ticks")
+    args = parser.parse_args()
+
+    from app import create_app
+    from app.services.send_scheduler import SendWorker
+    app = create_app()
+
+    with app.app_context():
+        try:
+            worker = SendWorker(batch_size=args.batch_size, window_seconds=0 if args.once else args.window,
+                                poll_seconds=args.poll)
+        except ValueError as e:
+            print(f"Invalid send worker settings: {str(e)}", file=sys.stderr)
+            return False
+        if args.once:
+            totals = {}
+            try:
+                # Nothing is claimed ahead, so an empty tick means nothing is due
+                while True:
+                    outcomes = worker.tick()
+                    if not outcomes:
+                        break
+                    for outcome, count in outcomes.items():
+                        totals[outcome] = totals.get(outcome, 0) + count
+            finally:
+                worker.transport.close()
+        else:
+            signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+            try:
+                totals = worker.run(max_ticks=args.max_ticks)
+            except KeyboardInterrupt:
+                totals = worker.totals
+    print(f"Sends: {', '.join(f'{k} {v}' for k, v in sorted(totals.items())) or 'none'}")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
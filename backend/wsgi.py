@@ -0,0 +1,48 @@
+"""
+WSGI entry point for production servers.
+
+Never runs create_all (apply schema changes with run_migrations.py), imports
+the Anthropic SDK lazily on the first LLM call and optionally pre-warms
+DB_POOL_PREWARM pooled connections before the worker accepts traffic.
+
+    gunicorn -w 1 -k geventwebsocket.gunicorn.workers.GeventWebSocketWorker \\
+        --bind 0.0.0.0:5001 wsgi:app
+
+(with SOCKETIO_ASYNC_MODE=gevent)
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Load environment variables from .env file, first: SOCKETIO_ASYNC_MODE may be set there
+load_dotenv()
+
+# gevent must patch the standard library before anything else is imported
+if os.environ.get('SOCKETIO_ASYNC_MODE') == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+import time
+import logging
+
+startup_start = time.perf_counter()
+
+logger = logging.getLogger(__name__)
+
+from app import create_app
+from app.database.db import prewarm_connections
+
+app = create_app({
+    'ANTHROPIC_API_KEY': os.environ.get('ANTHROPIC_API_KEY'),
+    'SQLALCHEMY_DATABASE_URI': os.environ.get('SQLALCHEMY_DATABASE_URI'),
+    'SECRET_KEY': os.environ.get('SECRET_KEY', 'dev-key-change-in-production'),
+    'DB_CREATE_ALL': False
+})
+
+try:
+    prewarm_connections(app)
+except Exception as e:
+    logger.error(f"Error pre-warming database connections: {str(e)}")
+
+startup_ms = (time.perf_counter() - startup_start) * 1000
+logger.info(f"Worker startup took {startup_ms:.1f} ms")
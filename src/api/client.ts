@@ -13,6 +13,8 @@ async function fetchAPI<T>(
       method,
       headers: API_CONFIG.DEFAULT_HEADERS,
       body: body ? JSON.stringify(body) : undefined,
+      // Sends the backend's last-write cookie, so reads after a write skip lagging replicas
+      credentials: 'include',
     });
 
     const data = await response.json();
@@ -27,6 +27,12 @@ export const useChat = ({ userId, sequenceId, onSequenceRequest }: UseChatProps)
   const pollingIntervalRef = useRef<NodeJS.Timeout | null>(null);
   // Track whether we're in a save operation to prevent redundant updates
   const isLocalUpdateRef = useRef(false);
+  // Latest onSequenceRequest for the socket handlers; callers pass a new function on every
+  // render, and reconnecting for each one would look like a disconnect to the server
+  const onSequenceRequestRef = useRef(onSequenceRequest);
+  useEffect(() => {
+    onSequenceRequestRef.current = onSequenceRequest;
+  });
 
   // Setup event listener for save operations
   useEffect(() => {
@@ -530,7 +536,8 @@ export const useChat = ({ userId, sequenceId, onSequenceRequest }: UseChatProps)
       reconnection: true,
       reconnectionAttempts: MAX_RECONNECT_ATTEMPTS,
       reconnectionDelay: 1000,
-      timeout: 5000 // Shorter timeout
+      timeout: 5000, // Shorter timeout
+      query: { userId } // Lets the server cancel this user's in-flight requests on disconnect
     });
     
     socketRef.current = socket;
@@ -584,7 +591,7 @@ export const useChat = ({ userId, sequenceId, onSequenceRequest }: UseChatProps)
               _silentUpdate: true
             };
             
-            onSequenceRequest(JSON.stringify(dataWithFlag));
+            onSequenceRequestRef.current(JSON.stringify(dataWithFlag));
           }
         } else {
           console.warn("No sequence ID found in socket data");
@@ -613,7 +620,7 @@ export const useChat = ({ userId, sequenceId, onSequenceRequest }: UseChatProps)
         socketRef.current = null;
       }
     };
-  }, [sequenceId, useFallbackPolling, onSequenceRequest]);
+  }, [sequenceId, userId, useFallbackPolling]);
 
   // Add separate useEffect for logging socket connection status
   useEffect(() => {